@@ -16,6 +16,7 @@ import json
 from api.system import System
 from pyapp.quant.manager import TaskManager
 from pyapp.quant.service_manager import ServiceManager
+from pyapp.proxy_server import SNAPSHOT_TTL
 
 class QuantAPI:
     '''量化交易API'''
@@ -31,8 +32,9 @@ class QuantAPI:
             client_path = server.get('clientPath', '')
             port = int(server.get('port', 8888))
             token = server.get('token', '')
+            snapshot_ttl = max(0.0, float(server.get('snapshotTtl', SNAPSHOT_TTL)))
             
-            code, msg, data = ServiceManager.start_service(client_type, client_path, port, token)
+            code, msg, data = ServiceManager.start_service(client_type, client_path, port, token, snapshot_ttl)
             result = {'code': code, 'msg': msg}
             if data:
                 result['data'] = data
@@ -1,4 +1,7 @@
 import os
+import time
+import queue
+import itertools
 import threading
 import platform
 import logging
@@ -6,6 +9,8 @@ from typing import Optional
 from fastapi import FastAPI, HTTPException, Header, Depends, Query
 from pydantic import BaseModel
 
+SNAPSHOT_TTL = 2.0 # 资金/持仓快照默认缓存时长(秒)，0 表示不缓存
+
 class OrderRequest(BaseModel):
     security: str
     price: float
@@ -27,12 +32,111 @@ class MockTrader:
     def sell(self, security, price, amount):
         return {'message': f'Mock sell {security} price={price} amount={amount}'}
 
-def create_proxy_app(client_type: str = 'universal_client', client_path: str = '', token: str = ''):
+class _GuiJob:
+    """GUI 工作线程中执行的一次操作，合并的读请求共享同一个结果"""
+    def __init__(self, fn):
+        self.fn = fn
+        self.done = threading.Event()
+        self.started_at = None
+        self.result = None
+        self.error = None
+
+class GuiWorker:
+    """
+    单线程 GUI 操作队列：所有客户端操作在同一个线程中串行执行，避免并发操作 GUI
+    - 按优先级执行：下单(ORDER)优先于查询(QUERY)，同优先级按提交顺序
+    - 相同的查询在排队或执行期间合并为一次，结果共享给所有等待者
+      （执行中的查询晚于所有已完成的下单开始，合并不会读到下单前的旧数据）
+    - 查询结果按 key 缓存为快照，snapshot_ttl 秒内直接返回；任何下单/撤单类操作执行后立即失效
+    """
+    ORDER = 0
+    QUERY = 1
+
+    def __init__(self, snapshot_ttl=SNAPSHOT_TTL):
+        self.snapshot_ttl = snapshot_ttl
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._reads = {}
+        self._snapshots = {} # {key: (结果, 抓取开始时间)}
+        self.coalesced = 0
+        self.cache_hits = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def call(self, fn, priority=QUERY, key=None, fresh=False):
+        """
+        提交操作并等待结果；key 不为空时与相同 key 的查询合并
+        fresh: 只合并尚未开始执行的查询，确保结果在本次请求之后抓取
+        """
+        return self._call(fn, priority, key, fresh)[0]
+
+    def snapshot(self, key, fn, fresh=False):
+        """
+        读取快照：缓存未过期时直接返回，否则抓取（与相同查询合并）
+        返回: (结果, 快照时长秒, 是否来自缓存)
+        """
+        if not fresh and self.snapshot_ttl > 0:
+            with self._lock:
+                cached = self._snapshots.get(key)
+            if cached:
+                age = time.time() - cached[1]
+                if age <= self.snapshot_ttl:
+                    self.cache_hits += 1
+                    return cached[0], age, True
+        result, started_at = self._call(fn, self.QUERY, key, fresh)
+        return result, time.time() - started_at, False
+
+    def invalidate(self, key=None):
+        """清除快照，key 为空时清除全部"""
+        with self._lock:
+            if key:
+                self._snapshots.pop(key, None)
+            else:
+                self._snapshots.clear()
+
+    def _call(self, fn, priority, key, fresh):
+        with self._lock:
+            job = self._reads.get(key) if key else None
+            if job and not (fresh and job.started_at):
+                self.coalesced += 1
+            else:
+                job = _GuiJob(fn)
+                if key:
+                    self._reads[key] = job
+                self._queue.put((priority, next(self._seq), key, job))
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result, job.started_at
+
+    def _run(self):
+        while True:
+            priority, _, key, job = self._queue.get()
+            job.started_at = time.time()
+            try:
+                job.result = job.fn()
+            except Exception as e:
+                job.error = e
+            finally:
+                with self._lock:
+                    if key and self._reads.get(key) is job:
+                        del self._reads[key]
+                    if priority == self.ORDER:
+                        # 下单/撤单无论成功与否都可能改变资金与持仓
+                        self._snapshots.clear()
+                    elif key and job.error is None:
+                        self._snapshots[key] = (job.result, job.started_at)
+                job.done.set()
+
+def create_proxy_app(client_type: str = 'universal_client', client_path: str = '', token: str = '',
+                     snapshot_ttl: float = SNAPSHOT_TTL):
     """
     创建代理模式的 FastAPI 应用 直接连接指定的交易客户端，不依赖 TaskManager
     :param client_type: 支持的客户端类型 (如 'universal_client', 'ths', 'tdx', 'xq' 等)
     :param client_path: 客户端安装路径
     :param token: 验证 Token
+    :param snapshot_ttl: 资金/持仓快照缓存时长(秒)，0 表示每次都抓取
     """
     proxy_app = FastAPI(title="Quant Proxy Server", version="1.0")
     
@@ -44,8 +148,9 @@ def create_proxy_app(client_type: str = 'universal_client', client_path: str = '
     proxy_app.state.token = token
     proxy_app.state.startup_error = None
     
-    # 全局锁，防止多线程并发操作 GUI
-    server_lock = threading.Lock()
+    # GUI 操作队列，防止多线程并发操作 GUI；下单优先于查询，相同查询合并，查询结果短时缓存
+    gui_worker = GuiWorker(snapshot_ttl)
+    proxy_app.state.gui_worker = gui_worker
 
     def resolve_client_path(client_type: str, client_path: Optional[str]) -> Optional[str]:
         if not client_path or client_type == 'xq':
@@ -137,54 +242,54 @@ def create_proxy_app(client_type: str = 'universal_client', client_path: str = '
         if input_token != proxy_app.state.token:
             raise HTTPException(status_code=401, detail="Invalid Token")
 
+    def read_balance():
+        user = get_user()
+        try:
+            return user.balance
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    def read_position():
+        user = get_user()
+        try:
+            return user.position
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    def place_order(action, order: OrderRequest):
+        user = get_user()
+        try:
+            return getattr(user, action)(
+                security=order.security,
+                price=order.price,
+                amount=order.amount
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    def snapshot_response(data, age, cached):
+        return {"code": 200, "data": data, "msg": "success", "age": round(age, 3), "cached": cached}
+
     @proxy_app.get("/balance", dependencies=[Depends(verify_token)])
-    def get_balance():
-        """获取账户资金"""
-        with server_lock:
-            user = get_user()
-            try:
-                return {"code": 200, "data": user.balance, "msg": "success"}
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
+    def get_balance(fresh: bool = Query(False)):
+        """获取账户资金；fresh=true 时跳过快照缓存重新抓取，age 为快照时长(秒)"""
+        return snapshot_response(*gui_worker.snapshot('balance', read_balance, fresh=fresh))
 
     @proxy_app.get("/position", dependencies=[Depends(verify_token)])
-    def get_position():
-        """获取账户持仓"""
-        with server_lock:
-            user = get_user()
-            try:
-                return {"code": 200, "data": user.position, "msg": "success"}
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
+    def get_position(fresh: bool = Query(False)):
+        """获取账户持仓；fresh=true 时跳过快照缓存重新抓取，age 为快照时长(秒)"""
+        return snapshot_response(*gui_worker.snapshot('position', read_position, fresh=fresh))
 
     @proxy_app.post("/buy", dependencies=[Depends(verify_token)])
     def buy(order: OrderRequest):
         """买入下单"""
-        with server_lock:
-            user = get_user()
-            try:
-                data = user.buy(
-                    security=order.security,
-                    price=order.price,
-                    amount=order.amount
-                )
-                return {"code": 200, "data": data, "msg": "success"}
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
+        data = gui_worker.call(lambda: place_order('buy', order), GuiWorker.ORDER)
+        return {"code": 200, "data": data, "msg": "success"}
 
     @proxy_app.post("/sell", dependencies=[Depends(verify_token)])
     def sell(order: OrderRequest):
         """卖出下单"""
-        with server_lock:
-            user = get_user()
-            try:
-                data = user.sell(
-                    security=order.security,
-                    price=order.price,
-                    amount=order.amount
-                )
-                return {"code": 200, "data": data, "msg": "success"}
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
+        data = gui_worker.call(lambda: place_order('sell', order), GuiWorker.ORDER)
+        return {"code": 200, "data": data, "msg": "success"}
 
     return proxy_app
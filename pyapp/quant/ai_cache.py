@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+AI分析结果持久化缓存
+按 (模型, 提示词哈希, 快讯内容哈希) 保存大模型对快讯的分析结论，
+相同模型与提示词下重复分析同一条快讯时直接命中缓存，不再调用AI接口。
+提示词哈希取自去除快讯内容后的完整请求体（空白字符归一化），修改提示词或模型参数会自动使用新的缓存键。
+- 支持过期时间(TTL)与按最近使用时间淘汰(LRU)的容量上限
+- 相同键的并发请求合并为一次调用(single-flight)，其余请求等待并共享结果
+- get_verdict_cache: 实盘任务共享的进程级缓存；回放使用独立的不过期缓存
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from pyapp.config.config import Config
+
+CONTENT_PLACEHOLDER = '{{content}}' # 计算提示词哈希时替代快讯内容的占位符
+LIVE_CACHE_TTL = 24 * 3600 # 实盘缓存过期时间(秒)
+LIVE_CACHE_MAX_ENTRIES = 20000 # 实盘缓存最大条数
+EVICT_RATIO = 0.9 # 超出容量时淘汰至容量的比例，避免每次写入都触发淘汰
+
+
+def default_cache_dir() -> str:
+    '''本地持久化目录（Config.appDataDir/quant）'''
+    if not Config.appDataDir:
+        Config().getDir()
+    path = os.path.join(Config.appDataDir, 'quant')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def content_hash(content) -> str:
+    '''快讯内容哈希'''
+    return hashlib.sha256(str(content or '').encode('utf-8')).hexdigest()
+
+
+def _normalize(value):
+    '''字符串空白字符归一化（首尾去除、连续空白合并）'''
+    if isinstance(value, str):
+        return re.sub(r'\s+', ' ', value).strip()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def prompt_hash(payload: dict) -> str:
+    '''请求体（快讯内容以占位符替代）归一化后的哈希'''
+    text = json.dumps(_normalize(payload), ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    '''进行中的一次计算，相同键的后续请求等待其结果'''
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class VerdictCache:
+    '''
+    AI分析结论缓存（SQLite 持久化，线程安全）
+    ttl: 过期时间(秒)，0 表示不过期
+    max_entries: 最大条数，超出时按最近使用时间淘汰，0 表示不限制
+    只缓存成功解析的结论，调用失败(None)不写入，下次重新请求
+    '''
+
+    def __init__(self, path: Optional[str] = None, ttl=0, max_entries=0):
+        self.path = path or os.path.join(default_cache_dir(), 'ai_verdicts.db')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._inflight: Dict[tuple, _Flight] = {}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS verdicts ('
+            ' model TEXT NOT NULL, prompt_hash TEXT NOT NULL, content_hash TEXT NOT NULL,'
+            ' verdict TEXT NOT NULL, created_at REAL NOT NULL,'
+            ' PRIMARY KEY (model, prompt_hash, content_hash))'
+        )
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(verdicts)')]
+        if 'last_used' not in columns:
+            self._conn.execute('ALTER TABLE verdicts ADD COLUMN last_used REAL NOT NULL DEFAULT 0')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_verdicts_last_used ON verdicts (last_used)')
+        self._conn.commit()
+        self._count = self._conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0 # 等待并共享进行中请求结果的次数
+
+    def get(self, model, prompt_key, content_key) -> Optional[dict]:
+        key = (model, prompt_key, content_key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT verdict, created_at FROM verdicts WHERE model=? AND prompt_hash=? AND content_hash=?', key
+            ).fetchone()
+            if not row:
+                return None
+            if self.ttl and now - row[1] > self.ttl:
+                self._conn.execute('DELETE FROM verdicts WHERE model=? AND prompt_hash=? AND content_hash=?', key)
+                self._conn.commit()
+                self._count -= 1
+                return None
+            self._conn.execute(
+                'UPDATE verdicts SET last_used=? WHERE model=? AND prompt_hash=? AND content_hash=?', (now, *key)
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, model, prompt_key, content_key, verdict: dict):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO verdicts (model, prompt_hash, content_hash, verdict, created_at, last_used)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (model, prompt_key, content_key, json.dumps(verdict, ensure_ascii=False), now, now)
+            )
+            if cursor.rowcount:
+                self._count += 1
+            else:
+                self._conn.execute(
+                    'UPDATE verdicts SET verdict=?, created_at=?, last_used=?'
+                    ' WHERE model=? AND prompt_hash=? AND content_hash=?',
+                    (json.dumps(verdict, ensure_ascii=False), now, now, model, prompt_key, content_key)
+                )
+            if self.max_entries and self._count > self.max_entries:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        '''删除过期条目，仍超出容量时按最近使用时间淘汰至 max_entries * EVICT_RATIO'''
+        if self.ttl:
+            self._conn.execute('DELETE FROM verdicts WHERE created_at < ?', (now - self.ttl,))
+        self._count = self._conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+        excess = self._count - int(self.max_entries * EVICT_RATIO)
+        if self._count > self.max_entries and excess > 0:
+            self._conn.execute(
+                'DELETE FROM verdicts WHERE rowid IN (SELECT rowid FROM verdicts ORDER BY last_used LIMIT ?)',
+                (excess,)
+            )
+            self._count -= excess
+
+    def get_or_compute(self, model, prompt_key, content, compute: Callable[[], Optional[dict]],
+                       cache_only=False) -> Tuple[Optional[dict], bool]:
+        '''
+        读取缓存，未命中时调用 compute 并写入
+        相同键已有进行中的 compute 时等待其结果，不重复调用
+        cache_only: 未命中时不调用 compute，直接返回 None
+        返回: (结论, 是否命中缓存或共享进行中的结果)
+        '''
+        content_key = content_hash(content)
+        verdict = self.get(model, prompt_key, content_key)
+        if verdict is not None:
+            self.hits += 1
+            return verdict, True
+        if cache_only:
+            self.misses += 1
+            return None, False
+
+        key = (model, prompt_key, content_key)
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            self.shared += 1
+            return flight.result, flight.result is not None
+
+        try:
+            # 等待期间其他请求可能刚写入缓存
+            flight.result = self.get(model, prompt_key, content_key)
+            if flight.result is not None:
+                self.hits += 1
+                return flight.result, True
+            self.misses += 1
+            flight.result = compute()
+            if flight.result is not None:
+                self.put(model, prompt_key, content_key, flight.result)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+        return flight.result, False
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_verdict_cache = None
+_verdict_cache_lock = threading.Lock()
+
+
+def get_verdict_cache() -> VerdictCache:
+    '''获取实盘任务共享的进程级AI分析缓存（带过期时间与容量上限）'''
+    global _verdict_cache
+    with _verdict_cache_lock:
+        if _verdict_cache is None:
+            _verdict_cache = VerdictCache(
+                os.path.join(default_cache_dir(), 'ai_analysis.db'),
+                ttl=LIVE_CACHE_TTL, max_entries=LIVE_CACHE_MAX_ENTRIES
+            )
+        return _verdict_cache
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+后端数据上报服务
+成交记录、任务持仓、账户资产的上报统一进入每个后端地址一个的上报队列，由后台线程通过共享连接池批量发送：
+- 同一任务的持仓、同一账户的资产在发送前只保留最新值
+- 每个发送周期最多发送 BATCH_SIZE 条，队列达到批量大小时立即发送
+- 成交记录发送失败（网络异常、5xx 等可重试错误）时追加到本地 jsonl 暂存文件，
+  后端恢复后按原顺序补发；暂存非空时新成交记录直接排在其后，保证顺序；
+  持仓/资产更新不受暂存影响，照常发送
+- 鉴权失败（401/403）不视为后端不可用：先换用最新提交的 token 重发一次，仍失败的成交记录转入死信文件保留，
+  不会阻塞暂存队首
+- 发送中的成交记录在进程退出时同样写入暂存（至少一次：退出前恰好发送成功的记录可能被重复补发）
+- 上报接口可传入提交方的日志函数 log(message, level)（通常为任务日志），重试、拒绝、死信与补发消息记录到该日志；
+  进程重启后补发的暂存记录已无提交方，记录到上报服务自身的日志
+- get_backend_reporter: 按后端地址获取进程级共享的上报服务
+"""
+import os
+import json
+import time
+import atexit
+import uuid
+import hashlib
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+import httpx
+from .ai_cache import default_cache_dir
+
+FLUSH_INTERVAL = 1.0 # 发送周期(秒)
+BATCH_SIZE = 50 # 每个周期最多发送的条数
+RETRY_INTERVAL = 10.0 # 后端不可用时的重试间隔(秒)
+REPORT_TIMEOUT = 5 # 单次请求超时(秒)
+RETRYABLE_STATUS = (408, 429) # 可重试的 4xx 状态码，其余 4xx 视为数据错误直接丢弃
+AUTH_STATUS = (401, 403) # 鉴权失败的状态码
+
+TRADE_RECORD_PATH = '/quant/tradeRecord/createTradeRecord'
+TRADE_TASK_PATH = '/quant/tradeTask/updateTradeTask'
+ACCOUNT_PATH = '/quant/account/updateAccount'
+
+
+class ReportError(Exception):
+    '''上报失败，retryable 表示后端恢复后可以重新发送，auth 表示鉴权失败'''
+
+    def __init__(self, message, retryable=True, auth=False):
+        super().__init__(message)
+        self.retryable = retryable
+        self.auth = auth
+
+
+class BackendReporter:
+    '''
+    单个后端地址的上报服务
+    spool_path: 成交记录暂存文件，默认 Config.appDataDir/quant/report_spool_<地址哈希>.jsonl
+    dead_letter_path: 鉴权失败的成交记录，默认与暂存文件同目录的 report_deadletter_<地址哈希>.jsonl
+    '''
+
+    def __init__(self, backend_url, spool_path=None, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE, log=None):
+        self.backend_url = backend_url.rstrip('/')
+        url_hash = hashlib.sha1(self.backend_url.encode('utf-8')).hexdigest()[:8]
+        self.spool_path = spool_path or os.path.join(default_cache_dir(), f'report_spool_{url_hash}.jsonl')
+        self.dead_letter_path = os.path.join(os.path.dirname(self.spool_path), f'report_deadletter_{url_hash}.jsonl')
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.log = log or (lambda message, level='INFO': print(f'[{level}] BackendReporter: {message}'))
+        self.client = httpx.Client(
+            timeout=REPORT_TIMEOUT,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=30)
+        )
+        self._cond = threading.Condition()
+        self._spool_lock = threading.Lock()
+        self._order = deque() # 待发送的写入键（按提交顺序）
+        self._writes: Dict[tuple, dict] = {}
+        self._inflight: Dict[tuple, dict] = {} # 已取出、尚未处理完的写入（按提交顺序）
+        self._latest_token = None # 最近一次提交的 token（桌面端同一时间只有一个登录用户）
+        self._record_logs: Dict[str, Callable] = {} # {暂存记录ID: 提交方日志}，补发时记录到提交方日志
+        self._seq = 0
+        self._retry_at = 0.0
+        self._flush_requested = False
+        self._closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.dead_lettered = 0
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def create_trade_record(self, token, data: dict, on_sent: Optional[Callable[[], None]] = None, log=None):
+        '''上报成交记录（不合并，失败时暂存补发）'''
+        self._enqueue(None, 'POST', TRADE_RECORD_PATH, token, data, on_sent, log)
+
+    def update_trade_task(self, token, data: dict, on_sent: Optional[Callable[[], None]] = None, log=None):
+        '''更新任务持仓，同一任务只发送最新值'''
+        self._enqueue(('task', data.get('id')), 'PUT', TRADE_TASK_PATH, token, data, on_sent, log)
+
+    def update_account(self, token, data: dict, on_sent: Optional[Callable[[], None]] = None, log=None):
+        '''更新账户资产，同一账户只发送最新值'''
+        self._enqueue(('account', data.get('id')), 'PUT', ACCOUNT_PATH, token, data, on_sent, log)
+
+    def _enqueue(self, coalesce_key, method, path, token, data, on_sent, log):
+        write = {'method': method, 'path': path, 'token': token, 'data': data, 'on_sent': on_sent, 'log': log}
+        with self._cond:
+            if token:
+                self._latest_token = token
+            if coalesce_key is not None and coalesce_key in self._writes:
+                self._writes[coalesce_key] = write
+                self.coalesced += 1
+                return
+            if coalesce_key is None:
+                self._seq += 1
+                coalesce_key = ('record', self._seq)
+            self._writes[coalesce_key] = write
+            self._order.append(coalesce_key)
+            if len(self._order) >= self.batch_size:
+                self._cond.notify_all()
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._order) + len(self._inflight)
+
+    def spool_size(self) -> int:
+        with self._spool_lock:
+            return len(self._read_spool())
+
+    def flush(self, timeout=None) -> bool:
+        '''立即发送队列中的数据并等待发送完成，返回是否在超时前完成（暂存的成交记录不计入）'''
+        with self._cond:
+            self._retry_at = 0.0
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._order and not self._inflight, timeout)
+
+    def close(self):
+        '''停止发送线程，未发送的成交记录写入暂存'''
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=REPORT_TIMEOUT * 2)
+        self._spool_pending()
+        self.client.close()
+
+    def _send(self, write: dict):
+        headers = {
+            'x-token': write['token'],
+            'Content-Type': 'application/json'
+        }
+        try:
+            resp = self.client.request(
+                write['method'], f"{self.backend_url}{write['path']}", json=write['data'], headers=headers
+            )
+        except httpx.HTTPError as e:
+            raise ReportError(str(e))
+        if resp.status_code in AUTH_STATUS:
+            raise ReportError(f'HTTP {resp.status_code}', retryable=False, auth=True)
+        if resp.status_code >= 500 or resp.status_code in RETRYABLE_STATUS:
+            raise ReportError(f'HTTP {resp.status_code}')
+        if resp.status_code != 200:
+            raise ReportError(f'HTTP {resp.status_code} {resp.text[:200]}', retryable=False)
+
+    def _send_write(self, write: dict):
+        '''发送单条写入；鉴权失败且已有更新的 token 时换用最新 token 重发一次'''
+        try:
+            self._send(write)
+        except ReportError as e:
+            token = self._latest_token
+            if not e.auth or not token or token == write['token']:
+                raise
+            write['token'] = token
+            self._send(write)
+
+    def _log(self, write: dict, message, level='INFO'):
+        '''记录到提交方日志，未提供时记录到上报服务日志'''
+        (write.get('log') or self.log)(message, level)
+
+    def _reject(self, write: dict, error: ReportError):
+        '''后端拒绝的写入：鉴权失败的成交记录转入死信文件，其余丢弃'''
+        if error.auth and write['path'] == TRADE_RECORD_PATH:
+            self._write_spool([self._spool_record(write)], append=True, path=self.dead_letter_path)
+            self.dead_lettered += 1
+            self._log(write, f'成交记录鉴权失败，已转入死信文件 {self.dead_letter_path}: {error}', 'ERROR')
+            return
+        self.dropped += 1
+        self._log(write, f"{write['path']} 上报被后端拒绝，已丢弃: {error}", 'ERROR')
+
+    def _read_spool(self) -> List[dict]:
+        if not os.path.exists(self.spool_path):
+            return []
+        writes = []
+        with open(self.spool_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        writes.append(json.loads(line))
+                    except ValueError:
+                        self.log(f'忽略损坏的暂存记录: {line[:100]}', 'WARNING')
+        return writes
+
+    def _write_spool(self, writes: List[dict], append=False, path=None):
+        path = path or self.spool_path
+        if append:
+            with open(path, 'a', encoding='utf-8') as f:
+                for write in writes:
+                    f.write(json.dumps(write, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            return
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for write in writes:
+                f.write(json.dumps(write, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _spool_record(write: dict) -> dict:
+        return {k: write[k] for k in ('id', 'method', 'path', 'token', 'data') if k in write}
+
+    def _spool(self, writes: List[dict]):
+        if not writes:
+            return
+        records = []
+        for write in writes:
+            write.setdefault('id', uuid.uuid4().hex)
+            if write.get('log'):
+                self._record_logs[write['id']] = write['log']
+            records.append(self._spool_record(write))
+        with self._spool_lock:
+            self._write_spool(records, append=True)
+        self.spooled += len(records)
+        for log in self._distinct_logs(writes):
+            log(f'成交记录暂未发送，已暂存{len(records)}条，后端可用后自动补发', 'WARNING')
+
+    def _distinct_logs(self, writes: List[dict]) -> List[Callable]:
+        logs = []
+        for write in writes:
+            log = write.get('log') or self.log
+            if log not in logs:
+                logs.append(log)
+        return logs
+
+    def _replay_spool(self) -> bool:
+        '''按顺序补发暂存的成交记录，遇到可重试错误（后端不可用）时停止；返回暂存是否已清空'''
+        with self._spool_lock:
+            writes = self._read_spool()
+            if not writes:
+                return True
+            done = 0
+            for write in writes:
+                write['log'] = self._record_logs.get(write.get('id'))
+                try:
+                    self._send_write(write)
+                    self.replayed += 1
+                except ReportError as e:
+                    if e.retryable:
+                        break
+                    self._reject(write, e)
+                done += 1
+            remaining = writes[done:]
+            if done:
+                if remaining:
+                    self._write_spool([self._spool_record(w) for w in remaining])
+                else:
+                    os.remove(self.spool_path)
+                for write in writes[:done]:
+                    self._record_logs.pop(write.get('id'), None)
+                for log in self._distinct_logs(writes[:done]):
+                    log(f'已补发暂存成交记录{done}条，剩余{len(remaining)}条')
+            return not remaining
+
+    def _take_batch(self) -> List[tuple]:
+        with self._cond:
+            batch = []
+            while self._order and len(batch) < self.batch_size:
+                key = self._order.popleft()
+                write = self._inflight[key] = self._writes.pop(key)
+                batch.append((key, write))
+            return batch
+
+    def _settle(self, key):
+        with self._cond:
+            self._inflight.pop(key, None)
+
+    def _defer_inflight(self):
+        '''未发送的写入：成交记录写入暂存，持仓/资产更新放回队首（期间已有更新值时丢弃旧值）；调用方持有 _cond'''
+        records = []
+        for key, write in reversed(list(self._inflight.items())):
+            if key[0] == 'record':
+                records.append(write)
+            elif key not in self._writes:
+                self._writes[key] = write
+                self._order.appendleft(key)
+        self._inflight.clear()
+        records.reverse()
+        # 持有 _cond 写入暂存，退出时的 _spool_pending 不会重复暂存或遗漏
+        self._spool(records)
+
+    def _flush_once(self):
+        records_ok = self._replay_spool() # 暂存清空前新成交记录直接排入暂存，保证顺序
+        backend_ok = True
+        batch = self._take_batch()
+        try:
+            for key, write in batch:
+                is_record = key[0] == 'record'
+                if not backend_ok or (is_record and not records_ok):
+                    continue
+                try:
+                    self._send_write(write)
+                except ReportError as e:
+                    if e.retryable:
+                        self._log(write, f"{write['path']} 上报失败: {e}，{RETRY_INTERVAL:.0f}秒后重试", 'WARNING')
+                        backend_ok = records_ok = False
+                        continue
+                    self._settle(key)
+                    self._reject(write, e)
+                    continue
+                self._settle(key)
+                self.sent += 1
+                if write.get('on_sent'):
+                    try:
+                        write['on_sent']()
+                    except Exception:
+                        pass
+        finally:
+            with self._cond:
+                self._defer_inflight()
+                if not backend_ok or not records_ok:
+                    self._retry_at = time.time() + RETRY_INTERVAL
+                self._cond.notify_all()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                # 每个周期发送一次，队列达到批量大小或调用 flush() 时提前发送；后端不可用时等待到重试时间
+                deadline = time.time() + self.flush_interval
+                while not self._closed:
+                    now = time.time()
+                    if now >= self._retry_at and (now >= deadline or self._flush_requested
+                                                  or len(self._order) >= self.batch_size):
+                        break
+                    wake_at = self._retry_at if now < self._retry_at else deadline
+                    self._cond.wait(max(0.01, wake_at - now))
+                if self._closed:
+                    return
+                self._flush_requested = False
+            try:
+                self._flush_once()
+            except Exception as e:
+                self.log(f'上报异常: {e}', 'ERROR')
+
+    def _spool_pending(self):
+        '''进程退出前将未发送（含发送中）的成交记录写入暂存'''
+        with self._cond:
+            records = [write for key, write in self._inflight.items() if key[0] == 'record']
+            records += [self._writes[key] for key in self._order if key[0] == 'record']
+            self._inflight.clear()
+            self._order.clear()
+            self._writes.clear()
+            self._spool(records)
+
+
+_reporters: Dict[str, BackendReporter] = {}
+_reporters_lock = threading.Lock()
+
+
+def get_backend_reporter(backend_url) -> BackendReporter:
+    '''获取后端地址对应的进程级上报服务'''
+    key = backend_url.rstrip('/')
+    with _reporters_lock:
+        reporter = _reporters.get(key)
+        if reporter is None:
+            reporter = _reporters[key] = BackendReporter(key)
+        return reporter
+
+
+@atexit.register
+def _spool_on_exit():
+    with _reporters_lock:
+        reporters = list(_reporters.values())
+    for reporter in reporters:
+        reporter._spool_pending()
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+事件驱动回测引擎
+将历史逐笔/K线数据回放给真实的策略决策逻辑（默认 GridStrategy，代码不做修改）：
+- VirtualClock: 虚拟时钟，sleep 直接推进到下一笔行情，time/now 返回行情时间，不占用真实时间
+- SimTrader: 模拟交易接口，按委托价成交（滑点已由 _safe_buy/_safe_sell 计入），
+  计算佣金/印花税，当日买入次日可卖(T+1)
+- BacktestEngine: 组装策略、时钟与模拟交易接口并同步运行，输出收益、回撤、换手等统计
+"""
+import datetime
+from bisect import bisect_right
+from typing import Dict, List, Optional
+import pandas as pd
+from .clock import SystemClock
+from .trader import QuantTrader
+
+EPOCH = datetime.datetime(1970, 1, 1)
+DATE_ONLY_TIME = datetime.time(14, 59) # 仅有日期的日K线按收盘前一分钟计入交易时段
+TIME_COLUMNS = ('datetime', 'time', 'timestamp', 'date', 'day', 'trade_time', 'trade_date')
+PRICE_COLUMNS = ('price', 'close', 'last', 'current')
+
+
+class TickData:
+    '''
+    回放行情序列（按时间升序）
+    每笔行情包含价格及当日开盘、最高、最低、昨收，与 get_stock_quote 返回格式一致
+    '''
+
+    def __init__(self, times: List[float], prices: List[float], opens: List[float],
+                 highs: List[float], lows: List[float], pre_closes: List[float]):
+        self.times = times # 行情时间，1970-01-01 起的秒数（不含时区）
+        self.prices = prices
+        self.opens = opens
+        self.highs = highs
+        self.lows = lows
+        self.pre_closes = pre_closes
+
+    def __len__(self):
+        return len(self.times)
+
+    def quote(self, i) -> dict:
+        return {
+            'price': self.prices[i],
+            'open': self.opens[i],
+            'pre_close': self.pre_closes[i],
+            'high': self.highs[i],
+            'low': self.lows[i],
+        }
+
+    @staticmethod
+    def to_datetime(seconds) -> datetime.datetime:
+        return EPOCH + datetime.timedelta(seconds=seconds)
+
+
+def _pick_column(df, candidates, kind):
+    columns = {str(c).lower(): c for c in df.columns}
+    for name in candidates:
+        if name in columns:
+            return columns[name]
+    raise ValueError(f'回测数据缺少{kind}列，可选列名: {", ".join(candidates)}')
+
+
+def load_ticks(source) -> TickData:
+    '''
+    加载回测行情
+    source: CSV/Parquet 文件路径或 DataFrame
+    必需列: 时间(datetime/time/date...) 与价格(price/close...)，
+    可选列 open/high/low/pre_close（K线数据），缺失时按交易日从价格序列推算
+    '''
+    if isinstance(source, pd.DataFrame):
+        df = source.copy()
+    elif str(source).lower().endswith(('.parquet', '.pq')):
+        df = pd.read_parquet(source)
+    else:
+        df = pd.read_csv(source)
+
+    time_col = _pick_column(df, TIME_COLUMNS, '时间')
+    price_col = _pick_column(df, PRICE_COLUMNS, '价格')
+    columns = {str(c).lower(): c for c in df.columns}
+
+    times = pd.to_datetime(df[time_col])
+    if getattr(times.dt, 'tz', None) is not None:
+        times = times.dt.tz_localize(None)
+    if (times == times.dt.normalize()).all():
+        times = times + pd.Timedelta(hours=DATE_ONLY_TIME.hour, minutes=DATE_ONLY_TIME.minute)
+
+    data = pd.DataFrame({'time': times, 'price': df[price_col].astype(float)})
+    for name in ('open', 'high', 'low', 'pre_close'):
+        if name in columns and columns[name] != price_col:
+            data[name] = df[columns[name]].astype(float)
+    data = data[data['price'] > 0].sort_values('time', kind='stable').reset_index(drop=True)
+
+    day = data['time'].dt.normalize()
+    grouped = data.groupby(day)['price']
+    if 'open' not in data:
+        data['open'] = grouped.transform('first')
+    if 'high' not in data:
+        data['high'] = grouped.cummax()
+    if 'low' not in data:
+        data['low'] = grouped.cummin()
+    if 'pre_close' not in data:
+        day_close = grouped.last()
+        previous = day_close.shift(1)
+        previous.iloc[:1] = data['open'].iloc[:1].values
+        data['pre_close'] = day.map(previous).astype(float)
+
+    seconds = (data['time'] - pd.Timestamp(EPOCH)) / pd.Timedelta(seconds=1)
+    return TickData(
+        seconds.tolist(), data['price'].tolist(), data['open'].tolist(),
+        data['high'].tolist(), data['low'].tolist(), data['pre_close'].tolist()
+    )
+
+
+class VirtualClock(SystemClock):
+    '''
+    虚拟时钟
+    sleep(s) 推进 s 秒，期间没有新行情时直接跳到下一笔行情时间；
+    行情回放完毕时调用 on_finish 通知策略退出
+    '''
+
+    def __init__(self, ticks: TickData, on_finish=None):
+        self.ticks = ticks
+        self.on_finish = on_finish
+        self.cursor = 0
+        self.current = ticks.times[0] if len(ticks) else 0.0
+        self.finished = len(ticks) == 0
+
+    def time(self) -> float:
+        return self.current
+
+    def now(self) -> datetime.datetime:
+        return TickData.to_datetime(self.current)
+
+    def sleep(self, seconds):
+        if self.finished:
+            return
+        times = self.ticks.times
+        if self.cursor + 1 >= len(times):
+            self.finished = True
+            if self.on_finish:
+                self.on_finish()
+            return
+        target = self.current + max(seconds, 0)
+        if times[self.cursor + 1] > target:
+            # 休眠期间无新行情，直接跳到下一笔
+            self.cursor += 1
+            self.current = times[self.cursor]
+        else:
+            self.cursor = bisect_right(times, target, lo=self.cursor) - 1
+            self.current = target
+
+    def seek(self, i):
+        '''直接定位到第 i 笔行情（按K线逐根驱动时使用）'''
+        self.cursor = i
+        self.current = self.ticks.times[i]
+
+    def quote(self) -> dict:
+        return self.ticks.quote(self.cursor)
+
+
+class SimTrader(QuantTrader):
+    '''
+    模拟交易接口（单标的）
+    - 委托按价格全部成交，资金不足或可卖数量不足时拒绝
+    - 佣金按成交额 commission_rate 计算（不低于 min_commission），卖出另收 stamp_duty
+    - 当日买入数量次日才可卖出(T+1)
+    '''
+
+    def __init__(self, clock: VirtualClock, initial_cash=100000.0, initial_position=0,
+                 commission_rate=0.00025, min_commission=5.0, stamp_duty=0.0005, log_callback=None):
+        super().__init__(log_callback)
+        self.clock = clock
+        self.tushare = None
+        self.akshare = 'backtest' # 非空，避免策略初始化外部数据源
+        self.easyquotation = None
+        self.initial_cash = float(initial_cash)
+        self.cash = float(initial_cash)
+        self.quantity = int(initial_position)
+        self.cost = 0.0
+        self.commission_rate = commission_rate
+        self.min_commission = min_commission
+        self.stamp_duty = stamp_duty
+        self.stock_code = ''
+        self.bought_date = None
+        self.bought_today = 0
+        self.trades: List[dict] = []
+        self.fees = 0.0
+        self.turnover = 0.0
+        if self.quantity > 0:
+            self.cost = self.quantity * clock.quote()['price']
+
+    def init_data_source(self, data_platform='tushare', data_source='sina', data_token=None):
+        pass
+
+    def start_balance_monitor(self, interval=600):
+        pass
+
+    def stop_balance_monitor(self):
+        pass
+
+    def send_notification(self, color='blue', title=None, content=None):
+        pass
+
+    def get_stock_quote(self, ts_code):
+        return self.clock.quote()
+
+    def _locked_quantity(self) -> int:
+        today = self.clock.now().date()
+        if self.bought_date != today:
+            self.bought_date = today
+            self.bought_today = 0
+        return self.bought_today
+
+    def _fee(self, amount, is_sell) -> float:
+        fee = max(amount * self.commission_rate, self.min_commission) if amount > 0 else 0.0
+        if is_sell:
+            fee += amount * self.stamp_duty
+        return fee
+
+    def _record(self, action, price, volume, fee, reason):
+        self.fees += fee
+        self.turnover += price * volume
+        self.trades.append({
+            'time': self.clock.now(),
+            'action': action,
+            'price': price,
+            'quantity': volume,
+            'amount': price * volume,
+            'fee': fee,
+            'cash': self.cash,
+            'position': self.quantity,
+            'reason': reason,
+        })
+
+    def buy(self, stock_code, price, volume, reason=None):
+        price = self._normalize_price(price)
+        volume = int(volume)
+        if price <= 0 or volume <= 0:
+            return None
+        amount = price * volume
+        fee = self._fee(amount, False)
+        if amount + fee > self.cash:
+            self.log(f'{stock_code}模拟买入失败：资金不足(需{amount + fee:.2f}, 有{self.cash:.2f})', 'WARNING')
+            return None
+        self._locked_quantity()
+        self.stock_code = stock_code
+        self.cash -= amount + fee
+        self.quantity += volume
+        self.cost += amount + fee
+        self.bought_today += volume
+        self._record('buy', price, volume, fee, reason)
+        return {'entrust_no': f'bt_{len(self.trades)}', 'status': 'filled'}
+
+    def sell(self, stock_code, price, volume, reason=None):
+        price = self._normalize_price(price)
+        volume = int(volume)
+        available = self.quantity - self._locked_quantity()
+        if price <= 0 or volume <= 0 or volume > available:
+            self.log(f'{stock_code}模拟卖出失败：可卖数量不足(需{volume}, 有{available})', 'WARNING')
+            return None
+        amount = price * volume
+        fee = self._fee(amount, True)
+        self.cost -= self.cost * volume / self.quantity
+        self.cash += amount - fee
+        self.quantity -= volume
+        self._record('sell', price, volume, fee, reason)
+        return {'entrust_no': f'bt_{len(self.trades)}', 'status': 'filled'}
+
+    def get_position(self, stock_code):
+        price = self.clock.quote()['price']
+        locked = self._locked_quantity()
+        market_value = self.quantity * price
+        cost_price = self.cost / self.quantity if self.quantity else 0.0
+        return {
+            'stock_code': stock_code,
+            'stock_name': '',
+            'total_quantity': self.quantity,
+            'available_quantity': max(self.quantity - locked, 0),
+            'frozen_quantity': min(locked, self.quantity),
+            'cost_price': cost_price,
+            'current_price': price,
+            'market_value': market_value,
+            'total_pl_amount': market_value - self.cost,
+            'total_pl_ratio': (market_value - self.cost) / self.cost * 100 if self.cost else 0.0,
+            'daily_pl_amount': 0.0,
+            'daily_pl_ratio': 0.0,
+            'position_ratio': market_value / self.equity() * 100 if self.equity() else 0.0,
+            'daily_buy_quantity': locked,
+            'daily_sell_quantity': 0,
+        }
+
+    def get_positions(self):
+        return [self.get_position(self.stock_code)] if self.quantity else []
+
+    def get_balance(self):
+        market_value = self.quantity * self.clock.quote()['price']
+        return {
+            'total_asset': self.cash + market_value,
+            'market_value': market_value,
+            'available_balance': self.cash,
+        }
+
+    def equity(self) -> float:
+        return self.cash + self.quantity * self.clock.quote()['price']
+
+
+def summarize(trader: SimTrader, ticks: TickData, initial_position=0) -> dict:
+    '''汇总回测结果：收益、最大回撤（按交易日收盘权益）、换手率、交易次数'''
+    initial_price = ticks.prices[0] if len(ticks) else 0.0
+    initial_equity = trader.initial_cash + initial_position * initial_price
+
+    # 按交易日末笔价格与当日末笔成交后的资金/持仓计算权益
+    trades = trader.trades
+    cash, quantity = trader.initial_cash, initial_position
+    equity_curve = []
+    t = 0
+    day_ends = [
+        i for i in range(len(ticks))
+        if i + 1 == len(ticks) or int(ticks.times[i] // 86400) != int(ticks.times[i + 1] // 86400)
+    ]
+    for i in day_ends:
+        day_end = TickData.to_datetime(ticks.times[i])
+        while t < len(trades) and trades[t]['time'] <= day_end:
+            cash, quantity = trades[t]['cash'], trades[t]['position']
+            t += 1
+        equity_curve.append((day_end.date(), cash + quantity * ticks.prices[i]))
+
+    peak, max_drawdown = initial_equity, 0.0
+    for _, equity in equity_curve:
+        peak = max(peak, equity)
+        if peak > 0:
+            max_drawdown = max(max_drawdown, (peak - equity) / peak)
+
+    final_equity = equity_curve[-1][1] if equity_curve else initial_equity
+    return {
+        'initial_equity': initial_equity,
+        'final_equity': final_equity,
+        'pnl': final_equity - initial_equity,
+        'return_ratio': (final_equity - initial_equity) / initial_equity if initial_equity else 0.0,
+        'max_drawdown': max_drawdown,
+        'turnover': trader.turnover / initial_equity if initial_equity else 0.0,
+        'fees': trader.fees,
+        'trade_count': len(trades),
+        'buy_count': sum(1 for trade in trades if trade['action'] == 'buy'),
+        'sell_count': sum(1 for trade in trades if trade['action'] == 'sell'),
+        'final_position': trader.quantity,
+        'equity_curve': equity_curve,
+        'trades': trades,
+    }
+
+
+class BacktestEngine:
+    '''
+    回测引擎
+    config: 策略配置（与任务 config 一致），回测中强制 enableRealTrade 以经过模拟交易接口成交
+    stock: 标的信息 {'symbol', 'ts_code', 'name'}
+    verbose: 为 False 时仅输出 WARNING/ERROR 日志
+    '''
+
+    def __init__(self, config: dict, ticks, stock: Optional[dict] = None, strategy_cls=None,
+                 initial_cash=100000.0, initial_position=0, commission_rate=0.00025,
+                 min_commission=5.0, stamp_duty=0.0005, verbose=False, log_callback=None):
+        if strategy_cls is None:
+            from .strategies.grid import GridStrategy
+            strategy_cls = GridStrategy
+        self.strategy_cls = strategy_cls
+        self.config = dict(config or {})
+        self.ticks = ticks if isinstance(ticks, TickData) else load_ticks(ticks)
+        self.stock = stock or {'symbol': '000001', 'ts_code': '000001.SZ', 'name': 'Backtest'}
+        self.initial_cash = initial_cash
+        self.initial_position = initial_position
+        self.fee_options = {
+            'commission_rate': commission_rate,
+            'min_commission': min_commission,
+            'stamp_duty': stamp_duty,
+        }
+        self.verbose = verbose
+        self.log_callback = log_callback
+        self.logs: List[tuple] = []
+
+    def _log(self, message, level='INFO'):
+        if not self.verbose and level not in ('WARNING', 'ERROR'):
+            return
+        self.logs.append((level, str(message)))
+        if self.log_callback:
+            try:
+                self.log_callback(level, 'Backtest', str(message))
+            except Exception:
+                pass
+
+    def build_strategy(self):
+        '''创建策略实例并注入虚拟时钟与模拟交易接口'''
+        config = {**self.config, 'enableRealTrade': True}
+        data = {
+            'id': 0,
+            'name': 'Backtest',
+            'task': {'config': config, 'stock': dict(self.stock)},
+        }
+        strategy = self.strategy_cls(data, None)
+        clock = VirtualClock(self.ticks, on_finish=lambda: setattr(strategy, 'running', False))
+        trader = SimTrader(clock, self.initial_cash, self.initial_position, **self.fee_options)
+        trader.stock_code = self.stock.get('symbol', '')
+        trader.log = self._log
+        strategy.clock = clock
+        strategy.trader = trader
+        strategy.log = self._log
+        return strategy
+
+    def run(self) -> Dict:
+        if not len(self.ticks):
+            raise ValueError('回测数据为空')
+        strategy = self.build_strategy()
+        strategy.running = True
+        try:
+            strategy.run()
+        finally:
+            strategy.running = False
+            session = getattr(strategy, 'session', None)
+            if session:
+                session.close()
+        return summarize(strategy.trader, self.ticks, self.initial_position)
+
+
+def run_backtest(config: dict, ticks, stock: Optional[dict] = None, **options) -> Dict:
+    '''回测便捷入口，参数同 BacktestEngine'''
+    return BacktestEngine(config, ticks, stock, **options).run()
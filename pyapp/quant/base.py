@@ -2,6 +2,7 @@
 import threading
 import time
 from .trader import QuantTrader
+from .clock import system_clock
 
 class BaseStrategy:
     def __init__(self, data, log_callback=None, connect_trader=True):
@@ -11,6 +12,11 @@ class BaseStrategy:
         self.thread = None
         self.connect_trader = connect_trader
         self.trader = QuantTrader(log_callback)
+        self.quote_hub = None # 进程级行情中心，由 TaskManager 注入
+        self.quote_subscription = None # 当前在行情中心的行情订阅
+        self.news_feed = None # 进程级快讯中心，由 TaskManager 注入
+        self.order_pipeline = None # 进程级下单后处理流水线，由 TaskManager 注入
+        self.clock = system_clock # 策略时钟，回测时替换为虚拟时钟
         
         # 初始化交易器，根据任务配置中的账户信息连接到真实交易接口或模拟交易接口
         account = data.get('account', {})
@@ -36,6 +42,9 @@ class BaseStrategy:
         if self.running:
             return
         self.running = True
+        self._subscribe_quote()
+        self.trader.order_pipeline = self.order_pipeline
+        self.trader.pipeline_key = self.data.get('id')
         self.thread = threading.Thread(target=self._run_loop)
         self.thread.daemon = True
         self.thread.start()
@@ -44,11 +53,51 @@ class BaseStrategy:
 
     def stop(self):
         self.running = False
+        self._unsubscribe_quote()
         if self.connect_trader:
             self.trader.stop_balance_monitor()
         if self.thread and self.thread != threading.current_thread():
             self.thread.join(timeout=1)
 
+    def _subscribe_quote(self):
+        '''将任务标的加入行情中心订阅（无固定标的的策略跳过）'''
+        ts_code = getattr(self, 'stock_info', {}).get('ts_code')
+        if not self.quote_hub or not ts_code or self.quote_subscription:
+            return
+        self.quote_subscription = self.quote_hub.subscribe(
+            ts_code, interval=getattr(self, 'monitor_interval', None), log=self.log
+        )
+        self.trader.quote_hub = self.quote_hub
+
+    def _unsubscribe_quote(self):
+        if self.quote_subscription:
+            self.quote_subscription.close()
+            self.quote_subscription = None
+
+    def _after_order(self, name, func, *args, **kwargs):
+        '''
+        下单后的上报/刷新操作：有流水线时提交后台按任务顺序执行（失败重试），
+        否则同步执行并记录异常
+        '''
+        if self.order_pipeline:
+            self.order_pipeline.submit(self.data.get('id'), func, *args, name=name, log=self.log, **kwargs)
+            return
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            self.log(f"{name}失败: {e}", "WARNING")
+
+    def _wait_tick(self, timeout):
+        '''
+        等待下一次价格变化，最长等待 timeout 秒
+        未订阅行情中心时退化为固定休眠；返回新行情快照或 None
+        '''
+        subscription = self.quote_subscription
+        if subscription:
+            return subscription.wait(timeout)
+        self.clock.sleep(timeout)
+        return None
+
     def _run_loop(self):
         try:
             self.run()
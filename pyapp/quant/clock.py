@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+策略时钟
+策略通过 self.clock 读取时间与休眠，实盘使用系统时钟，回测注入虚拟时钟，
+使 sleep/time/now 不再阻塞真实时间。
+"""
+import time
+import datetime
+
+
+class SystemClock:
+    '''系统时钟（实盘默认）'''
+
+    def time(self) -> float:
+        return time.time()
+
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+system_clock = SystemClock()
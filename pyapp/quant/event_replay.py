@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+"""
+事件策略回放
+按时间顺序回放录制的快讯流（id, ctime, content），经过 EventStrategy 的
+contains_keywords 关键词过滤与 process_signal 信号处理（置信度、Price In、方向与涨跌幅风控），
+AI分析结论从 ai_cache.VerdictCache 读取（键为 模型 + 提示词哈希 + 内容哈希），
+重复回放不再调用AI接口；成交按快讯时间点的历史行情模拟（佣金、印花税、T+1）。
+- compare_variants: 同一段快讯上对比多组配置（提示词、置信度阈值、风控参数等）
+简化假设：按快讯时间之前最近一笔行情的价格成交，使用日K线时即为前一交易日收盘价，
+需要更精确的成交价时传入分钟K线或逐笔行情。
+"""
+import sys
+import json
+import datetime
+from bisect import bisect_right
+from typing import Dict, List, Optional
+import pandas as pd
+from .ai_cache import CONTENT_PLACEHOLDER, VerdictCache, prompt_hash
+from .backtest import EPOCH, TickData, load_ticks
+from .clock import SystemClock
+from .quote_hub import to_sina_symbol
+from .trader import QuantTrader
+from .trend_backtest import DEFAULT_DATALEN, bars_to_ticks, load_kline_history
+
+MARKET_TZ_OFFSET = 8 * 3600 # 快讯 ctime 为 Unix 时间戳，换算为北京时间与行情时间对齐
+DAY_CLOSE = 15 * 3600 # 交易日收盘时间（当日秒数）
+
+
+def _plain_code(code) -> str:
+    '''统一为6位股票代码（600519 / 600519.SH / sh600519 -> 600519）'''
+    symbol = to_sina_symbol(code)
+    return symbol[2:] if symbol[:2] in ('sh', 'sz', 'bj') else str(code or '').strip()
+
+
+def _to_seconds(value) -> float:
+    '''快讯时间转换为 1970-01-01 起的秒数（北京时间，不含时区）'''
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.strip().isdigit()):
+        seconds = float(value)
+        if seconds > 1e11: # 毫秒时间戳
+            seconds /= 1000.0
+        return seconds + MARKET_TZ_OFFSET
+    moment = pd.Timestamp(value)
+    if moment.tzinfo is not None:
+        moment = moment.tz_convert('Asia/Shanghai').tz_localize(None)
+    return (moment.to_pydatetime() - EPOCH).total_seconds()
+
+
+def load_news(source) -> List[dict]:
+    '''
+    加载录制的快讯流
+    source: CSV / JSON / JSONL 文件路径、DataFrame 或快讯列表，字段 id, ctime, content
+    返回: [{'id', 'ctime', 'time', 'content'}]，按 (time, id) 升序
+    '''
+    if isinstance(source, pd.DataFrame):
+        items = source.to_dict('records')
+    elif isinstance(source, (list, tuple)):
+        items = list(source)
+    elif str(source).lower().endswith('.jsonl'):
+        with open(source, 'r', encoding='utf-8') as f:
+            items = [json.loads(line) for line in f if line.strip()]
+    elif str(source).lower().endswith('.json'):
+        with open(source, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        if isinstance(items, dict):
+            items = items.get('list') or items.get('data') or []
+    else:
+        items = pd.read_csv(source).to_dict('records')
+
+    news = []
+    for item in items:
+        content = item.get('content')
+        if not content or item.get('ctime') is None:
+            continue
+        news.append({
+            'id': int(item.get('id', 0) or 0),
+            'ctime': item['ctime'],
+            'time': _to_seconds(item['ctime']),
+            'content': str(content),
+        })
+    news.sort(key=lambda x: (x['time'], x['id']))
+    return news
+
+
+class HistoricalQuotes:
+    '''
+    历史行情（按标的惰性加载）
+    sources: {股票代码: 行情文件路径 / DataFrame / TickData}，
+    未提供的标的从K线缓存加载 timeframe 周期的K线
+    '''
+
+    def __init__(self, sources: Optional[dict] = None, timeframe=240, datalen=DEFAULT_DATALEN, log=None):
+        self.sources = {_plain_code(code): source for code, source in (sources or {}).items()}
+        self.timeframe = timeframe
+        self.datalen = datalen
+        self.log = log
+        self._ticks: Dict[str, Optional[TickData]] = {}
+
+    def _load(self, code) -> Optional[TickData]:
+        if code in self._ticks:
+            return self._ticks[code]
+        ticks = None
+        try:
+            source = self.sources.get(code)
+            if isinstance(source, TickData):
+                ticks = source
+            elif source is not None:
+                ticks = load_ticks(source)
+            else:
+                bars = load_kline_history(code, self.timeframe, self.datalen)
+                ticks = bars_to_ticks(bars) if bars else None
+        except Exception as e:
+            if self.log:
+                self.log(f"加载{code}历史行情失败: {e}", "WARNING")
+        self._ticks[code] = ticks
+        return ticks
+
+    def quote(self, code, seconds) -> dict:
+        '''seconds 时刻之前最近一笔行情，无数据时返回空字典'''
+        ticks = self._load(_plain_code(code))
+        if not ticks or not len(ticks):
+            return {}
+        i = bisect_right(ticks.times, seconds) - 1
+        return ticks.quote(i) if i >= 0 else {}
+
+
+class ReplayClock(SystemClock):
+    '''回放时钟：时间由回放进度设置，sleep 只推进时间'''
+
+    def __init__(self, seconds=0.0):
+        self.current = seconds
+
+    def time(self) -> float:
+        return self.current
+
+    def now(self) -> datetime.datetime:
+        return TickData.to_datetime(self.current)
+
+    def sleep(self, seconds):
+        self.current += max(seconds, 0)
+
+
+class ReplayTrader(QuantTrader):
+    '''
+    回放模拟交易接口（多标的）
+    按回放时刻的历史行情估值，费用与 T+1 规则同 backtest.SimTrader
+    '''
+
+    def __init__(self, clock: ReplayClock, quotes: HistoricalQuotes, initial_cash=100000.0,
+                 commission_rate=0.00025, min_commission=5.0, stamp_duty=0.0005, log_callback=None):
+        super().__init__(log_callback)
+        self.clock = clock
+        self.quotes = quotes
+        self.tushare = None
+        self.akshare = 'replay' # 非空，避免策略初始化外部数据源
+        self.easyquotation = None
+        self.initial_cash = float(initial_cash)
+        self.cash = float(initial_cash)
+        self.commission_rate = commission_rate
+        self.min_commission = min_commission
+        self.stamp_duty = stamp_duty
+        self.holdings: Dict[str, dict] = {} # {代码: {'quantity', 'cost', 'bought_date', 'bought_today'}}
+        self.trades: List[dict] = []
+        self.fees = 0.0
+        self.turnover = 0.0
+
+    def init_data_source(self, data_platform='tushare', data_source='sina', data_token=None):
+        pass
+
+    def start_balance_monitor(self, interval=600):
+        pass
+
+    def stop_balance_monitor(self):
+        pass
+
+    def send_notification(self, color='blue', title=None, content=None):
+        pass
+
+    def get_stock_quote(self, ts_code):
+        return self.quotes.quote(ts_code, self.clock.time())
+
+    def _holding(self, code) -> dict:
+        holding = self.holdings.setdefault(code, {'quantity': 0, 'cost': 0.0, 'bought_date': None, 'bought_today': 0})
+        today = self.clock.now().date()
+        if holding['bought_date'] != today:
+            holding['bought_date'] = today
+            holding['bought_today'] = 0
+        return holding
+
+    def _fee(self, amount, is_sell) -> float:
+        fee = max(amount * self.commission_rate, self.min_commission) if amount > 0 else 0.0
+        if is_sell:
+            fee += amount * self.stamp_duty
+        return fee
+
+    def _record(self, action, code, price, volume, fee, reason):
+        self.fees += fee
+        self.turnover += price * volume
+        self.trades.append({
+            'time': self.clock.now(),
+            'action': action,
+            'stock_code': code,
+            'price': price,
+            'quantity': volume,
+            'amount': price * volume,
+            'fee': fee,
+            'cash': self.cash,
+            'position': self.holdings[code]['quantity'],
+            'reason': reason,
+        })
+
+    def buy(self, stock_code, price, volume, reason=None):
+        code = _plain_code(stock_code)
+        price = self._normalize_price(price)
+        volume = int(volume)
+        if price <= 0 or volume <= 0:
+            return None
+        amount = price * volume
+        fee = self._fee(amount, False)
+        if amount + fee > self.cash:
+            self.log(f'{code}模拟买入失败：资金不足(需{amount + fee:.2f}, 有{self.cash:.2f})', 'WARNING')
+            return None
+        holding = self._holding(code)
+        self.cash -= amount + fee
+        holding['quantity'] += volume
+        holding['cost'] += amount + fee
+        holding['bought_today'] += volume
+        self._record('buy', code, price, volume, fee, reason)
+        return {'entrust_no': f'replay_{len(self.trades)}', 'status': 'filled'}
+
+    def sell(self, stock_code, price, volume, reason=None):
+        code = _plain_code(stock_code)
+        price = self._normalize_price(price)
+        volume = int(volume)
+        holding = self._holding(code)
+        available = holding['quantity'] - holding['bought_today']
+        if price <= 0 or volume <= 0 or volume > available:
+            self.log(f'{code}模拟卖出失败：可卖数量不足(需{volume}, 有{available})', 'WARNING')
+            return None
+        amount = price * volume
+        fee = self._fee(amount, True)
+        holding['cost'] -= holding['cost'] * volume / holding['quantity']
+        holding['quantity'] -= volume
+        self.cash += amount - fee
+        self._record('sell', code, price, volume, fee, reason)
+        return {'entrust_no': f'replay_{len(self.trades)}', 'status': 'filled'}
+
+    def get_position(self, stock_code):
+        code = _plain_code(stock_code)
+        if code not in self.holdings or not self.holdings[code]['quantity']:
+            return {}
+        holding = self._holding(code)
+        quantity = holding['quantity']
+        price = float(self.get_stock_quote(code).get('price', 0) or 0)
+        market_value = quantity * price
+        locked = min(holding['bought_today'], quantity)
+        return {
+            'stock_code': code,
+            'stock_name': '',
+            'total_quantity': quantity,
+            'available_quantity': quantity - locked,
+            'frozen_quantity': locked,
+            'cost_price': holding['cost'] / quantity,
+            'current_price': price,
+            'market_value': market_value,
+            'total_pl_amount': market_value - holding['cost'],
+            'total_pl_ratio': (market_value - holding['cost']) / holding['cost'] * 100 if holding['cost'] else 0.0,
+            'daily_pl_amount': 0.0,
+            'daily_pl_ratio': 0.0,
+            'position_ratio': 0.0,
+            'daily_buy_quantity': locked,
+            'daily_sell_quantity': 0,
+        }
+
+    def get_positions(self):
+        return [self.get_position(code) for code, holding in self.holdings.items() if holding['quantity']]
+
+    def market_value(self, seconds=None) -> float:
+        seconds = self.clock.time() if seconds is None else seconds
+        value = 0.0
+        for code, holding in self.holdings.items():
+            if holding['quantity']:
+                value += holding['quantity'] * float(self.quotes.quote(code, seconds).get('price', 0) or 0)
+        return value
+
+    def get_balance(self):
+        market_value = self.market_value()
+        return {
+            'total_asset': self.cash + market_value,
+            'market_value': market_value,
+            'available_balance': self.cash,
+        }
+
+    def equity(self, seconds=None) -> float:
+        return self.cash + self.market_value(seconds)
+
+
+class EventReplay:
+    '''
+    事件策略回放
+    config: 策略配置（与任务 config 一致），回放中强制 enableRealTrade 以经过模拟交易接口成交
+    news: 快讯文件路径 / DataFrame / 列表（见 load_news）
+    ai: AI配置 {'ai_model', 'ai_key', 'ai_url'}，缓存未命中时用于调用AI接口
+    cache_only: 只使用缓存结论，未命中的快讯跳过（不产生AI调用费用）
+    verbose: 为 False 时仅输出 WARNING/ERROR 日志
+    '''
+
+    def __init__(self, config: dict, news, quotes: Optional[HistoricalQuotes] = None,
+                 cache: Optional[VerdictCache] = None, ai: Optional[dict] = None, initial_cash=100000.0,
+                 commission_rate=0.00025, min_commission=5.0, stamp_duty=0.0005,
+                 cache_only=False, verbose=False, log_callback=None):
+        self.config = dict(config or {})
+        self.news = news if isinstance(news, list) and (not news or 'time' in news[0]) else load_news(news)
+        self.verbose = verbose
+        self.log_callback = log_callback
+        self.logs: List[tuple] = []
+        self.quotes = quotes or HistoricalQuotes(log=self._log)
+        self.cache = cache or VerdictCache()
+        self.ai = dict(ai or {})
+        self.initial_cash = initial_cash
+        self.fee_options = {
+            'commission_rate': commission_rate,
+            'min_commission': min_commission,
+            'stamp_duty': stamp_duty,
+        }
+        self.cache_only = cache_only
+
+    def _log(self, message, level='INFO'):
+        if not self.verbose and level not in ('WARNING', 'ERROR'):
+            return
+        self.logs.append((level, str(message)))
+        if self.log_callback:
+            try:
+                self.log_callback(level, 'EventReplay', str(message))
+            except Exception:
+                pass
+
+    def build_strategy(self):
+        '''创建策略实例并注入回放时钟与模拟交易接口（不连接真实账户、不发送通知）'''
+        from .strategies.event import EventStrategy
+        config = {**self.config, 'enableRealTrade': True}
+        data = {'id': 0, 'name': 'EventReplay', 'task': {'config': config}}
+        strategy = EventStrategy(data, None)
+        strategy.ai_model = self.ai.get('ai_model', strategy.ai_model)
+        strategy.ai_key = self.ai.get('ai_key', '')
+        strategy.ai_url = self.ai.get('ai_url', '')
+        strategy.webhook_url = ''
+        clock = ReplayClock(self.news[0]['time'] if self.news else 0.0)
+        trader = ReplayTrader(clock, self.quotes, self.initial_cash, **self.fee_options)
+        trader.log = self._log
+        strategy.clock = clock
+        strategy.trader = trader
+        strategy.log = self._log
+        return strategy
+
+    def run(self) -> Dict:
+        if not self.news:
+            raise ValueError('回放快讯为空')
+        strategy = self.build_strategy()
+        clock, trader = strategy.clock, strategy.trader
+        prompt_key = prompt_hash(strategy.build_ai_payload(CONTENT_PLACEHOLDER))
+        can_call = bool(strategy.ai_key and strategy.ai_url) and not self.cache_only
+
+        signals = []
+        equity_curve = []
+        matched = api_calls = cache_hits = skipped = 0
+        day = int(self.news[0]['time'] // 86400)
+        for item in self.news:
+            item_day = int(item['time'] // 86400)
+            if item_day != day:
+                equity_curve.append(self._day_end_equity(trader, day))
+                day = item_day
+            clock.current = item['time']
+            strategy.last_news_id = item['id']
+            if not strategy.contains_keywords(item['content']):
+                continue
+            matched += 1
+
+            payload = strategy.build_ai_payload(item['content'])
+            verdict, cached = self.cache.get_or_compute(
+                strategy.ai_model, prompt_key, item['content'],
+                lambda: strategy.request_ai(payload), cache_only=not can_call
+            )
+            if cached:
+                cache_hits += 1
+            elif can_call:
+                api_calls += 1
+            if not isinstance(verdict, dict):
+                skipped += 1
+                continue
+
+            trade_count = len(trader.trades)
+            strategy.process_signal(verdict)
+            signals.append({
+                'id': item['id'],
+                'time': clock.now(),
+                'signal': verdict.get('signal'),
+                'related_stock': verdict.get('related_stock'),
+                'confidence': verdict.get('confidence'),
+                'is_priced_in': verdict.get('is_priced_in'),
+                'cached': cached,
+                'traded': len(trader.trades) > trade_count,
+            })
+        equity_curve.append(self._day_end_equity(trader, day))
+
+        peak, max_drawdown = self.initial_cash, 0.0
+        for _, equity in equity_curve:
+            peak = max(peak, equity)
+            if peak > 0:
+                max_drawdown = max(max_drawdown, (peak - equity) / peak)
+        final_equity = equity_curve[-1][1]
+        trades = trader.trades
+        return {
+            'initial_equity': self.initial_cash,
+            'final_equity': final_equity,
+            'pnl': final_equity - self.initial_cash,
+            'return_ratio': (final_equity - self.initial_cash) / self.initial_cash if self.initial_cash else 0.0,
+            'max_drawdown': max_drawdown,
+            'turnover': trader.turnover / self.initial_cash if self.initial_cash else 0.0,
+            'fees': trader.fees,
+            'trade_count': len(trades),
+            'news_count': len(self.news),
+            'matched_count': matched,
+            'signal_count': len(signals),
+            'skipped_count': skipped,
+            'api_calls': api_calls,
+            'cache_hits': cache_hits,
+            'equity_curve': equity_curve,
+            'signals': signals,
+            'trades': trades,
+        }
+
+    @staticmethod
+    def _day_end_equity(trader: ReplayTrader, day) -> tuple:
+        day_end = day * 86400 + DAY_CLOSE
+        return TickData.to_datetime(day_end).date(), trader.equity(day_end)
+
+
+def run_event_replay(config: dict, news, **options) -> Dict:
+    '''回放便捷入口，参数同 EventReplay'''
+    return EventReplay(config, news, **options).run()
+
+
+def compare_variants(news, variants: Dict[str, dict], base_config: Optional[dict] = None,
+                     quotes: Optional[HistoricalQuotes] = None, cache: Optional[VerdictCache] = None,
+                     **options) -> Dict[str, Dict]:
+    '''
+    同一段快讯上按多组配置回放，返回 {名称: 回放结果}
+    各组共享快讯、历史行情与AI结论缓存，只改阈值/风控的配置不会产生新的AI调用
+    '''
+    news = news if isinstance(news, list) and (not news or 'time' in news[0]) else load_news(news)
+    quotes = quotes or HistoricalQuotes()
+    cache = cache or VerdictCache()
+    return {
+        name: run_event_replay({**(base_config or {}), **overrides}, news, quotes=quotes, cache=cache, **options)
+        for name, overrides in variants.items()
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='事件策略快讯回放')
+    parser.add_argument('news', help='录制的快讯文件(CSV/JSON/JSONL)，字段 id, ctime, content')
+    parser.add_argument('--config', help='策略配置 JSON 文件')
+    parser.add_argument('--variants', help='对比配置 JSON 文件，格式 {"名称": {配置覆盖...}}')
+    parser.add_argument('--cache', help='AI结论缓存数据库路径')
+    parser.add_argument('--cache-only', action='store_true', help='只使用缓存结论，不调用AI接口')
+    parser.add_argument('--ai-model', default='deepseek-chat', help='AI模型')
+    parser.add_argument('--ai-key', default='', help='AI Key')
+    parser.add_argument('--ai-url', default='', help='AI接口地址')
+    parser.add_argument('--timeframe', type=int, default=240, help='历史行情K线周期')
+    parser.add_argument('--cash', type=float, default=100000.0, help='初始资金')
+    args = parser.parse_args()
+
+    base = {}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+    variants = {'default': {}}
+    if args.variants:
+        with open(args.variants, 'r', encoding='utf-8') as f:
+            variants = json.load(f)
+    results = compare_variants(
+        args.news, variants, base,
+        quotes=HistoricalQuotes(timeframe=args.timeframe),
+        cache=VerdictCache(args.cache),
+        ai={'ai_model': args.ai_model, 'ai_key': args.ai_key, 'ai_url': args.ai_url},
+        initial_cash=args.cash, cache_only=args.cache_only,
+    )
+    for name, result in results.items():
+        print(
+            f"{name}: 收益 {result['pnl']:.2f} ({result['return_ratio']*100:.2f}%) | "
+            f"最大回撤 {result['max_drawdown']*100:.2f}% | 交易 {result['trade_count']} | "
+            f"匹配快讯 {result['matched_count']} | AI调用 {result['api_calls']} | 缓存命中 {result['cache_hits']}"
+        )
+    sys.exit(0)
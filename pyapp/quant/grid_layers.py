@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+网格层级价格表
+基准价或重置变化时按 zeroLayerMode 预先计算有序的层级边界价格，
+逐笔行情只需在边界表上二分查找，无需每次计算对数。
+边界价格固定后层级划分精确可复现，回测与界面展示可直接复用同一张表。
+"""
+import math
+from bisect import bisect_right
+from typing import List
+
+LAYER_MARGIN = 2 # 价格区间之外额外预留的层数
+MAX_TABLE_LAYERS = 2000 # 单侧最大层数，超出部分按对数公式计算
+
+
+def map_raw_layer(raw_int: int, zero_layer_mode: int) -> int:
+    '''
+    将对数层级(floor 后)映射为网格层级索引
+    zeroLayerMode: 1 双倍宽(Base±P) 2 中心对称(Base±P/2) 3 标准单边(Base~Base+P)
+    模式2 的半层偏移已体现在边界价格上，此处不再调整
+    '''
+    if zero_layer_mode == 1:
+        if raw_int == -1:
+            return 0
+        if raw_int < -1:
+            return raw_int + 1
+    return raw_int
+
+
+class GridLayerTable:
+    '''
+    网格层级表
+    boundaries[i] 为第 i 条层级线价格（升序），layers[i] 为价格落在
+    [boundaries[i-1], boundaries[i]) 时的层级索引，len(layers) == len(boundaries) + 1
+    '''
+
+    def __init__(self, base_price: float, layer_percent: float, zero_layer_mode: int = 1,
+                 lower_price: float = 0.0, upper_price: float = 0.0, trade_layers: int = 0):
+        self.base_price = base_price
+        self.layer_percent = layer_percent
+        self.zero_layer_mode = zero_layer_mode
+        self.lower_price = lower_price
+        self.upper_price = upper_price
+        self.trade_layers = trade_layers
+        self.log_layer_base = math.log(1 + layer_percent) if layer_percent > 0 else 0.01
+        # 模式2 层级线位于 Base*(1+P)^(k-0.5)
+        self.offset = -0.5 if zero_layer_mode == 2 else 0.0
+
+        self.min_raw = 0
+        self.boundaries: List[float] = []
+        self.layers: List[int] = [0]
+        if base_price > 0:
+            self._build()
+
+    def _raw_span(self, price) -> int:
+        if price <= 0:
+            return 0
+        return int(math.ceil(abs(math.log(price / self.base_price)) / self.log_layer_base))
+
+    def _build(self):
+        span = max(self.trade_layers, self._raw_span(self.lower_price), self._raw_span(self.upper_price))
+        span = min(span + LAYER_MARGIN, MAX_TABLE_LAYERS)
+        self.min_raw = -span
+        ratio = math.exp(self.log_layer_base)
+        self.boundaries = [
+            self.base_price * math.pow(ratio, k + self.offset)
+            for k in range(-span, span + 1)
+        ]
+        # 低于第一条层级线时的对数层级为 -span-1
+        self.layers = [
+            map_raw_layer(k, self.zero_layer_mode)
+            for k in range(-span - 1, span + 1)
+        ]
+
+    def matches(self, base_price, layer_percent, zero_layer_mode) -> bool:
+        return (self.base_price == base_price and self.layer_percent == layer_percent
+                and self.zero_layer_mode == zero_layer_mode)
+
+    def index(self, price: float) -> int:
+        '''计算价格所在层级索引'''
+        if price <= 0 or self.base_price <= 0:
+            return 0
+        slot = bisect_right(self.boundaries, price)
+        if 0 < slot < len(self.boundaries):
+            return self.layers[slot]
+        # 超出预计算范围，按对数公式计算
+        raw_float = math.log(price / self.base_price) / self.log_layer_base
+        return map_raw_layer(int(math.floor(raw_float - self.offset)), self.zero_layer_mode)
+
+    def layer_lines(self) -> List[dict]:
+        '''层级线列表（供回测/界面展示）：[{'price', 'below', 'above'}]'''
+        return [
+            {'price': price, 'below': self.layers[i], 'above': self.layers[i + 1]}
+            for i, price in enumerate(self.boundaries)
+        ]
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+网格参数寻优
+对历史行情按参数网格（layerPercent × tradeLayers × fallbackRatio × reboundRatio × zeroLayerMode × deploymentMode ...）
+做全组合回测，输出按收益排序的结果表（收益、换手率、最大回撤、交易次数）。
+- 行情数据只加载一次，放入共享内存，各工作进程直接映射读取，不按任务序列化传输
+- 组合分批分发到 ProcessPoolExecutor，每个组合独立驱动一个 GridState 状态机
+- 时钟推进与 GridStrategy 在 backtest.VirtualClock 下一致（交易时段判断、非交易时段暂停、monitorInterval 采样），
+  成交模型与 backtest.SimTrader 一致（委托价按分四舍五入、滑点、佣金、印花税、T+1）；
+  未模拟动态滑点（按固定滑点处理）、启动自动对齐（autoAlign）、自动建仓（autoOpenPosition）与任务有效期，
+  使用这些配置时以 backtest.run_backtest 为准
+- cross_check: 单组参数与 backtest.run_backtest 完整回放对比（含止盈止损后剩余持仓的估值）
+"""
+import os
+import sys
+import json
+import itertools
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+import numpy as np
+from .backtest import TickData, load_ticks, run_backtest
+from .trader import normalize_price
+from .grid_state import GridParams, GridState, BUY, SELL
+
+SERIES_FIELDS = ('times', 'prices', 'opens', 'pre_closes')
+DEFAULT_OPTIONS = {
+    'initial_cash': 100000.0,
+    'initial_position': 0,
+    'commission_rate': 0.00025,
+    'min_commission': 5.0,
+    'stamp_duty': 0.0005,
+}
+PAUSE_INTERVAL = 10 # 非交易时段的检查间隔(秒)，与 GridStrategy 一致
+# 交易时段（当日秒数）
+MORNING_START, MORNING_END = 9 * 3600 + 25 * 60, 11 * 3600 + 30 * 60
+AFTERNOON_START, AFTERNOON_END = 13 * 3600, 15 * 3600
+RESULT_COLUMNS = ('pnl', 'return_ratio', 'max_drawdown', 'turnover', 'trade_count', 'fees')
+PARITY_COLUMNS = ('pnl', 'max_drawdown', 'turnover', 'trade_count', 'fees', 'final_position')
+
+# 工作进程内的共享行情（由 _init_worker 映射）
+_worker_shm = None
+_worker_series = None
+
+
+class SharedTicks:
+    '''
+    共享内存中的行情序列
+    按 SERIES_FIELDS 顺序连续存放 float64 数组，工作进程按名称映射后以 memoryview 读取
+    '''
+
+    def __init__(self, ticks: TickData):
+        self.length = len(ticks)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, 8 * self.length * len(SERIES_FIELDS)))
+        block = np.ndarray((len(SERIES_FIELDS), self.length), dtype=np.float64, buffer=self.shm.buf)
+        for row, field in enumerate(SERIES_FIELDS):
+            block[row] = getattr(ticks, field)
+        del block
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _attach_shared(name):
+    '''映射已有共享内存（由主进程负责释放，工作进程不重复登记）'''
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError: # Python < 3.13：子进程与主进程共用资源回收进程，重复登记无影响
+        return shared_memory.SharedMemory(name=name)
+
+
+def _series_views(buf, length) -> Dict[str, memoryview]:
+    values = buf.cast('d')
+    return {
+        field: values[row * length:(row + 1) * length]
+        for row, field in enumerate(SERIES_FIELDS)
+    }
+
+
+def _init_worker(name, length):
+    global _worker_shm, _worker_series
+    _worker_shm = _attach_shared(name)
+    _worker_series = _series_views(_worker_shm.buf, length)
+
+
+def _resolve_base_price(config, price, open_price, pre_close):
+    '''与 GridStrategy.run 的基准价规则一致'''
+    base_price_type = int(config.get('basePriceType', 0))
+    manual_base_price = float(config.get('basePrice', 0))
+    base_price = 0.0
+    if base_price_type == 1:
+        base_price = manual_base_price
+    elif base_price_type == 2:
+        base_price = price
+    elif base_price_type == 3:
+        base_price = open_price if open_price > 0 else price
+    elif base_price_type == 4:
+        base_price = pre_close if pre_close > 0 else price
+    else:
+        base_price = manual_base_price if manual_base_price > 0 else price
+    if base_price <= 0:
+        base_price = price
+    float_ratio = float(config.get('basePriceFloatRatio', 0))
+    if float_ratio != 0:
+        base_price = base_price * (1 + float_ratio / 100.0)
+    return base_price
+
+
+def _day_ends(times) -> List[int]:
+    '''各交易日末笔行情的位置'''
+    days = np.asarray(times, dtype=np.float64) // 86400
+    return np.flatnonzero(np.diff(days, append=days[-1] + 1) != 0).tolist()
+
+
+def _in_trading_time(now) -> bool:
+    '''与 GridStrategy._is_trading_time 一致：周一到周五 9:25-11:30、13:00-15:00'''
+    day = now // 86400
+    if (day + 3) % 7 > 4: # 1970-01-01 为周四
+        return False
+    seconds = now - day * 86400
+    return MORNING_START <= seconds < MORNING_END or AFTERNOON_START <= seconds < AFTERNOON_END
+
+
+def simulate_grid(config: dict, series: Dict[str, object], options: Optional[dict] = None) -> dict:
+    '''
+    单组参数回测
+    series: {'times', 'prices', 'opens', 'pre_closes'}，可为列表或 memoryview
+    与 GridStrategy.run 在 backtest.VirtualClock 下的推进方式一致：非交易时段每 PAUSE_INTERVAL 秒检查一次，
+    交易时段按 monitorInterval 采样行情（期间无行情时跳到下一笔），逐笔驱动 GridState
+    '''
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    times, prices = series['times'], series['prices']
+    opens, pre_closes = series['opens'], series['pre_closes']
+    n = len(prices)
+    if n == 0:
+        raise ValueError('回测数据为空')
+
+    params = GridParams(config)
+    interval = max(int(config.get('monitorInterval', 10)), 0)
+    reset_daily = bool(config.get('resetBasePriceDaily', False))
+    ignore_trading_time = bool(config.get('ignoreTradingTime', False))
+    slippage = float(config.get('slippageRatio', 0)) / 100.0
+    max_hold_type = int(config.get('maxHoldType', -2))
+    max_hold_quantity = int(config.get('maxHoldQuantity', 10000))
+    max_hold_amount = float(config.get('maxHoldAmount', 0))
+    max_hold_ratio = float(config.get('maxHoldRatio', 0))
+    commission_rate = options['commission_rate']
+    min_commission = options['min_commission']
+    stamp_duty = options['stamp_duty']
+
+    cash = float(options['initial_cash'])
+    quantity = int(options['initial_position'])
+    initial_equity = cash + quantity * prices[0]
+
+    # 日末权益（与 backtest.summarize 一致）：日末行情价格 × 不晚于该行情时间的成交后的资金/持仓
+    day_ends = _day_ends(times)
+    next_end = 0
+    peak = initial_equity
+    max_drawdown = 0.0
+
+    def mark_day_ends(until):
+        '''计入行情时间早于 until 的日末权益（在 until 时刻成交前调用）'''
+        nonlocal next_end, peak, max_drawdown
+        while next_end < len(day_ends) and times[day_ends[next_end]] < until:
+            equity = cash + quantity * prices[day_ends[next_end]]
+            peak = max(peak, equity)
+            if peak > 0:
+                max_drawdown = max(max_drawdown, (peak - equity) / peak)
+            next_end += 1
+
+    state = None
+    day = None
+    bought_today = 0
+    turnover = 0.0
+    fees = 0.0
+    trade_count = 0
+    stopped = False
+
+    i = 0
+    now = times[0]
+    while True:
+        if not ignore_trading_time and not _in_trading_time(now):
+            step = PAUSE_INTERVAL
+        else:
+            step = interval
+            price = prices[i]
+            if state is None:
+                # 进入交易时段后以当前行情初始化基准价与网格状态
+                state = GridState(params, _resolve_base_price(config, price, opens[i], pre_closes[i]), price)
+            tick_day = int(now // 86400)
+            if day is None:
+                day = tick_day
+            elif tick_day != day:
+                day = tick_day
+                bought_today = 0
+                if reset_daily:
+                    state.rebase(_resolve_base_price(config, price, opens[i], pre_closes[i]), price)
+
+            action = state.on_tick(price, now)
+            if action is not None:
+                kind = action.kind
+                if kind == SELL or kind == BUY:
+                    volume = action.quantity
+                else:
+                    # 止盈/止损：卖出全部可用持仓后退出
+                    volume = quantity - bought_today
+                    kind = SELL
+                    stopped = True
+
+                if kind == SELL:
+                    if 0 < volume <= quantity - bought_today:
+                        fill = normalize_price(price * (1 - slippage))
+                        amount = fill * volume
+                        fee = max(amount * commission_rate, min_commission) + amount * stamp_duty
+                        mark_day_ends(now)
+                        cash += amount - fee
+                        quantity -= volume
+                        turnover += amount
+                        fees += fee
+                        trade_count += 1
+                    if not stopped:
+                        state.on_fill(action, now)
+                else:
+                    allow_buy = True
+                    new_quantity = quantity + volume
+                    if max_hold_type in (0, 1) and max_hold_quantity > 0 and new_quantity > max_hold_quantity:
+                        allow_buy = False
+                    elif max_hold_type in (0, 2) and max_hold_amount > 0 and new_quantity * price > max_hold_amount:
+                        allow_buy = False
+                    elif max_hold_type in (0, 3) and max_hold_ratio > 0:
+                        total_asset = cash + quantity * price
+                        if total_asset > 0 and new_quantity * price / total_asset * 100 > max_hold_ratio:
+                            allow_buy = False
+
+                    if not allow_buy:
+                        state.on_reject(action)
+                    elif cash < volume * price:
+                        # 资金不足视为跳过本次交易
+                        state.on_fill(action, now)
+                    else:
+                        fill = normalize_price(price * (1 + slippage))
+                        amount = fill * volume
+                        fee = max(amount * commission_rate, min_commission)
+                        if amount + fee <= cash:
+                            mark_day_ends(now)
+                            cash -= amount + fee
+                            quantity = new_quantity
+                            bought_today += volume
+                            turnover += amount
+                            fees += fee
+                            trade_count += 1
+                            state.on_fill(action, now)
+
+        if stopped or i + 1 >= n:
+            break
+        # 推进时钟（与 backtest.VirtualClock.sleep 一致）：间隔内无新行情时直接跳到下一笔
+        target = now + step
+        if times[i + 1] > target:
+            i += 1
+            now = times[i]
+        else:
+            i = bisect_right(times, target, i + 1) - 1
+            now = target
+
+    # 止盈/止损后不再交易，未能卖出的持仓（如 T+1 锁定部分）按剩余各交易日收盘价继续计入权益与回撤
+    mark_day_ends(float('inf'))
+    final_equity = cash + quantity * prices[n - 1]
+    return {
+        'pnl': final_equity - initial_equity,
+        'return_ratio': (final_equity - initial_equity) / initial_equity if initial_equity else 0.0,
+        'max_drawdown': max_drawdown,
+        'turnover': turnover / initial_equity if initial_equity else 0.0,
+        'trade_count': trade_count,
+        'fees': fees,
+        'final_position': quantity,
+        'stopped': stopped,
+    }
+
+
+def cross_check(config: dict, history, options: Optional[dict] = None, tolerance=1e-6) -> dict:
+    '''
+    与 backtest.run_backtest 完整回放对比
+    history: 行情文件路径 / DataFrame / TickData
+    返回: {'match': bool, 'fast': {...}, 'backtest': {...}}
+    '''
+    ticks = history if isinstance(history, TickData) else load_ticks(history)
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    fast = simulate_grid(config, {field: getattr(ticks, field) for field in SERIES_FIELDS}, options)
+    backtest = run_backtest(config, ticks, **options)
+    return {'match': results_match(fast, backtest, tolerance), 'fast': fast, 'backtest': backtest}
+
+
+def results_match(result: dict, expected: dict, tolerance=1e-6) -> bool:
+    '''两次回测的指标是否在容差内一致'''
+    return all(
+        abs(result[key] - expected[key]) <= tolerance * max(1.0, abs(expected[key]))
+        for key in PARITY_COLUMNS
+    )
+
+
+def _run_combo(task):
+    index, config, options = task
+    try:
+        result = simulate_grid(config, _worker_series, options)
+    except Exception as e:
+        result = {'error': str(e)}
+    return index, result
+
+
+def expand_grid(param_grid: Dict[str, list], base_config: Optional[dict] = None) -> List[dict]:
+    '''展开参数网格为配置列表，param_grid: {配置键: [取值...]}'''
+    base_config = dict(base_config or {})
+    keys = list(param_grid.keys())
+    return [
+        {**base_config, **dict(zip(keys, values))}
+        for values in itertools.product(*(param_grid[key] for key in keys))
+    ]
+
+
+def optimize(history, param_grid: Dict[str, list], base_config: Optional[dict] = None,
+             workers: Optional[int] = None, sort_by='pnl', descending=True,
+             options: Optional[dict] = None) -> List[dict]:
+    '''
+    并行参数寻优
+    history: 行情文件路径 / DataFrame / TickData
+    返回按 sort_by 排序的结果列表：[{'params': {...}, 'pnl', 'return_ratio', 'max_drawdown', ...}]
+    '''
+    ticks = history if isinstance(history, TickData) else load_ticks(history)
+    configs = expand_grid(param_grid, base_config)
+    if not configs:
+        return []
+
+    shared = SharedTicks(ticks)
+    results = [None] * len(configs)
+    workers = workers or os.cpu_count() or 1
+    try:
+        tasks = [(i, config, options) for i, config in enumerate(configs)]
+        chunksize = max(1, len(tasks) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared.name, shared.length)) as executor:
+            for index, result in executor.map(_run_combo, tasks, chunksize=chunksize):
+                results[index] = result
+    finally:
+        shared.close()
+
+    keys = list(param_grid.keys())
+    rows = []
+    for config, result in zip(configs, results):
+        rows.append({'params': {key: config[key] for key in keys}, **result})
+    valid = [row for row in rows if 'error' not in row]
+    valid.sort(key=lambda row: row.get(sort_by, 0), reverse=descending)
+    return valid + [row for row in rows if 'error' in row]
+
+
+def format_table(rows: List[dict], top: Optional[int] = 20) -> str:
+    '''结果表格文本'''
+    rows = rows[:top] if top else rows
+    if not rows:
+        return ''
+    keys = list(rows[0]['params'].keys())
+    header = ['#'] + keys + list(RESULT_COLUMNS)
+    lines = []
+    for rank, row in enumerate(rows, 1):
+        if 'error' in row:
+            lines.append([str(rank)] + [str(row['params'][k]) for k in keys] + [f"错误: {row['error']}"])
+            continue
+        lines.append(
+            [str(rank)] + [str(row['params'][k]) for k in keys] + [
+                f"{row['pnl']:.2f}", f"{row['return_ratio']*100:.2f}%", f"{row['max_drawdown']*100:.2f}%",
+                f"{row['turnover']:.2f}", str(row['trade_count']), f"{row['fees']:.2f}",
+            ]
+        )
+    widths = [max(len(str(item[i])) for item in [header] + lines if i < len(item)) for i in range(len(header))]
+    return '\n'.join(
+        '  '.join(str(cell).rjust(widths[i]) for i, cell in enumerate(line))
+        for line in [header] + lines
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='网格策略参数寻优')
+    parser.add_argument('history', help='历史行情文件(CSV/Parquet)')
+    parser.add_argument('--grid', required=True, help='参数网格 JSON 文件，格式 {"layerPercent": [0.5, 1.0], ...}')
+    parser.add_argument('--base', help='基础配置 JSON 文件')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数，默认为 CPU 核数')
+    parser.add_argument('--sort', default='pnl', help='排序字段')
+    parser.add_argument('--top', type=int, default=20, help='输出前 N 名')
+    parser.add_argument('--cash', type=float, default=DEFAULT_OPTIONS['initial_cash'], help='初始资金')
+    parser.add_argument('--position', type=int, default=0, help='初始持仓')
+    args = parser.parse_args()
+
+    with open(args.grid, 'r', encoding='utf-8') as f:
+        grid = json.load(f)
+    base = {}
+    if args.base:
+        with open(args.base, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+    ascending = args.sort in ('max_drawdown', 'fees')
+    table = optimize(
+        args.history, grid, base, workers=args.workers, sort_by=args.sort, descending=not ascending,
+        options={'initial_cash': args.cash, 'initial_position': args.position}
+    )
+    print(format_table(table, args.top))
+    sys.exit(0)
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""
+网格策略状态机
+GridStrategy.run 的逐笔决策逻辑抽取为 GridState.on_tick(price, now)，不依赖交易接口与时钟：
+- on_tick 只根据价格与当前状态给出动作（买/卖/止盈/止损），无信号时返回 None
+- 动作执行结果由调用方回填：on_fill（成交或视为已交易）、on_reject（超出持仓限制）
+- 委托失败时不回填，状态保持不变，下一笔行情重新判断
+实盘循环、回测与参数扫描共用同一状态机。状态对象使用 __slots__，
+动作对象按类型预分配并复用，逐笔处理不产生新对象。
+"""
+import math
+from typing import Callable, Optional
+from .grid_layers import GridLayerTable
+
+BUY = 'buy'
+SELL = 'sell'
+STOP_PROFIT = 'stop_profit'
+STOP_LOSS = 'stop_loss'
+
+
+class GridParams:
+    '''网格决策参数（由任务配置解析）'''
+
+    __slots__ = (
+        'trade_layers', 'layer_percent', 'base_quantity', 'trade_direction', 'trade_quantity_type',
+        'max_resets', 'reset_ratio', 'fallback_ratio', 'rebound_ratio',
+        'max_repeat_times', 'min_price_gap', 'min_trade_interval',
+        'deployment_mode', 'include_base_layer', 'zero_layer_mode',
+        'price_range_mode', 'upper_ratio', 'lower_ratio', 'upper_price', 'lower_price',
+        'tp_type', 'tp_ratio', 'tp_price', 'sl_type', 'sl_ratio', 'sl_price',
+    )
+
+    def __init__(self, config: dict):
+        self.trade_layers = int(config.get('tradeLayers', 0))
+        self.layer_percent = float(config.get('layerPercent', 1.0)) / 100.0
+        self.base_quantity = int(config.get('baseQuantity', 100))
+        self.trade_direction = int(config.get('tradeDirection', 0)) # 0:双向 1:只买 2:只卖
+        self.trade_quantity_type = int(config.get('tradeQuantityType', 1)) # 1:固定 2:倍数
+
+        self.max_resets = int(config.get('maxResets', 0))
+        self.reset_ratio = float(config.get('resetRatio', 0))
+        self.fallback_ratio = float(config.get('fallbackRatio', 0)) / 100.0
+        self.rebound_ratio = float(config.get('reboundRatio', 0)) / 100.0
+
+        # 交易保护参数
+        self.max_repeat_times = int(config.get('maxRepeatTimes', 0))
+        self.min_price_gap = float(config.get('minPriceGap', 0.1)) / 100.0
+        self.min_trade_interval = int(config.get('minTradeInterval', 5))
+
+        # 交易模式：FULL_RANGE 全区间 / PARTITIONED 分治
+        self.deployment_mode = config.get('deploymentMode', 'FULL_RANGE')
+        self.include_base_layer = bool(config.get('includeBaseLayer', True))
+        self.zero_layer_mode = int(config.get('zeroLayerMode', 1))
+
+        # 价格区间
+        self.price_range_mode = int(config.get('priceRangeMode', 1)) # 1:比例 2:价格
+        self.upper_ratio = float(config.get('upperRatio', 0))
+        self.lower_ratio = float(config.get('lowerRatio', 0))
+        self.upper_price = float(config.get('upperPrice', 0))
+        self.lower_price = float(config.get('lowerPrice', 0))
+
+        # 止盈/止损 -1:不限 0:任意 1:比例 2:价格
+        self.tp_type = int(config.get('takeProfitType', -1))
+        self.tp_ratio = float(config.get('takeProfitRatio', 0))
+        self.tp_price = float(config.get('takeProfitPrice', 0))
+        self.sl_type = int(config.get('stopLossType', -1))
+        self.sl_ratio = float(config.get('stopLossRatio', 0))
+        self.sl_price = float(config.get('stopLossPrice', 0))
+
+    def price_range(self, base_price):
+        '''
+        计算价格区间（包含上下限）
+        返回: (lower_price, upper_price, swapped)，swapped 表示原始上下限颠倒已自动交换
+        '''
+        upper_price = 0.0
+        lower_price = 0.0
+
+        # 1. 计算原始区间
+        if self.price_range_mode == 1: # 比例模式
+            if self.upper_ratio != 0:
+                upper_price = base_price * (1 + self.upper_ratio / 100.0)
+            if self.lower_ratio != 0:
+                lower_price = base_price * (1 + self.lower_ratio / 100.0)
+        else: # 价格模式
+            upper_price = self.upper_price
+            lower_price = self.lower_price
+
+        # 2. 兜底逻辑：上下限无效（<=0）时按层级数推算
+        if upper_price <= 0:
+            if self.trade_layers > 0 and self.layer_percent > 0:
+                upper_price = base_price * math.pow(1 + self.layer_percent, self.trade_layers)
+            else:
+                upper_price = base_price * 1.2
+        if lower_price <= 0:
+            if self.trade_layers > 0 and self.layer_percent > 0:
+                lower_price = base_price * math.pow(1 + self.layer_percent, -self.trade_layers)
+            else:
+                lower_price = base_price * 0.8
+
+        # 3. 最终校验与修正
+        if lower_price > upper_price:
+            return upper_price, lower_price, True
+        return lower_price, upper_price, False
+
+
+class GridAction:
+    '''
+    网格动作（由 GridState 复用，调用方需在下一次 on_tick 前处理完毕）
+    index/from_index: 触发层级与上次交易层级；triggered: 是否由回落/反弹监控触发
+    '''
+
+    __slots__ = ('kind', 'price', 'index', 'from_index', 'quantity', 'triggered')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.price = 0.0
+        self.index = 0
+        self.from_index = 0
+        self.quantity = 0
+        self.triggered = False
+
+
+class GridState:
+    '''
+    单个网格实例的运行状态
+    log: 可选日志函数 log(message, level)，参数扫描时传 None 以跳过日志格式化
+    '''
+
+    __slots__ = (
+        'params', 'log', 'task_id', 'table',
+        'base_price', 'lower_price', 'upper_price', 'reset_count',
+        'last_layer_index', 'last_trade_time', 'last_trade_price', 'layer_repeat_counts',
+        'waiting_for_fallback', 'peak_price', 'fallback_monitor_start_layer_index',
+        'waiting_for_rebound', 'valley_price', 'rebound_monitor_start_layer_index',
+        '_buy', '_sell', '_stop_profit', '_stop_loss',
+    )
+
+    def __init__(self, params: GridParams, base_price: float, price: float,
+                 log: Optional[Callable] = None, task_id=0):
+        self.params = params
+        self.log = log
+        self.task_id = task_id
+        self.reset_count = 0
+        self.layer_repeat_counts = {} # 各层级已交易次数 {index: count}
+        self._buy = GridAction(BUY)
+        self._sell = GridAction(SELL)
+        self._stop_profit = GridAction(STOP_PROFIT)
+        self._stop_loss = GridAction(STOP_LOSS)
+        self.rebase(base_price, price)
+
+    def rebase(self, base_price: float, price: float):
+        '''设置基准价：重算区间与层级价格表，按 price 确定当前层级并清空运行状态'''
+        self.base_price = base_price
+        self.lower_price, self.upper_price, swapped = self.params.price_range(base_price)
+        if swapped and self.log:
+            self.log(f"警告：计算出的下限({self.upper_price:.3f})高于上限({self.lower_price:.3f})，自动交换。", "WARNING")
+        self.table = GridLayerTable(
+            base_price, self.params.layer_percent, self.params.zero_layer_mode,
+            lower_price=self.lower_price, upper_price=self.upper_price,
+            trade_layers=self.params.trade_layers
+        )
+        self.last_layer_index = self.layer_index(price)
+
+        # 运行时状态
+        self.last_trade_time = 0.0
+        self.last_trade_price = 0.0
+        self.layer_repeat_counts.clear()
+        self.waiting_for_fallback = False
+        self.peak_price = 0.0
+        self.fallback_monitor_start_layer_index = 0
+        self.waiting_for_rebound = False
+        self.valley_price = 0.0
+        self.rebound_monitor_start_layer_index = 0
+
+    def layer_index(self, price: float) -> int:
+        '''计算层级索引（限制在 ±tradeLayers 内）'''
+        index = self.table.index(price)
+        trade_layers = self.params.trade_layers
+        if trade_layers > 0:
+            index = max(-trade_layers, min(trade_layers, index))
+        return index
+
+    def _check_safety(self, price, index, now) -> Optional[str]:
+        '''交易前置检查，通过返回 None，否则返回原因'''
+        p = self.params
+        # 1. 最小交易间隔检查
+        if p.min_trade_interval > 0 and now - self.last_trade_time < p.min_trade_interval:
+            return f"未满足最小交易间隔 {p.min_trade_interval}s"
+
+        # 2. 最小价差检查 (如果是重复交易或震荡)
+        if self.last_trade_price > 0:
+            gap = abs(price - self.last_trade_price) / self.last_trade_price
+            if gap < p.min_price_gap:
+                return f"未满足最小价差 {p.min_price_gap*100}% (当前 {gap*100:.2f}%)"
+
+        # 3. 同层级最大交易次数检查，max_repeat_times 为 0 时表示不限制
+        if p.max_repeat_times > 0:
+            current_count = self.layer_repeat_counts.get(index, 0)
+            if index == self.last_layer_index and current_count >= p.max_repeat_times:
+                return f"层级 {index} 交易次数已达上限 {p.max_repeat_times}"
+        return None
+
+    def _trade_volume(self, index) -> int:
+        p = self.params
+        if p.trade_quantity_type != 2:
+            return p.base_quantity
+        # 进出平衡逻辑：取绝对值较大的索引作为倍数
+        # 跌下去买入2倍(curr=-2)，涨回来卖出2倍(last=-2)
+        idx_val = max(abs(index), abs(self.last_layer_index))
+        return p.base_quantity * (idx_val if idx_val > 0 else 1)
+
+    def _fill_action(self, action, price, index, triggered):
+        action.price = price
+        action.index = index
+        action.from_index = self.last_layer_index
+        action.quantity = self._trade_volume(index)
+        action.triggered = triggered
+        return action
+
+    def _check_reset(self, price) -> bool:
+        '''价格偏离基准达到 resetRatio 时以当前价重置网格，返回是否已重置'''
+        p = self.params
+        base_price = self.base_price
+        if base_price <= 0:
+            self.rebase(price, price)
+            return True
+
+        deviation = (price - base_price) / base_price
+        if abs(deviation) < p.reset_ratio / 100.0:
+            return False
+
+        tag = f"任务({self.task_id})"
+        if self.log:
+            direction_str = "上涨" if deviation > 0 else "下跌"
+            self.log(f"{tag}触发{direction_str}重置：价格 {price} 偏离基准 {base_price} 达 {abs(deviation)*100:.2f}% (阈值 {p.reset_ratio}%)，进度 ({self.reset_count+1}/{p.max_resets})")
+
+        # 当前价作为新基准，层级归零并重置运行状态
+        self.rebase(price, price)
+        if self.log and ((self.upper_price > 0 and price > self.upper_price) or (self.lower_price > 0 and price < self.lower_price)):
+            self.log(f"警告：重置后的基准价 {price} 超出策略范围 [{self.lower_price}, {self.upper_price}]，请检查参数设置。", "WARNING")
+
+        self.reset_count += 1
+        if self.log:
+            self.log(f"{tag}重置完成，新基准：{price:.3f}, 范围：[{self.lower_price:.3f}, {self.upper_price:.3f}]")
+        return True
+
+    def _stop_triggered(self, price, kind_type, ratio, limit_price, is_profit) -> bool:
+        '''止盈/止损条件判断 kind_type: 0 任意满足 1 按比例 2 按价格'''
+        base_price = self.base_price
+        if is_profit:
+            ratio_hit = ratio > 0 and (price - base_price) / base_price >= ratio / 100.0
+            price_hit = limit_price > 0 and price >= limit_price
+        else:
+            ratio_hit = ratio > 0 and (base_price - price) / base_price >= ratio / 100.0
+            price_hit = limit_price > 0 and price <= limit_price
+        if kind_type == 0:
+            return price_hit or ratio_hit
+        if kind_type == 1:
+            return ratio_hit
+        if kind_type == 2:
+            return price_hit
+        return False
+
+    def on_tick(self, price: float, now: float) -> Optional[GridAction]:
+        '''
+        处理一笔行情
+        now: 当前时间戳(秒)，用于最小交易间隔判断
+        返回: 需要执行的动作，无动作时返回 None
+        '''
+        p = self.params
+        tag = f"任务({self.task_id})" if self.log else ''
+
+        # 1. 策略重置检查
+        if p.max_resets > 0 and self.reset_count < p.max_resets and p.reset_ratio > 0:
+            if self._check_reset(price):
+                return None
+
+        # 2. 风险控制 (止盈止损)
+        if p.tp_type >= 0 and self._stop_triggered(price, p.tp_type, p.tp_ratio, p.tp_price, True):
+            action = self._stop_profit
+            action.price = price
+            return action
+        if p.sl_type >= 0 and self._stop_triggered(price, p.sl_type, p.sl_ratio, p.sl_price, False):
+            action = self._stop_loss
+            action.price = price
+            return action
+
+        # 3. 超出价格区间，保持观望
+        if price > self.upper_price or price < self.lower_price:
+            return None
+
+        curr_index = self.layer_index(price)
+        last_layer_index = self.last_layer_index
+
+        # 只要跨过层级线（index变化）就触发；同层级允许满足价差后重复交易
+        raw_sell_signal = False
+        raw_buy_signal = False
+        if curr_index > last_layer_index:
+            raw_sell_signal = True
+        elif curr_index < last_layer_index:
+            raw_buy_signal = True
+        elif self.last_trade_price > 0:
+            if price > self.last_trade_price:
+                raw_sell_signal = True
+            elif price < self.last_trade_price:
+                raw_buy_signal = True
+
+        partitioned = p.deployment_mode == 'PARTITIONED'
+        buy_allowed = p.trade_direction in (0, 1) and not (partitioned and (curr_index > 0 if p.include_base_layer else curr_index >= 0))
+        sell_allowed = p.trade_direction in (0, 2) and not (partitioned and (curr_index < 0 if p.include_base_layer else curr_index <= 0))
+
+        # 回落卖出逻辑
+        is_sell_signal = False
+        sell_triggered_by_fallback = False
+        if p.fallback_ratio > 0 and sell_allowed:
+            if self.waiting_for_fallback:
+                if price > self.peak_price:
+                    self.peak_price = price
+
+                if price <= self.peak_price * (1 - p.fallback_ratio):
+                    if self.log:
+                        self.log(f"{tag}满足回落卖出条件：峰值 {self.peak_price} -> 当前 {price}")
+                    is_sell_signal = True
+                    sell_triggered_by_fallback = True
+                elif curr_index < self.fallback_monitor_start_layer_index:
+                    if self.log:
+                        self.log(f"{tag}价格回落至原层级线({curr_index})，未满足回落比例，取消回落卖出监控。")
+                    self.waiting_for_fallback = False
+                    self.peak_price = 0.0
+            elif raw_sell_signal:
+                self.waiting_for_fallback = True
+                self.peak_price = price
+                self.fallback_monitor_start_layer_index = curr_index
+                if self.log:
+                    self.log(f"{tag}触发上涨({curr_index})，进入回落监控... (目标回落 {p.fallback_ratio*100}%)")
+        elif sell_allowed:
+            is_sell_signal = raw_sell_signal
+
+        # 反弹买入逻辑
+        is_buy_signal = False
+        buy_triggered_by_rebound = False
+        if p.rebound_ratio > 0 and buy_allowed:
+            if self.waiting_for_rebound:
+                if self.valley_price == 0 or price < self.valley_price:
+                    self.valley_price = price
+
+                if price >= self.valley_price * (1 + p.rebound_ratio):
+                    if self.log:
+                        self.log(f"{tag}满足反弹买入条件：谷值 {self.valley_price} -> 当前 {price}")
+                    is_buy_signal = True
+                    buy_triggered_by_rebound = True
+                elif curr_index > self.rebound_monitor_start_layer_index:
+                    if self.log:
+                        self.log(f"{tag}价格反弹至原层级线({curr_index})，未满足反弹比例，取消反弹买入监控。")
+                    self.waiting_for_rebound = False
+                    self.valley_price = 0.0
+            elif raw_buy_signal:
+                self.waiting_for_rebound = True
+                self.valley_price = price
+                self.rebound_monitor_start_layer_index = curr_index
+                if self.log:
+                    self.log(f"{tag}触发下跌({curr_index})，进入反弹监控... (目标反弹 {p.rebound_ratio*100}%)")
+        elif buy_allowed:
+            is_buy_signal = raw_buy_signal
+
+        # 4. 安全检查与交易量（方向与分治限制已包含在 buy_allowed/sell_allowed 中）
+        if is_sell_signal:
+            unsafe_reason = self._check_safety(price, curr_index, now)
+            if unsafe_reason:
+                if sell_triggered_by_fallback and self.log:
+                    self.log(f"{tag}满足回落卖出条件，但未通过安全检查: {unsafe_reason}", "WARNING")
+                return None
+            return self._fill_action(self._sell, price, curr_index, sell_triggered_by_fallback)
+
+        if is_buy_signal:
+            unsafe_reason = self._check_safety(price, curr_index, now)
+            if unsafe_reason:
+                if buy_triggered_by_rebound and self.log:
+                    self.log(f"{tag}满足反弹买入条件，但未通过安全检查: {unsafe_reason}", "WARNING")
+                return None
+            return self._fill_action(self._buy, price, curr_index, buy_triggered_by_rebound)
+
+        return None
+
+    def _clear_trigger(self, action: GridAction):
+        '''动作处理完毕后结束对应的回落/反弹监控'''
+        if not action.triggered:
+            return
+        if action.kind == SELL:
+            self.waiting_for_fallback = False
+            self.peak_price = 0.0
+        elif action.kind == BUY:
+            self.waiting_for_rebound = False
+            self.valley_price = 0.0
+
+    def on_fill(self, action: GridAction, now: float):
+        '''
+        回填已执行的交易动作：记录交易时间/价格与层级交易次数
+        可卖不足、资金不足时同样调用，视为跳过本次交易，防止重复触发
+        '''
+        index = action.index
+        self.last_trade_time = now
+        self.last_trade_price = action.price
+
+        # 如果是新层级，重置该层级计数
+        if index != self.last_layer_index:
+            self.layer_repeat_counts[index] = 1
+        else:
+            self.layer_repeat_counts[index] = self.layer_repeat_counts.get(index, 0) + 1
+        self.last_layer_index = index
+        self._clear_trigger(action)
+
+    def on_reject(self, action: GridAction):
+        '''回填被拒绝的动作（超过持仓限制）：仅更新层级，不记录交易'''
+        self._clear_trigger(action)
+        self.last_layer_index = action.index
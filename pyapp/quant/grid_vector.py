@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+网格策略向量化初筛
+用于多标的 × 多参数的快速初筛，整段价格序列一次性计算：
+- 层级索引：在 GridLayerTable 边界上 np.searchsorted（表外按 np.floor(np.log(p/base)/log_layer_base)
+  并做 zeroLayerMode 调整），与 GridState 的层级划分完全一致
+- 区间外行情剔除后，以 np.diff 得到层级变化点作为交易事件，止盈/止损取首次触发位置截断
+- 仅在事件上逐个结算成交与持仓（事件数远小于行情笔数），遵循 FULL_RANGE/PARTITIONED、
+  交易方向、T+1、资金与持仓上限规则；计入费用后资金不足的买入在同层级后续行情上重试
+简化假设：逐笔处理行情（忽略 monitorInterval 与交易时段判断，行情应只含交易时段数据），不模拟回落/反弹、同层级价差重复交易、
+最小交易间隔、策略重置与跨日刷新基准价。cross_check 在相同假设下与 GridState 精确回放及 backtest.run_backtest 对比。
+"""
+from typing import Dict, List, Optional
+import numpy as np
+from .grid_layers import GridLayerTable
+from .grid_state import GridParams
+from .backtest import TickData, load_ticks, run_backtest
+from .grid_optimizer import DEFAULT_OPTIONS, expand_grid, results_match, simulate_grid, _resolve_base_price
+
+# 与向量化假设对齐的精确回放配置
+EXACT_OVERRIDES = {
+    'monitorInterval': 0,
+    'minTradeInterval': 0,
+    'minPriceGap': 0,
+    'maxRepeatTimes': 1, # 同层级不重复交易，只在层级变化时交易
+    'fallbackRatio': 0,
+    'reboundRatio': 0,
+    'maxResets': 0,
+    'resetBasePriceDaily': False,
+}
+
+
+def layer_indices(prices: np.ndarray, table: GridLayerTable, trade_layers=0) -> np.ndarray:
+    '''批量计算层级索引（限制在 ±trade_layers 内）'''
+    prices = np.asarray(prices, dtype=float)
+    boundaries = np.asarray(table.boundaries)
+    slots = np.searchsorted(boundaries, prices, side='right')
+    inside = (slots > 0) & (slots < len(boundaries))
+    result = np.asarray(table.layers)[np.clip(slots, 0, len(table.layers) - 1)]
+
+    if not inside.all():
+        raw = np.floor(np.log(prices[~inside] / table.base_price) / table.log_layer_base - table.offset)
+        if table.zero_layer_mode == 1:
+            raw = np.where(raw == -1, 0, np.where(raw < -1, raw + 1, raw))
+        result = result.copy()
+        result[~inside] = raw.astype(result.dtype)
+
+    if trade_layers > 0:
+        result = np.clip(result, -trade_layers, trade_layers)
+    return result
+
+
+def _stop_index(params: GridParams, prices: np.ndarray, base_price) -> int:
+    '''止盈/止损首次触发位置，未触发返回 -1'''
+    def triggered(kind_type, ratio, limit_price, is_profit):
+        if kind_type not in (0, 1, 2):
+            return np.zeros(len(prices), dtype=bool)
+        if is_profit:
+            ratio_hit = (prices - base_price) / base_price >= ratio / 100.0 if ratio > 0 else np.zeros(len(prices), dtype=bool)
+            price_hit = prices >= limit_price if limit_price > 0 else np.zeros(len(prices), dtype=bool)
+        else:
+            ratio_hit = (base_price - prices) / base_price >= ratio / 100.0 if ratio > 0 else np.zeros(len(prices), dtype=bool)
+            price_hit = prices <= limit_price if limit_price > 0 else np.zeros(len(prices), dtype=bool)
+        if kind_type == 0:
+            return ratio_hit | price_hit
+        return ratio_hit if kind_type == 1 else price_hit
+
+    hits = triggered(params.tp_type, params.tp_ratio, params.tp_price, True) | \
+        triggered(params.sl_type, params.sl_ratio, params.sl_price, False)
+    return int(np.argmax(hits)) if hits.any() else -1
+
+
+def simulate_grid_vectorized(config: dict, series: Dict[str, object], options: Optional[dict] = None) -> dict:
+    '''
+    向量化网格回测（初筛）
+    series: {'times', 'prices', 'opens', 'pre_closes'}，列表或数组
+    返回指标与 simulate_grid 相同
+    '''
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    times = np.asarray(series['times'], dtype=float)
+    prices = np.asarray(series['prices'], dtype=float)
+    n = len(prices)
+    if n == 0:
+        raise ValueError('回测数据为空')
+
+    params = GridParams(config)
+    base_price = _resolve_base_price(config, prices[0], series['opens'][0], series['pre_closes'][0])
+    lower_price, upper_price, _ = params.price_range(base_price)
+    table = GridLayerTable(
+        base_price, params.layer_percent, params.zero_layer_mode,
+        lower_price=lower_price, upper_price=upper_price, trade_layers=params.trade_layers
+    )
+
+    # 1. 止盈止损截断
+    stop_at = _stop_index(params, prices, base_price)
+    end = stop_at if stop_at >= 0 else n
+
+    # 2. 区间内行情的层级索引与层级变化事件
+    initial_index = int(layer_indices(prices[:1], table, params.trade_layers)[0])
+    in_range = np.flatnonzero((prices[:end] >= lower_price) & (prices[:end] <= upper_price))
+    indices = layer_indices(prices[in_range], table, params.trade_layers)
+    changed = np.flatnonzero(np.diff(indices, prepend=initial_index) != 0)
+    event_ticks = in_range[changed]
+    event_layers = indices[changed]
+
+    # 分治模式与交易方向限制（只与当前层级有关，可整体计算）
+    partitioned = params.deployment_mode == 'PARTITIONED'
+    if partitioned:
+        buy_zone = event_layers <= 0 if params.include_base_layer else event_layers < 0
+        sell_zone = event_layers >= 0 if params.include_base_layer else event_layers > 0
+    else:
+        buy_zone = sell_zone = np.ones(len(event_layers), dtype=bool)
+    buy_allowed = (buy_zone & (params.trade_direction in (0, 1))).tolist()
+    sell_allowed = (sell_zone & (params.trade_direction in (0, 2))).tolist()
+
+    # 3. 逐事件结算
+    slippage = float(config.get('slippageRatio', 0)) / 100.0
+    max_hold_type = int(config.get('maxHoldType', -2))
+    max_hold_quantity = int(config.get('maxHoldQuantity', 10000))
+    max_hold_amount = float(config.get('maxHoldAmount', 0))
+    max_hold_ratio = float(config.get('maxHoldRatio', 0))
+    commission_rate = options['commission_rate']
+    min_commission = options['min_commission']
+    stamp_duty = options['stamp_duty']
+
+    cash = float(options['initial_cash'])
+    quantity = int(options['initial_position'])
+    initial_equity = cash + quantity * float(prices[0])
+    days = (times // 86400).astype(np.int64)
+    last_index = initial_index
+    bought_day, bought_today = days[0], 0
+    turnover = fees = 0.0
+    trade_count = 0
+    # 每个事件后的资金与持仓（末位为止盈止损后）及成交位置，用于计算日末权益
+    cash_after = np.empty(len(event_ticks) + 2)
+    quantity_after = np.empty(len(event_ticks) + 2)
+    cash_after[0], quantity_after[0] = cash, quantity
+    fill_ticks = event_ticks.copy()
+    segment_ends = np.append(changed[1:], len(in_range)).tolist()
+
+    def hold_limited(price, new_quantity):
+        if max_hold_type in (0, 1) and max_hold_quantity > 0 and new_quantity > max_hold_quantity:
+            return True
+        if max_hold_type in (0, 2) and max_hold_amount > 0 and new_quantity * price > max_hold_amount:
+            return True
+        if max_hold_type in (0, 3) and max_hold_ratio > 0:
+            total_asset = cash + quantity * price
+            if total_asset > 0 and new_quantity * price / total_asset * 100 > max_hold_ratio:
+                return True
+        return False
+
+    for k, (tick, curr) in enumerate(zip(event_ticks.tolist(), event_layers.tolist())):
+        price = float(prices[tick]) # 与精确回放一致使用 Python round
+        if days[tick] != bought_day:
+            bought_day, bought_today = days[tick], 0
+
+        if curr > last_index and sell_allowed[k]:
+            volume = params.base_quantity
+            if params.trade_quantity_type == 2:
+                volume *= max(abs(curr), abs(last_index)) or 1
+            if volume <= quantity - bought_today:
+                amount = round(price * (1 - slippage), 2) * volume
+                fee = max(amount * commission_rate, min_commission) + amount * stamp_duty
+                cash += amount - fee
+                quantity -= volume
+                turnover += amount
+                fees += fee
+                trade_count += 1
+            last_index = curr
+        elif curr < last_index and buy_allowed[k]:
+            volume = params.base_quantity
+            if params.trade_quantity_type == 2:
+                volume *= max(abs(curr), abs(last_index)) or 1
+            # 计入费用后资金不足时委托失败、层级不变，同层级后续行情继续尝试
+            position = changed[k]
+            while True:
+                if hold_limited(price, quantity + volume) or cash < volume * price:
+                    last_index = curr
+                    break
+                amount = round(price * (1 + slippage), 2) * volume
+                fee = max(amount * commission_rate, min_commission)
+                if amount + fee <= cash:
+                    cash -= amount + fee
+                    quantity += volume
+                    if days[tick] != bought_day:
+                        bought_day, bought_today = days[tick], 0
+                    bought_today += volume
+                    turnover += amount
+                    fees += fee
+                    trade_count += 1
+                    fill_ticks[k] = tick
+                    last_index = curr
+                    break
+                position += 1
+                if position >= segment_ends[k]:
+                    break
+                tick = int(in_range[position])
+                price = float(prices[tick])
+        cash_after[k + 1], quantity_after[k + 1] = cash, quantity
+
+    # 止盈/止损：卖出全部可用持仓
+    stopped = stop_at >= 0
+    if stopped:
+        if days[stop_at] != bought_day:
+            bought_today = 0
+        volume = quantity - bought_today
+        if volume > 0:
+            amount = round(float(prices[stop_at]) * (1 - slippage), 2) * volume
+            fee = max(amount * commission_rate, min_commission) + amount * stamp_duty
+            cash += amount - fee
+            quantity -= volume
+            turnover += amount
+            fees += fee
+            trade_count += 1
+    cash_after[-1], quantity_after[-1] = cash, quantity
+
+    # 4. 日末权益与最大回撤：止盈止损后未能卖出的持仓（如 T+1 锁定部分）按剩余各交易日收盘价继续估值
+    day_ends = np.flatnonzero(np.diff(days, append=days[-1] + 1) != 0)
+    position_at = np.searchsorted(fill_ticks, day_ends, side='right')
+    if stopped:
+        position_at[day_ends >= stop_at] = len(event_ticks) + 1
+    equity = cash_after[position_at] + quantity_after[position_at] * prices[day_ends]
+    peaks = np.maximum.accumulate(np.concatenate(([initial_equity], equity)))[1:]
+    drawdowns = np.where(peaks > 0, (peaks - equity) / peaks, 0.0)
+    final_equity = float(equity[-1])
+
+    return {
+        'pnl': final_equity - initial_equity,
+        'return_ratio': (final_equity - initial_equity) / initial_equity if initial_equity else 0.0,
+        'max_drawdown': float(drawdowns.max()) if len(drawdowns) else 0.0,
+        'turnover': turnover / initial_equity if initial_equity else 0.0,
+        'trade_count': trade_count,
+        'fees': fees,
+        'final_position': quantity,
+        'stopped': stopped,
+    }
+
+
+def screen(histories: Dict[str, object], param_grid: Dict[str, list], base_config: Optional[dict] = None,
+           sort_by='pnl', descending=True, options: Optional[dict] = None) -> List[dict]:
+    '''
+    多标的 × 多参数向量化初筛
+    histories: {标的: TickData 或 series 字典}
+    返回按 sort_by 排序的结果：[{'symbol', 'params', 'pnl', ...}]
+    '''
+    keys = list(param_grid.keys())
+    configs = expand_grid(param_grid, base_config)
+    rows = []
+    for symbol, history in histories.items():
+        series = _to_series(history)
+        for config in configs:
+            result = simulate_grid_vectorized(config, series, options)
+            rows.append({'symbol': symbol, 'params': {key: config[key] for key in keys}, **result})
+    rows.sort(key=lambda row: row.get(sort_by, 0), reverse=descending)
+    return rows
+
+
+def _to_series(history) -> Dict[str, object]:
+    if isinstance(history, dict):
+        return history
+    return {field: getattr(history, field) for field in ('times', 'prices', 'opens', 'pre_closes')}
+
+
+def cross_check(config: dict, history, options: Optional[dict] = None, tolerance=1e-6) -> dict:
+    '''
+    与 GridState 精确回放（simulate_grid）及 backtest.run_backtest 对比（配置按 EXACT_OVERRIDES 对齐简化假设）
+    history 为 series 字典时无法驱动 run_backtest，只与精确回放对比（backtest 为 None）
+    返回: {'match': bool, 'vectorized': {...}, 'exact': {...}, 'backtest': {...}}
+    '''
+    ticks = None
+    if not isinstance(history, dict):
+        ticks = history if isinstance(history, TickData) else load_ticks(history)
+        history = ticks
+    series = _to_series(history)
+    config = {**config, **EXACT_OVERRIDES}
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    vectorized = simulate_grid_vectorized(config, series, options)
+    exact = simulate_grid(config, series, options)
+    match = results_match(vectorized, exact, tolerance)
+    backtest = None
+    if ticks is not None:
+        backtest = run_backtest(config, ticks, **options)
+        match = match and results_match(vectorized, backtest, tolerance)
+    return {'match': match, 'vectorized': vectorized, 'exact': exact, 'backtest': backtest}
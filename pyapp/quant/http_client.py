@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+行情数据共享 HTTP 客户端
+- 进程内共享连接池，keep-alive 复用 TCP 连接，避免每次请求重新握手
+- 已安装 h2 时对 https 上游启用 HTTP/2，否则退回 HTTP/1.1
+- 按主机限制并发请求数，多任务同时请求时避免被上游限流
+"""
+import threading
+from urllib.parse import urlsplit
+import httpx
+
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 30 # 空闲连接保持时长(秒)
+PER_HOST_LIMIT = 4 # 单个主机最大并发请求数
+
+
+class MarketHttpClient:
+    '''行情请求客户端（新浪/腾讯等行情接口共用）'''
+
+    def __init__(self, per_host_limit=PER_HOST_LIMIT, timeout=5):
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+
+        self.per_host_limit = per_host_limit
+        self.client = httpx.Client(
+            http2=http2,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            )
+        )
+        self._lock = threading.Lock()
+        self._host_limits = {} # {host: Semaphore}
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._host_limits.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_limits[host] = semaphore
+            return semaphore
+
+    def get(self, url, **kwargs) -> httpx.Response:
+        with self._host_semaphore(url):
+            return self.client.get(url, **kwargs)
+
+    def close(self):
+        self.client.close()
+
+
+_market_client = None
+_market_client_lock = threading.Lock()
+
+
+def get_market_client() -> MarketHttpClient:
+    '''获取进程级共享的行情请求客户端'''
+    global _market_client
+    with _market_client_lock:
+        if _market_client is None:
+            _market_client = MarketHttpClient()
+        return _market_client
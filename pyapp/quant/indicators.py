@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+流式技术指标
+- SMA: 滚动求和，EMA: 递推，MACD: DIFF/DEA 由两条 EMA 与信号线 EMA 递推
+- update(value, new_bar=True) 追加一根新K线；new_bar=False 原地更新最新一根（未收盘）K线
+- 每次更新 O(1)，同时保留上一根K线的指标值，交叉判断无需重复计算
+- warm_up() 使用 NumPy 批量计算历史序列作为初始状态
+计算口径：SMA 为最近 period 个值的算术平均；EMA 平滑系数 k = 2 / (period + 1)，
+以前 period 个值的简单平均作为种子，之后 EMA = 价格 × k + 上一 EMA × (1 - k)；
+MACD 的 DIFF = EMA(fast) - EMA(slow)（两条 EMA 均有值后开始），DEA = DIFF 序列的 EMA(signal)。
+"""
+import math
+from collections import deque
+from typing import List, Optional
+import numpy as np
+
+EMA_BLOCK_GROWTH = 1e6 # 分块闭式计算 EMA 时系数允许的最大放大倍数，控制浮点误差
+
+
+def sma_series(values, period: int) -> np.ndarray:
+    '''批量计算简单移动平均序列，长度为 len(values) - period + 1'''
+    values = np.asarray(values, dtype=float)
+    if period <= 0 or len(values) < period:
+        return np.empty(0)
+    csum = np.cumsum(np.insert(values, 0, 0.0))
+    return (csum[period:] - csum[:-period]) / period
+
+
+def ema_series(values, period: int) -> np.ndarray:
+    '''
+    批量计算指数移动平均序列，长度为 len(values) - period + 1
+    递推式 e[t] = a * e[t-1] + k * x[t] 按块展开为闭式，块内全部向量化计算
+    '''
+    values = np.asarray(values, dtype=float)
+    if period <= 0 or len(values) < period:
+        return np.empty(0)
+    k = 2 / (period + 1)
+    a = 1 - k
+    seed = values[:period].mean()
+    rest = values[period:]
+    if a == 0:
+        return np.concatenate(([seed], rest))
+    if len(rest) == 0:
+        return np.array([seed])
+
+    block = max(1, int(math.log(EMA_BLOCK_GROWTH) / -math.log(a)))
+    out = np.empty(len(rest) + 1)
+    out[0] = seed
+    prev = seed
+    for start in range(0, len(rest), block):
+        chunk = rest[start:start + block]
+        n = np.arange(1, len(chunk) + 1)
+        # e[j] = a^(j+1) * (prev + k * sum_{i<=j} x[i] * a^-(i+1))
+        scaled = np.cumsum(chunk * np.power(a, -n)) * k
+        chunk_out = np.power(a, n) * (prev + scaled)
+        out[start + 1:start + 1 + len(chunk)] = chunk_out
+        prev = chunk_out[-1]
+    return out
+
+
+class SMA:
+    '''滚动求和简单移动平均'''
+
+    def __init__(self, period: int):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self.window = deque(maxlen=self.period)
+        self.total = 0.0
+        self.value: Optional[float] = None
+        self.prev_value: Optional[float] = None
+
+    def update(self, price: float, new_bar: bool = True) -> Optional[float]:
+        if new_bar or not self.window:
+            self.prev_value = self.value
+            if len(self.window) == self.period:
+                self.total -= self.window[0]
+            self.window.append(price)
+            self.total += price
+        else:
+            self.total += price - self.window[-1]
+            self.window[-1] = price
+        self.value = self.total / self.period if len(self.window) == self.period else None
+        return self.value
+
+    def warm_up(self, values: List[float]):
+        self.reset()
+        if len(values) <= self.period + 1:
+            for v in values:
+                self.update(v)
+            return
+        values = np.asarray(values, dtype=float)
+        tail = values[-(self.period + 1):]
+        self.window.extend(tail[1:].tolist())
+        self.total = float(tail[1:].sum())
+        self.value = self.total / self.period
+        self.prev_value = float(tail[:-1].sum()) / self.period
+
+
+class EMA:
+    '''递推指数移动平均（前 period 个值的均值作为种子）'''
+
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2 / (period + 1)
+        self.reset()
+
+    def reset(self):
+        self.seed: List[float] = []
+        self.base: Optional[float] = None # 上一根K线的 EMA
+        self.value: Optional[float] = None
+        self.prev_value: Optional[float] = None
+
+    def update(self, price: float, new_bar: bool = True) -> Optional[float]:
+        if self.value is None or (not new_bar and self.base is None):
+            # 种子阶段：累积前 period 个值
+            if new_bar or not self.seed:
+                self.seed.append(price)
+            else:
+                self.seed[-1] = price
+            self.value = sum(self.seed) / self.period if len(self.seed) == self.period else None
+            return self.value
+
+        if new_bar:
+            self.base = self.value
+            self.prev_value = self.value
+        self.value = price * self.k + self.base * (1 - self.k)
+        return self.value
+
+    def load_series(self, series: np.ndarray):
+        '''用批量计算的序列恢复递推状态（序列长度需不少于 2）'''
+        self.seed = []
+        self.value = float(series[-1])
+        self.base = float(series[-2])
+        self.prev_value = self.base
+
+    def warm_up(self, values: List[float]):
+        self.reset()
+        if len(values) <= self.period + 1:
+            for v in values:
+                self.update(v)
+            return
+        self.load_series(ema_series(values, self.period))
+
+
+class MACD:
+    '''MACD 指标：DIFF = EMA(fast) - EMA(slow)，DEA = EMA(DIFF, signal)'''
+
+    def __init__(self, fast_period=12, slow_period=26, signal_period=9):
+        self.fast = EMA(fast_period)
+        self.slow = EMA(slow_period)
+        self.signal = EMA(signal_period)
+        self.diff: Optional[float] = None
+        self.prev_diff: Optional[float] = None
+
+    def reset(self):
+        self.fast.reset()
+        self.slow.reset()
+        self.signal.reset()
+        self.diff = None
+        self.prev_diff = None
+
+    @property
+    def dea(self) -> Optional[float]:
+        return self.signal.value
+
+    @property
+    def prev_dea(self) -> Optional[float]:
+        return self.signal.prev_value
+
+    def update(self, price: float, new_bar: bool = True):
+        fast = self.fast.update(price, new_bar)
+        slow = self.slow.update(price, new_bar)
+        if fast is None or slow is None:
+            return None, None
+        first_diff = self.diff is None
+        if new_bar or first_diff:
+            self.prev_diff = self.diff
+        self.diff = fast - slow
+        self.signal.update(self.diff, new_bar or first_diff)
+        return self.diff, self.dea
+
+    def warm_up(self, values: List[float]):
+        self.reset()
+        min_len = max(self.fast.period, self.slow.period) + self.signal.period + 1
+        if len(values) <= min_len:
+            for v in values:
+                self.update(v)
+            return
+        fast_series = ema_series(values, self.fast.period)
+        slow_series = ema_series(values, self.slow.period)
+        size = min(len(fast_series), len(slow_series))
+        diff_series = fast_series[-size:] - slow_series[-size:]
+        self.fast.load_series(fast_series)
+        self.slow.load_series(slow_series)
+        self.diff = float(diff_series[-1])
+        self.prev_diff = float(diff_series[-2])
+        self.signal.load_series(ema_series(diff_series, self.signal.period))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+快讯关键词匹配
+标的/触发/排除三类关键词编译为一个 Aho–Corasick 自动机（忽略大小写），
+一次扫描快讯内容即可得到命中的关键词类别。
+关键词集合相同的任务共享同一个已编译的匹配器。
+"""
+import threading
+from collections import deque
+from typing import Dict, Iterable, List
+
+TARGET = 1 # 标的关键词
+TRIGGER = 2 # 触发关键词
+EXCLUDED = 4 # 排除关键词
+
+
+def _normalize(keywords) -> tuple:
+    return tuple(sorted({str(k).lower() for k in (keywords or [])}))
+
+
+class KeywordMatcher:
+    '''
+    关键词自动机
+    match() 返回命中类别的位掩码(TARGET | TRIGGER | EXCLUDED)，
+    contains() 与策略原有 contains_keywords 规则一致
+    '''
+
+    _lock = threading.Lock()
+    _compiled: Dict[tuple, 'KeywordMatcher'] = {}
+
+    def __init__(self, target: Iterable[str] = (), trigger: Iterable[str] = (), excluded: Iterable[str] = ()):
+        self.target = _normalize(target)
+        self.trigger = _normalize(trigger)
+        self.excluded = _normalize(excluded)
+        self.always = 0 # 空关键词与任意内容匹配
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[int] = [0]
+        for mask, keywords in ((TARGET, self.target), (TRIGGER, self.trigger), (EXCLUDED, self.excluded)):
+            for keyword in keywords:
+                if keyword:
+                    self._insert(keyword, mask)
+                else:
+                    self.always |= mask
+        self._build_fail_links()
+        self.classes = (TARGET if self.target else 0) | (TRIGGER if self.trigger else 0) | (EXCLUDED if self.excluded else 0)
+
+    @classmethod
+    def compile(cls, target=(), trigger=(), excluded=()) -> 'KeywordMatcher':
+        '''获取已编译的匹配器，关键词集合（忽略大小写、顺序与重复）相同时复用'''
+        key = (_normalize(target), _normalize(trigger), _normalize(excluded))
+        with cls._lock:
+            matcher = cls._compiled.get(key)
+            if matcher is None:
+                matcher = cls._compiled[key] = cls(*key)
+            return matcher
+
+    def _insert(self, keyword, mask):
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(0)
+            node = next_node
+        self._output[node] |= mask
+
+    def _build_fail_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # 后缀关键词的类别并入当前节点，匹配时无需沿失败链回溯
+                self._output[child] |= self._output[self._fail[child]]
+                queue.append(child)
+
+    def match(self, content) -> int:
+        '''扫描内容，返回命中关键词类别的位掩码；全部类别命中后提前结束'''
+        found = self.always & self.classes
+        if found == self.classes:
+            return found
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for char in str(content or '').lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found |= output[node]
+                if found == self.classes:
+                    break
+        return found
+
+    def contains(self, content) -> bool:
+        '''
+        快讯过滤规则
+        - 未配置标的与触发关键词时不匹配
+        - 命中任一排除关键词时不匹配
+        - 已配置的标的/触发关键词需各命中其一
+        '''
+        if not self.target and not self.trigger:
+            return False
+        found = self.match(content)
+        if found & EXCLUDED:
+            return False
+        if self.target and not found & TARGET:
+            return False
+        if self.trigger and not found & TRIGGER:
+            return False
+        return True
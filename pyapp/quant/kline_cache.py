@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+K线增量缓存
+按 (标的, 周期) 缓存K线，首次加载完整历史，之后只拉取最近几根K线合并到缓存尾部，
+两次同步之间用实时价格更新最新一根K线；最新K线的周期结束后（新周期已开始）立即同步尾部，
+不再把实时价格写入已收盘的K线。相同标的与周期的任务共享同一份缓存。
+"""
+import time
+import datetime
+import threading
+from typing import Callable, Dict, List, Optional
+from .http_client import get_market_client
+
+SINA_KLINE_URL = (
+    "http://money.finance.sina.com.cn/quotes_service/api/"
+    "json_v2.php/CN_MarketData.getKLineData"
+)
+TAIL_LEN = 3 # 增量同步时拉取的K线数量
+SYNC_INTERVAL = 60 # 增量同步最小间隔(秒)，间隔内仅用实时价格更新最新K线
+
+
+def fetch_kline_bars(symbol: str, scale: int = 240, datalen: int = 100) -> List[dict]:
+    '''
+    从新浪财经API获取K线数据
+    返回: [{'day', 'open', 'high', 'low', 'close', 'volume'}]，按时间升序
+    '''
+    url = f"{SINA_KLINE_URL}?symbol={symbol}&scale={scale}&ma=no&datalen={datalen}"
+    resp = get_market_client().get(url, timeout=10)
+    resp.raise_for_status()
+    data = resp.json() or []
+    return [
+        {
+            'day': item['day'],
+            'open': float(item['open']),
+            'high': float(item['high']),
+            'low': float(item['low']),
+            'close': float(item['close']),
+            'volume': float(item.get('volume', 0) or 0),
+        }
+        for item in data
+    ]
+
+
+class KlineSeries:
+    '''单个 (标的, 周期) 的K线序列'''
+
+    def __init__(self, symbol, scale):
+        self.symbol = symbol
+        self.scale = scale
+        self.bars: List[dict] = []
+        self.capacity = 0 # 已请求的最大历史长度
+        self.synced_at = 0.0
+        self.lock = threading.Lock()
+
+    def merge(self, tail: List[dict]):
+        '''合并尾部K线：同一时间的K线覆盖，更新的K线追加'''
+        for bar in tail:
+            if self.bars and bar['day'] == self.bars[-1]['day']:
+                self.bars[-1] = bar
+            elif not self.bars or bar['day'] > self.bars[-1]['day']:
+                self.bars.append(bar)
+        if len(self.bars) > self.capacity:
+            del self.bars[:len(self.bars) - self.capacity]
+
+    def apply_price(self, price: float):
+        '''用实时价格更新最新一根K线'''
+        if not self.bars or price <= 0:
+            return
+        bar = self.bars[-1]
+        bar['close'] = price
+        bar['high'] = max(bar['high'], price)
+        bar['low'] = min(bar['low'], price)
+
+    def period_end(self) -> Optional[float]:
+        '''
+        最新一根K线的周期结束时间（时间戳），无法判断时返回 None
+        新浪分钟K线以周期结束时间标记（如 09:35:00 为 09:30-09:35），日K线以日期标记
+        '''
+        if not self.bars:
+            return None
+        day = str(self.bars[-1]['day'])
+        try:
+            if self.scale < 240 and len(day) > 10:
+                return datetime.datetime.strptime(day[:19], '%Y-%m-%d %H:%M:%S').timestamp()
+            if self.scale == 240:
+                return (datetime.datetime.strptime(day[:10], '%Y-%m-%d') + datetime.timedelta(days=1)).timestamp()
+        except ValueError:
+            pass
+        return None
+
+
+class KlineCache:
+    '''K线缓存（全进程共享）'''
+
+    def __init__(self, sync_interval=SYNC_INTERVAL, tail_len=TAIL_LEN):
+        self.sync_interval = sync_interval
+        self.tail_len = tail_len
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, KlineSeries] = {}
+
+    def _get_series(self, symbol, scale) -> KlineSeries:
+        key = (symbol, int(scale))
+        with self._lock:
+            if key not in self._series:
+                self._series[key] = KlineSeries(symbol, int(scale))
+            return self._series[key]
+
+    def get_bars(self, symbol: str, scale: int, datalen: int,
+                 live_price: Optional[float] = None, log: Optional[Callable] = None) -> List[dict]:
+        '''
+        获取最近 datalen 根K线
+        - 缓存不足 datalen 时完整加载历史
+        - 距上次同步超过 sync_interval，或最新K线周期结束后尚未同步时，只拉取尾部 tail_len 根K线合并
+        - 其余情况使用 live_price 更新最新一根K线（最新K线已收盘时不更新，等待下次同步取得新K线）
+        '''
+        series = self._get_series(symbol, scale)
+        with series.lock:
+            try:
+                now = time.time()
+                period_end = series.period_end()
+                bar_closed = period_end is not None and now > period_end
+                if len(series.bars) < datalen:
+                    series.capacity = max(series.capacity, datalen)
+                    series.bars = fetch_kline_bars(symbol, scale, series.capacity)
+                    series.synced_at = time.time()
+                elif now - series.synced_at >= self.sync_interval or (bar_closed and series.synced_at <= period_end):
+                    series.merge(fetch_kline_bars(symbol, scale, self.tail_len))
+                    series.synced_at = time.time()
+                elif live_price and not bar_closed:
+                    series.apply_price(live_price)
+            except Exception as e:
+                if log:
+                    log(f"获取K线数据失败: {e}", "ERROR")
+            return [dict(bar) for bar in series.bars[-datalen:]]
+
+    def get_closes(self, symbol: str, scale: int, datalen: int,
+                   live_price: Optional[float] = None, log: Optional[Callable] = None) -> List[float]:
+        '''获取最近 datalen 根K线的收盘价'''
+        return [bar['close'] for bar in self.get_bars(symbol, scale, datalen, live_price, log)]
+
+    def clear(self, symbol: Optional[str] = None):
+        with self._lock:
+            if symbol is None:
+                self._series.clear()
+            else:
+                for key in [k for k in self._series if k[0] == symbol]:
+                    del self._series[key]
+
+
+# 全局单例
+kline_cache = KlineCache()
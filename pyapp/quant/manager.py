@@ -4,14 +4,22 @@ from .strategies.event import EventStrategy
 from .strategies.news import NewsStrategy
 from .strategies.trend import TrendStrategy
 from .trader import QuantTrader
+from .quote_hub import QuoteHub, DEFAULT_INTERVAL, MIN_INTERVAL
+from .news_feed import NewsFeed
+from .order_pipeline import OrderPipeline
 
 class TaskManager:
     _instance = None
+    QUOTE_INTERVAL = DEFAULT_INTERVAL # 行情中心默认轮询间隔(秒)，任务未设置 monitorInterval 时使用
+    QUOTE_MIN_INTERVAL = MIN_INTERVAL # 行情中心轮询间隔下限(秒)
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(TaskManager, cls).__new__(cls)
             cls._instance.tasks = {}
+            cls._instance.quote_hub = QuoteHub(cls.QUOTE_INTERVAL, cls.QUOTE_MIN_INTERVAL) # 所有任务共享的行情中心
+            cls._instance.news_feed = NewsFeed() # 所有快讯类任务共享的快讯中心
+            cls._instance.order_pipeline = OrderPipeline() # 所有任务共享的下单后处理流水线
         return cls._instance
 
     def start_task(self, data, log_callback=None):
@@ -42,6 +50,9 @@ class TaskManager:
                 log_callback('ERROR', 'TaskManager', f"任务({task_id})：启动失败！暂不支持的策略类型")
             return False, f"不支持的策略ID: {strategy_id}" 
 
+        strategy.quote_hub = self.quote_hub
+        strategy.news_feed = self.news_feed
+        strategy.order_pipeline = self.order_pipeline
         strategy.start()
         
         self.tasks[task_id] = strategy
@@ -54,6 +65,13 @@ class TaskManager:
             return True, f"当前交易任务({task_id})已停止"
         return False, f"当前交易任务({task_id})未运行"
 
+    def configure_quote_hub(self, interval=None, min_interval=None):
+        '''调整行情中心的默认轮询间隔与下限(秒)，下一个轮询周期生效'''
+        if interval is not None:
+            self.quote_hub.interval = max(0.1, float(interval))
+        if min_interval is not None:
+            self.quote_hub.min_interval = max(0.1, float(min_interval))
+
     def get_running_tasks(self):
         return list(self.tasks.keys())
 
@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""
+进程级快讯中心
+同一后端/令牌下的所有快讯类任务（事件驱动AI、快讯推送）共享一个轮询线程：
+只维护一份 last_id，每轮请求 /quant/news/getNewsList，新快讯按ID升序推送到每个订阅者的队列。
+后端请求频率与任务数量无关，各任务在同一时刻收到同一批快讯。
+- 每轮按页向前翻页直到遇到 last_id，快讯爆发时不因单页条数限制而遗漏
+- 订阅队列有容量上限：全部订阅者积压时暂停拉取（游标不前进，后续翻页补齐），单个订阅者积压时丢弃最早的快讯并计数
+- 订阅者记录接收、消费、丢弃数量与排队延迟，供任务输出滞后告警
+- 优先通过 Server-Sent Events 接收后端推送（/quant/news/stream），新快讯亚秒级送达；
+  后端不支持或连接断开时退回按间隔轮询，断线期间的快讯由轮询按 last_id 翻页补齐
+"""
+import time
+import json
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import httpx
+
+NEWS_PAGE_SIZE = 50 # 每页请求的快讯数量
+MAX_NEWS_PAGES = 20 # 每轮最多翻页数，超出时记录缺口
+MIN_POLL_INTERVAL = 1.0 # 最小轮询间隔(秒)
+MAX_PENDING_NEWS = 1000 # 单个订阅队列的容量上限
+STREAM_READ_TIMEOUT = 30.0 # 推送连接读超时(秒)，后端应以更短的间隔发送心跳
+STREAM_RECONNECT_DELAY = 1.0 # 推送连接断开后的重连等待(秒)
+STREAM_RETRY_INTERVAL = 600.0 # 后端不支持推送时，重新尝试推送的间隔(秒)
+
+
+class StreamUnavailable(Exception):
+    '''后端不支持快讯推送接口'''
+
+
+def fetch_news_page(backend_url, token, page_size=NEWS_PAGE_SIZE, last_id=None, page=1, timeout=10) -> List[dict]:
+    '''
+    请求后端快讯列表（按ID倒序返回）
+    请求失败时抛出异常，由调用方决定重试或记录
+    '''
+    params = {'pageSize': page_size}
+    if page > 1:
+        params['page'] = page
+    if last_id:
+        params['last_id'] = last_id
+    headers = {
+        'x-token': token,
+        'Content-Type': 'application/json'
+    }
+    resp = httpx.get(f'{backend_url}/quant/news/getNewsList', params=params, headers=headers, timeout=timeout)
+    resp.raise_for_status()
+    data = resp.json()
+    inner = data.get('data') if isinstance(data, dict) else None
+    if isinstance(inner, dict) and isinstance(inner.get('list'), list):
+        return inner['list']
+    return []
+
+
+def fetch_news_since(backend_url, token, last_id, page_size=NEWS_PAGE_SIZE, max_pages=MAX_NEWS_PAGES,
+                     timeout=10) -> Tuple[List[dict], bool]:
+    '''
+    获取 ID 大于 last_id 的全部快讯（按ID升序）
+    从最新一页开始向前翻页，直到某页包含 last_id 及更早的快讯或不足一页；
+    翻页期间新到的快讯会把内容挤到后一页，按ID去重即可，不会跳过
+    返回: (快讯列表, 是否完整覆盖到 last_id)
+    完整性无法确认（达到最大页数，或后端不支持翻页返回了重复的一页）时返回 False
+    '''
+    found: Dict[int, dict] = {}
+    for page in range(1, max_pages + 1):
+        raw_list = fetch_news_page(backend_url, token, page_size=page_size, last_id=last_id, page=page, timeout=timeout)
+        fresh = 0
+        reached = len(raw_list) < page_size
+        for item in raw_list:
+            news_id = item.get('id', 0)
+            if news_id <= last_id:
+                reached = True
+            elif news_id not in found:
+                found[news_id] = item
+                fresh += 1
+        if reached:
+            return [found[k] for k in sorted(found)], True
+        if not fresh:
+            break
+    return [found[k] for k in sorted(found)], False
+
+
+def iter_sse_events(lines):
+    '''
+    解析 Server-Sent Events 文本行，逐个产出 (event, data)
+    忽略注释(心跳)行，多行 data 以换行拼接，未指定 event 时为 message
+    '''
+    event, data = 'message', []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line:
+            if data:
+                yield event, '\n'.join(data)
+            event, data = 'message', []
+            continue
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'event':
+            event = value
+        elif field == 'data':
+            data.append(value)
+    if data:
+        yield event, '\n'.join(data)
+
+
+def parse_stream_items(data) -> List[dict]:
+    '''推送事件数据：单条快讯、快讯列表或与列表接口相同的 {data: {list: [...]}} 结构'''
+    payload = json.loads(data)
+    if isinstance(payload, dict) and isinstance(payload.get('data'), dict):
+        payload = payload['data'].get('list', [])
+    if isinstance(payload, dict):
+        payload = [payload]
+    return [item for item in payload if isinstance(item, dict) and 'id' in item] if isinstance(payload, list) else []
+
+
+class NewsSubscription:
+    '''
+    单个任务的快讯订阅
+    轮询线程推送的新快讯进入队列，任务线程通过 wait()/drain() 消费
+    capacity: 队列容量，超出时丢弃最早的快讯
+    '''
+
+    def __init__(self, poller, interval, capacity=MAX_PENDING_NEWS):
+        self.poller = poller
+        self.interval = interval
+        self.capacity = capacity
+        self.closed = False
+        self._cond = threading.Condition()
+        self._queue = deque() # (接收时间, 快讯)
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.last_lag = 0.0 # 最近一次消费时最早快讯的排队时长(秒)
+        self.max_lag = 0.0
+        self._reported_dropped = 0
+        self._reported_gaps = 0
+        self._reported_delivered = 0
+
+    @property
+    def backlog(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    @property
+    def saturated(self) -> bool:
+        return self.backlog >= self.capacity
+
+    def metrics(self) -> dict:
+        '''订阅滞后指标'''
+        with self._cond:
+            oldest = time.time() - self._queue[0][0] if self._queue else 0.0
+            return {
+                'received': self.received,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'backlog': len(self._queue),
+                'oldest_pending': round(oldest, 3),
+                'last_lag': round(self.last_lag, 3),
+                'max_lag': round(self.max_lag, 3),
+                'gaps': self.poller.gaps,
+            }
+
+    def wait(self, timeout=None) -> bool:
+        '''阻塞等待新快讯，返回队列中是否有待处理的快讯'''
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self._queue, timeout)
+            return bool(self._queue)
+
+    def lag_report(self, threshold) -> Optional[str]:
+        '''
+        滞后告警：自上次告警后出现丢弃/缺口，或最近一次排队时长超过 threshold 秒时返回告警内容
+        '''
+        metrics = self.metrics()
+        problems = []
+        if metrics['dropped'] > self._reported_dropped:
+            problems.append(f"积压丢弃{metrics['dropped'] - self._reported_dropped}条")
+            self._reported_dropped = metrics['dropped']
+        if metrics['gaps'] > self._reported_gaps:
+            problems.append(f"翻页缺口{metrics['gaps'] - self._reported_gaps}次")
+            self._reported_gaps = metrics['gaps']
+        if metrics['delivered'] > self._reported_delivered:
+            self._reported_delivered = metrics['delivered']
+            if threshold and metrics['last_lag'] > threshold:
+                problems.append(f"排队延迟{metrics['last_lag']:.1f}秒")
+        if not problems:
+            return None
+        return f"快讯处理滞后：{'，'.join(problems)}（待处理{metrics['backlog']}条）"
+
+    def drain(self) -> List[dict]:
+        '''取出全部待处理快讯（按ID升序）'''
+        with self._cond:
+            if not self._queue:
+                return []
+            self.last_lag = time.time() - self._queue[0][0]
+            self.max_lag = max(self.max_lag, self.last_lag)
+            items = [item for _, item in self._queue]
+            self._queue.clear()
+            self.delivered += len(items)
+            return items
+
+    def close(self):
+        '''取消订阅并唤醒等待线程'''
+        if self.closed:
+            return
+        self.poller.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _push(self, items: List[dict]) -> int:
+        '''推送快讯，返回因队列已满丢弃的数量'''
+        now = time.time()
+        with self._cond:
+            self._queue.extend((now, item) for item in items)
+            self.received += len(items)
+            overflow = max(0, len(self._queue) - self.capacity)
+            for _ in range(overflow):
+                self._queue.popleft()
+            self.dropped += overflow
+            self._cond.notify_all()
+        return overflow
+
+
+class NewsPoller:
+    '''
+    单个后端/令牌的快讯轮询器
+    轮询间隔取所有订阅者中最短的 monitorInterval，全部取消订阅后停止线程
+    全部订阅者队列已满时暂停拉取（推送连接同时断开），last_id 保持不变，恢复后翻页补齐
+    stream: 是否优先使用推送接口
+    '''
+
+    def __init__(self, backend_url, token, log=None, on_idle=None, stream=True):
+        self.backend_url = backend_url
+        self.token = token
+        self.stream = stream
+        self.streaming = False # 推送连接是否已建立
+        self.on_idle = on_idle # 全部取消订阅后的回调
+        self.log = log or (lambda message, level='INFO': print(f'[{level}] NewsFeed: {message}'))
+        self.last_id = None # 首轮轮询时初始化为最新快讯ID，只推送订阅之后的快讯
+        self.page_size = NEWS_PAGE_SIZE
+        self.max_pages = MAX_NEWS_PAGES
+        self.gaps = 0 # 未能翻页覆盖到 last_id 的轮次
+        self.deferred = 0 # 因订阅者积压暂停拉取的轮次
+        self._stream_retry_at = 0.0
+        self._stream_failures = 0 # 连续连接失败次数，用于重连退避
+        self._lock = threading.Lock()
+        self._ingest_lock = threading.Lock() # 推送与轮询共用 last_id，保证同一快讯只分发一次
+        self._subscribers: List[NewsSubscription] = []
+        self._thread = None
+        self._stop_event = None
+
+    @property
+    def interval(self) -> float:
+        with self._lock:
+            intervals = [s.interval for s in self._subscribers]
+        return max(MIN_POLL_INTERVAL, min(intervals)) if intervals else MIN_POLL_INTERVAL
+
+    def subscribe(self, interval, capacity=MAX_PENDING_NEWS) -> NewsSubscription:
+        subscription = NewsSubscription(self, float(interval), capacity)
+        with self._lock:
+            self._subscribers.append(subscription)
+            if not self._thread or not self._thread.is_alive():
+                self._stop_event = threading.Event()
+                self._thread = threading.Thread(target=self._poll_loop, args=(self._stop_event,))
+                self._thread.daemon = True
+                self._thread.start()
+        return subscription
+
+    @property
+    def idle(self) -> bool:
+        with self._lock:
+            return not self._subscribers
+
+    def unsubscribe(self, subscription: NewsSubscription):
+        '''取消订阅，订阅为空时停止轮询线程'''
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+            idle = not self._subscribers
+            if idle and self._stop_event:
+                self._stop_event.set()
+                self._thread = None
+                self._stop_event = None
+        if idle and self.on_idle:
+            self.on_idle(self)
+
+    def _saturated(self, subscribers) -> bool:
+        return bool(subscribers) and all(s.saturated for s in subscribers)
+
+    def _deliver(self, items: List[dict]) -> bool:
+        '''
+        将 ID 大于 last_id 的快讯按ID升序推送给全部订阅者并推进 last_id
+        返回推送后是否仍有订阅者可以接收
+        '''
+        with self._lock:
+            subscribers = list(self._subscribers)
+        with self._ingest_lock:
+            items = sorted((item for item in items if item.get('id', 0) > self.last_id), key=lambda x: x.get('id', 0))
+            if items:
+                self.last_id = items[-1].get('id', 0)
+                for subscription in subscribers:
+                    dropped = subscription._push(items)
+                    if dropped:
+                        self.log(f'订阅队列积压超过{subscription.capacity}条，丢弃最早的{dropped}条快讯', 'WARNING')
+        return not self._saturated(subscribers)
+
+    def poll_once(self):
+        '''拉取 last_id 之后的全部新快讯并推送给订阅者'''
+        if self.last_id is None:
+            latest = fetch_news_page(self.backend_url, self.token, page_size=1)
+            self.last_id = latest[0].get('id', 0) if latest else 0
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if self._saturated(subscribers):
+            self.deferred += 1
+            self.log(f'全部订阅者积压已满，暂停拉取快讯(last_id={self.last_id})', 'WARNING')
+            return
+        items, complete = fetch_news_since(
+            self.backend_url, self.token, self.last_id, page_size=self.page_size, max_pages=self.max_pages
+        )
+        if not complete and items:
+            self.gaps += 1
+            self.log(f'快讯翻页未覆盖到 last_id={self.last_id}，'
+                     f'本轮最早快讯ID={items[0].get("id", 0)}，期间快讯可能缺失', 'WARNING')
+        self._deliver(items)
+
+    def stream_once(self, stop_event):
+        '''
+        建立推送连接并持续分发快讯，直到连接断开、停止或全部订阅者积压
+        后端不支持推送接口时抛出 StreamUnavailable
+        '''
+        headers = {
+            'x-token': self.token,
+            'Accept': 'text/event-stream'
+        }
+        params = {'last_id': self.last_id} if self.last_id else {}
+        timeout = httpx.Timeout(10.0, read=STREAM_READ_TIMEOUT)
+        with httpx.stream('GET', f'{self.backend_url}/quant/news/stream', params=params, headers=headers,
+                          timeout=timeout) as resp:
+            if resp.status_code in (404, 405, 501):
+                raise StreamUnavailable(f'HTTP {resp.status_code}')
+            resp.raise_for_status()
+            if 'text/event-stream' not in resp.headers.get('content-type', ''):
+                raise StreamUnavailable(resp.headers.get('content-type', 'unknown content-type'))
+            self.streaming = True
+            self._stream_failures = 0
+            try:
+                # 连接建立前发布的快讯不会再推送，先按 last_id 补齐一次，之后重复的推送按ID去重
+                self.poll_once()
+                for event, data in iter_sse_events(resp.iter_lines()):
+                    if stop_event.is_set():
+                        return
+                    if event not in ('message', 'news'):
+                        continue
+                    if not self._deliver(parse_stream_items(data)):
+                        self.log('全部订阅者积压已满，断开推送连接', 'WARNING')
+                        return
+            finally:
+                self.streaming = False
+
+    def _stream_until_closed(self, stop_event):
+        try:
+            self.stream_once(stop_event)
+            self._stream_retry_at = time.time() + STREAM_RECONNECT_DELAY
+        except StreamUnavailable as e:
+            self._stream_retry_at = time.time() + STREAM_RETRY_INTERVAL
+            self.log(f'后端不支持快讯推送({e})，使用轮询', 'INFO')
+        except Exception as e:
+            # 连续失败时指数退避，避免后端异常时频繁重连
+            delay = min(STREAM_RETRY_INTERVAL, STREAM_RECONNECT_DELAY * 2 ** self._stream_failures)
+            self._stream_failures += 1
+            self._stream_retry_at = time.time() + delay
+            self.log(f'快讯推送连接断开: {e}，{delay:.0f}秒后重连', 'WARNING')
+
+    def _poll_loop(self, stop_event):
+        while not stop_event.is_set():
+            started = time.time()
+            if self.stream and self.last_id is not None and started >= self._stream_retry_at:
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                if self._saturated(subscribers):
+                    self._stream_retry_at = started + self.interval
+                else:
+                    self._stream_until_closed(stop_event)
+                    if stop_event.is_set():
+                        break
+            # 推送不可用时按间隔轮询；推送断开后立即轮询一次，按 last_id 补齐断线期间的快讯
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.log(f'获取快讯异常: {e}', 'WARNING')
+            wake_at = started + self.interval
+            if self.stream:
+                wake_at = min(wake_at, max(self._stream_retry_at, time.time()))
+            stop_event.wait(max(0.0, wake_at - time.time()))
+
+
+class NewsFeed:
+    '''
+    快讯中心（由 TaskManager 持有，全进程共享）
+    按 (backend_url, token) 维护轮询器，订阅全部取消后移除
+    stream: 是否优先使用推送接口，为 False 时只轮询
+    '''
+
+    def __init__(self, stream=True):
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._pollers: Dict[tuple, NewsPoller] = {}
+
+    def subscribe(self, backend_url, token, interval=60, capacity=MAX_PENDING_NEWS) -> Optional[NewsSubscription]:
+        '''订阅快讯，后端地址或令牌为空时返回 None，由调用方退回独立轮询'''
+        if not backend_url or not token:
+            return None
+        key = (backend_url.rstrip('/'), token)
+        with self._lock:
+            poller = self._pollers.get(key)
+            if poller is None:
+                poller = self._pollers[key] = NewsPoller(key[0], token, on_idle=self._remove, stream=self.stream)
+            return poller.subscribe(interval, capacity)
+
+    def _remove(self, poller: NewsPoller):
+        with self._lock:
+            key = (poller.backend_url, poller.token)
+            if self._pollers.get(key) is poller and poller.idle:
+                del self._pollers[key]
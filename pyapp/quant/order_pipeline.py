@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+下单后处理流水线
+委托被券商受理后，通知推送、成交记录上报、持仓刷新等阻塞操作提交到后台线程池执行，
+策略线程立即返回继续处理下一笔行情。
+- 同一任务的操作按提交顺序串行执行（通知 -> 成交记录 -> 持仓刷新），不同任务之间并行
+- 操作抛出异常时按退避间隔重试，重试与最终失败记录到提交方的日志（submit 的 log 参数，通常为任务日志）
+"""
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+PIPELINE_MAX_WORKERS = 4 # 后台线程数（所有任务共享）
+DEFAULT_RETRIES = 2 # 失败后的重试次数
+RETRY_DELAYS = (1.0, 3.0, 10.0) # 第 n 次重试前的等待(秒)，超出时取最后一个
+
+
+class _Lane:
+    '''单个任务的操作队列'''
+
+    def __init__(self):
+        self.jobs = deque()
+        self.running = False
+        self.idle = threading.Event()
+        self.idle.set()
+
+
+class OrderPipeline:
+    '''
+    下单后处理流水线（由 TaskManager 持有，全进程共享）
+    submit(key, ...) 中 key 通常为任务ID，相同 key 的操作保证顺序执行
+    log: 未随操作提供日志函数时使用的默认日志
+    '''
+
+    def __init__(self, max_workers=PIPELINE_MAX_WORKERS, log=None):
+        self.log = log or (lambda message, level='INFO': print(f'[{level}] OrderPipeline: {message}'))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='order-pipeline')
+        self._lock = threading.Lock()
+        self._lanes: Dict[object, _Lane] = {}
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def submit(self, key, func, *args, name=None, retries=DEFAULT_RETRIES, log=None, **kwargs):
+        '''提交后台操作，立即返回；log 为提交方的日志函数 log(message, level)，用于记录重试与失败'''
+        job = (name or getattr(func, '__name__', 'job'), func, args, kwargs, retries, log)
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = self._lanes[key] = _Lane()
+            lane.jobs.append(job)
+            lane.idle.clear()
+            if lane.running:
+                return
+            lane.running = True
+        self._executor.submit(self._drain, key, lane)
+
+    def pending(self, key) -> int:
+        '''任务尚未完成的操作数量'''
+        with self._lock:
+            lane = self._lanes.get(key)
+            return len(lane.jobs) + (1 if lane.running else 0) if lane else 0
+
+    def flush(self, key, timeout=None) -> bool:
+        '''等待任务已提交的操作全部完成，返回是否在超时前完成'''
+        with self._lock:
+            lane = self._lanes.get(key)
+        return lane.idle.wait(timeout) if lane else True
+
+    def _drain(self, key, lane: _Lane):
+        while True:
+            with self._lock:
+                if not lane.jobs:
+                    lane.running = False
+                    lane.idle.set()
+                    if self._lanes.get(key) is lane:
+                        del self._lanes[key]
+                    return
+                job = lane.jobs.popleft()
+            self._run(key, *job)
+
+    def _run(self, key, name, func, args, kwargs, retries, log):
+        if log is None:
+            log = lambda message, level='INFO': self.log(f'任务({key}){message}', level)
+        for attempt in range(retries + 1):
+            try:
+                func(*args, **kwargs)
+                self.completed += 1
+                return
+            except Exception as e:
+                if attempt >= retries:
+                    self.failed += 1
+                    log(f'{name}失败，已重试{retries}次: {e}', 'ERROR')
+                    return
+                self.retried += 1
+                delay = RETRY_DELAYS[min(attempt, len(RETRY_DELAYS) - 1)]
+                log(f'{name}失败({attempt + 1}/{retries + 1}): {e}，{delay:.0f}秒后重试', 'WARNING')
+                time.sleep(delay)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
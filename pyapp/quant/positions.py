@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+持仓快照
+一次持仓查询的结果归一化为 PositionSnapshot，按证券代码建立索引，多次按代码查询无需重复遍历与归一化。
+不同券商客户端的持仓表头不同，字段映射按表头（列名集合）编译一次后复用：
+每个标准字段只保留该表头中实际存在的候选列，归一化时不再逐个尝试全部候选列名。
+"""
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# 标准字段: (候选列名（按优先级）, 类型)，取第一个非空值；类型为 None 时保留原值
+POSITION_FIELDS = (
+    ('stock_code', ('证券代码', 'stock_code'), None),
+    ('stock_name', ('证券名称', 'stock_name'), None),
+    ('total_quantity', ('持仓数量', '股票余额', '实际数量', 'stock_amount'), int),
+    ('available_quantity', ('可用数量', '可用余额', 'enable_amount'), int),
+    ('frozen_quantity', ('冻结数量', '冻结余额', 'frozen_quantity'), int),
+    ('cost_price', ('参考成本价', '成本价', '参考成本', 'cost_price'), float),
+    ('current_price', ('当前价', '市价', 'current_price'), float),
+    ('market_value', ('最新市值', '市值', 'market_value'), float),
+    ('total_pl_amount', ('浮动盈亏', '盈亏', '总盈亏', 'total_pl_amount'), float),
+    ('total_pl_ratio', ('盈亏比例(%)', '盈亏比(%)', 'total_pl_ratio'), float),
+    ('daily_pl_amount', ('当日盈亏', 'daily_pl_amount'), float),
+    ('daily_pl_ratio', ('当日盈亏比(%)', 'daily_pl_ratio'), float),
+    ('position_ratio', ('仓位占比(%)', 'position_ratio'), float),
+    ('daily_buy_quantity', ('当日买入', 'daily_buy_quantity'), int),
+    ('daily_sell_quantity', ('当日卖出', 'daily_sell_quantity'), int),
+)
+
+_DEFAULTS = {None: '', int: 0, float: 0.0}
+
+
+class FieldMapping:
+    '''
+    单个表头的字段映射（按列名集合编译并缓存）
+    '''
+
+    _lock = threading.Lock()
+    _compiled: Dict[frozenset, 'FieldMapping'] = {}
+
+    def __init__(self, columns: frozenset):
+        self.fields: List[Tuple[str, Tuple[str, ...], type]] = [
+            (name, tuple(c for c in candidates if c in columns), kind) for name, candidates, kind in POSITION_FIELDS
+        ]
+
+    @classmethod
+    def for_row(cls, row: dict) -> 'FieldMapping':
+        columns = frozenset(row)
+        mapping = cls._compiled.get(columns)
+        if mapping is None:
+            with cls._lock:
+                mapping = cls._compiled.get(columns)
+                if mapping is None:
+                    mapping = cls._compiled[columns] = cls(columns)
+        return mapping
+
+    def normalize(self, row: dict) -> dict:
+        position = {}
+        for name, columns, kind in self.fields:
+            value = None
+            for column in columns:
+                value = row[column]
+                if value:
+                    break
+            if not value:
+                position[name] = _DEFAULTS[kind]
+            else:
+                position[name] = kind(value) if kind else value
+        return position
+
+
+def normalize_position(row: dict) -> dict:
+    '''归一化单条持仓'''
+    return FieldMapping.for_row(row).normalize(row)
+
+
+class PositionSnapshot:
+    '''
+    一次持仓查询的快照
+    positions: 归一化后的持仓列表（保持原顺序）
+    get(stock_code): 按证券代码查询，代码重复时取第一条（与逐条遍历的结果一致）
+    '''
+
+    def __init__(self, rows=None, fetched_at: Optional[float] = None):
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.positions: List[dict] = []
+        self.index: Dict[str, dict] = {}
+        for row in rows or []:
+            if not isinstance(row, dict):
+                continue
+            position = normalize_position(row)
+            self.positions.append(position)
+            self.index.setdefault(position['stock_code'], position)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def get(self, stock_code) -> dict:
+        '''按证券代码查询持仓（返回副本），不存在时返回空字典'''
+        position = self.index.get(stock_code)
+        return dict(position) if position else {}
+
+    def all(self) -> List[dict]:
+        '''全部持仓（副本）'''
+        return [dict(p) for p in self.positions]
+
+    def __len__(self):
+        return len(self.positions)
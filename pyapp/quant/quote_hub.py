@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+进程级行情中心
+所有运行中的任务共享同一份订阅标的集合，由单个轮询线程批量请求上游行情，
+策略直接从内存快照读取最新报价。上游请求频率只与轮询频率相关，与任务数量无关。
+价格发生变化时主动推送给订阅者（回调或唤醒等待线程），策略无需固定间隔轮询。
+轮询间隔取各订阅者期望间隔（任务的 monitorInterval）的最小值，不低于 min_interval；
+行情拉取失败与恢复时记录到相关订阅者的日志，失败期间快照过期，策略读取时回退到直接请求行情。
+"""
+import time
+import threading
+from typing import Dict, List, Optional
+from .http_client import get_market_client
+
+SINA_QUOTE_URL = 'http://hq.sinajs.cn/list='
+SINA_REFERER = 'http://finance.sina.com.cn/'
+SINA_BATCH_SIZE = 200  # 单次请求的最大标的数量，避免 URL 过长
+DEFAULT_INTERVAL = 3.0 # 订阅未指定期望间隔时的轮询间隔(秒)
+MIN_INTERVAL = 1.0 # 轮询间隔下限(秒)，避免请求上游过于频繁
+
+
+def to_sina_symbol(code) -> str:
+    '''
+    统一转换为新浪行情代码
+    支持: 600519 / 600519.SH / sh600519 -> sh600519
+    '''
+    code = str(code or '').strip()
+    lower = code.lower()
+    if lower[:2] in ('sh', 'sz', 'bj') and lower[2:].isdigit():
+        return lower
+
+    parts = code.split('.')
+    if len(parts) == 2 and parts[1].lower() in ('sh', 'sz', 'bj'):
+        return parts[1].lower() + parts[0]
+
+    code_clean = ''.join(filter(str.isdigit, code))
+    if code_clean.startswith(('92', '8', '4')):
+        return f'bj{code_clean}'
+    if code_clean.startswith(('6', '5')):
+        return f'sh{code_clean}'
+    if code_clean.startswith(('0', '3', '1')):
+        return f'sz{code_clean}'
+    return code
+
+
+def parse_sina_quotes(text: str) -> Dict[str, dict]:
+    '''
+    解析新浪行情返回内容（支持多标的）
+    返回: {sina_symbol: {'price', 'open', 'pre_close', 'high', 'low', 'name'}}
+    '''
+    result = {}
+    for line in text.split(';'):
+        line = line.strip()
+        if not line.startswith('var hq_str_') or '"' not in line:
+            continue
+        symbol = line[len('var hq_str_'):line.find('=')]
+        content = line.split('"')[1]
+        parts = content.split(',')
+        if len(parts) <= 5:
+            continue
+        try:
+            result[symbol] = {
+                'name': parts[0],
+                'price': float(parts[3]),
+                'open': float(parts[1]),
+                'pre_close': float(parts[2]),
+                'high': float(parts[4]),
+                'low': float(parts[5]),
+            }
+        except ValueError:
+            continue
+    return result
+
+
+class TickSubscription:
+    '''
+    单个订阅者对单个标的的行情订阅
+    - 价格变化时由行情中心推送，唤醒 wait() 中阻塞的策略线程
+    - 可选 callback 在轮询线程中同步调用，回调内不应执行耗时操作
+    - interval: 期望的轮询间隔(秒)，log: 订阅者日志 log(message, level)，接收行情拉取失败/恢复消息
+    '''
+
+    def __init__(self, hub, symbol, callback=None, interval=None, log=None):
+        self.hub = hub
+        self.symbol = symbol
+        self.callback = callback
+        self.interval = interval
+        self.log = log
+        self.closed = False
+        self._cond = threading.Condition()
+        self._latest = None
+        self._version = 0
+        self._seen = 0
+
+    @property
+    def latest(self) -> Optional[dict]:
+        with self._cond:
+            return dict(self._latest) if self._latest else None
+
+    def wait(self, timeout=None) -> Optional[dict]:
+        '''
+        阻塞等待价格变化的新行情
+        返回: 新行情快照；超时或订阅关闭时返回 None
+        '''
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self._version != self._seen, timeout)
+            if self.closed or self._version == self._seen:
+                return None
+            self._seen = self._version
+            return dict(self._latest)
+
+    def close(self):
+        '''取消订阅并唤醒等待线程'''
+        if self.closed:
+            return
+        self.hub.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _push(self, quote):
+        with self._cond:
+            self._latest = quote
+            self._version += 1
+            self._cond.notify_all()
+        if self.callback:
+            try:
+                self.callback(self.symbol, dict(quote))
+            except Exception as e:
+                self.hub.log(f'行情回调异常({self.symbol})：{e}', 'WARNING')
+
+
+class QuoteHub:
+    '''
+    行情中心（由 TaskManager 持有，全进程共享）
+    - subscribe/unsubscribe 维护订阅标的并集，全部取消后停止轮询线程
+    - 后台线程按 poll_interval() 批量拉取全部订阅标的，价格变化时推送给对应订阅
+    - get() 返回内存中的最新快照，过期或未订阅时返回 None，由调用方自行兜底
+    interval: 订阅未指定期望间隔时使用的轮询间隔，min_interval: 轮询间隔下限
+    '''
+
+    def __init__(self, interval=DEFAULT_INTERVAL, min_interval=MIN_INTERVAL, timeout=3):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._subscribers = {}  # {sina_symbol: [TickSubscription]}
+        self._snapshots = {}    # {sina_symbol: quote}
+        self._failing = set()   # 最近一次拉取失败的标的（失败/恢复只通知订阅者一次）
+        self._thread = None
+        self._stop_event = None
+
+    def log(self, message, level='INFO'):
+        print(f'[{level}] QuoteHub: {message}')
+
+    def subscribe(self, code, callback=None, interval=None, log=None) -> TickSubscription:
+        '''
+        订阅标的行情
+        callback: 可选，价格变化时调用 callback(sina_symbol, quote)
+        interval: 可选，期望的轮询间隔(秒)，通常为任务的 monitorInterval
+        log: 可选，订阅者日志，行情拉取失败与恢复时记录
+        '''
+        symbol = to_sina_symbol(code)
+        subscription = TickSubscription(self, symbol, callback, interval, log)
+        with self._lock:
+            self._subscribers.setdefault(symbol, []).append(subscription)
+            if symbol in self._snapshots:
+                subscription._latest = dict(self._snapshots[symbol])
+            if not self._thread or not self._thread.is_alive():
+                self._stop_event = threading.Event()
+                self._thread = threading.Thread(target=self._poll_loop, args=(self._stop_event,))
+                self._thread.daemon = True
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: TickSubscription):
+        '''取消订阅，订阅为空时停止轮询线程'''
+        symbol = subscription.symbol
+        with self._lock:
+            subscriptions = self._subscribers.get(symbol)
+            if not subscriptions or subscription not in subscriptions:
+                return
+            subscriptions.remove(subscription)
+            if not subscriptions:
+                del self._subscribers[symbol]
+                self._snapshots.pop(symbol, None)
+                self._failing.discard(symbol)
+            if not self._subscribers and self._stop_event:
+                self._stop_event.set()
+                self._thread = None
+                self._stop_event = None
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return list(self._subscribers.keys())
+
+    def poll_interval(self) -> float:
+        '''当前轮询间隔：各订阅期望间隔的最小值，不低于 min_interval'''
+        with self._lock:
+            wanted = [s.interval or self.interval for subs in self._subscribers.values() for s in subs]
+        return max(self.min_interval, min(wanted)) if wanted else self.interval
+
+    def get(self, code, max_age: Optional[float] = None) -> Optional[dict]:
+        '''
+        读取最新快照
+        max_age: 快照最大允许时长(秒)，默认为 3 个轮询周期
+        '''
+        symbol = to_sina_symbol(code)
+        if max_age is None:
+            max_age = self.poll_interval() * 3
+        with self._lock:
+            snapshot = self._snapshots.get(symbol)
+        if not snapshot or time.time() - snapshot['updated_at'] > max_age:
+            return None
+        return dict(snapshot)
+
+    def poll_once(self):
+        '''批量拉取一次全部订阅标的'''
+        symbols = self.symbols()
+        for i in range(0, len(symbols), SINA_BATCH_SIZE):
+            batch = symbols[i:i + SINA_BATCH_SIZE]
+            try:
+                quotes = self._fetch_batch(batch)
+            except Exception as e:
+                self.log(f'批量获取行情错误(sina)：{e}', 'WARNING')
+                self._notify_status(batch, e)
+                continue
+            self._notify_status(batch)
+            if not quotes:
+                continue
+            now = time.time()
+            changed = []
+            with self._lock:
+                for symbol, quote in quotes.items():
+                    if symbol not in self._subscribers:
+                        continue
+                    previous = self._snapshots.get(symbol)
+                    snapshot = {**quote, 'updated_at': now}
+                    self._snapshots[symbol] = snapshot
+                    if not previous or previous['price'] != snapshot['price']:
+                        changed.append((snapshot, list(self._subscribers[symbol])))
+            # 在锁外推送，避免回调阻塞订阅/取消订阅
+            for snapshot, subscriptions in changed:
+                for subscription in subscriptions:
+                    subscription._push(snapshot)
+
+    def _fetch_batch(self, symbols: List[str]) -> Dict[str, dict]:
+        url = SINA_QUOTE_URL + ','.join(symbols)
+        resp = get_market_client().get(url, headers={'Referer': SINA_REFERER}, timeout=self.timeout)
+        resp.raise_for_status()
+        return parse_sina_quotes(resp.content.decode('gbk'))
+
+    def _notify_status(self, symbols: List[str], error=None):
+        '''拉取失败或恢复时通知相关订阅者（状态变化时各通知一次）'''
+        with self._lock:
+            if error is not None:
+                changed = [s for s in symbols if s not in self._failing and s in self._subscribers]
+                self._failing.update(changed)
+            else:
+                changed = [s for s in symbols if s in self._failing]
+                self._failing.difference_update(changed)
+            targets = [(s, list(self._subscribers.get(s, []))) for s in changed]
+        for symbol, subscriptions in targets:
+            for subscription in subscriptions:
+                if not subscription.log:
+                    continue
+                if error is not None:
+                    subscription.log(f'行情中心获取{symbol}行情失败：{error}，恢复前改为直接请求行情', 'WARNING')
+                else:
+                    subscription.log(f'行情中心已恢复获取{symbol}行情', 'INFO')
+
+    def _poll_loop(self, stop_event):
+        while not stop_event.is_set():
+            started = time.time()
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.log(f'行情轮询异常：{e}', 'ERROR')
+            stop_event.wait(max(0.0, self.poll_interval() - (time.time() - started)))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+多数据源行情路由
+- 按数据源记录滚动延迟与错误率，请求优先发送到最快的健康数据源
+- 主数据源在 hedge_delay 内未返回时，并行向次优数据源发送对冲请求，取先返回的有效结果
+- 连续失败达到阈值的数据源熔断 cooldown 秒，到期后放行一次试探请求
+"""
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+
+ERROR_PENALTY = 1.0 # 错误率折算的延迟惩罚(秒)，避免快速失败的数据源排在前面
+
+
+class SourceStats:
+    '''单个数据源的滚动统计与熔断状态（全进程共享）'''
+
+    def __init__(self, name, window=20):
+        self.name = name
+        self.latencies = deque(maxlen=window)
+        self.results = deque(maxlen=window) # True: 成功, False: 失败
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.results.count(False) / len(self.results) if self.results else 0.0
+
+    @property
+    def score(self) -> float:
+        '''排序得分(秒)，越小越优；无样本的数据源为 0，优先获得试探机会'''
+        return self.avg_latency + self.error_rate * ERROR_PENALTY
+
+    def is_available(self, now) -> bool:
+        return now >= self.open_until
+
+    def record_success(self, latency):
+        self.latencies.append(latency)
+        self.results.append(True)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self, latency, failure_threshold, cooldown) -> bool:
+        '''记录失败，返回是否触发熔断'''
+        self.latencies.append(latency)
+        self.results.append(False)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= failure_threshold:
+            self.open_until = time.time() + cooldown
+            return True
+        return False
+
+
+class QuoteRouter:
+    '''
+    行情路由器
+    sources: [(name, fetch_func)]，按偏好顺序排列，fetch_func(ts_code) 返回行情字典
+    返回 None、抛出异常或价格<=0 均视为失败
+    '''
+
+    _stats_lock = threading.Lock()
+    _stats: Dict[str, SourceStats] = {}
+    _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='quote-router')
+
+    def __init__(self, sources: List[tuple], hedge_delay=0.3, timeout=3.0,
+                 failure_threshold=3, cooldown=30, log_callback: Optional[Callable] = None):
+        self.sources = sources
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.log_callback = log_callback
+
+    def log(self, message, level='INFO'):
+        print(f'[{level}] {message}')
+        if self.log_callback:
+            try:
+                self.log_callback(level, self.__class__.__name__, str(message))
+            except Exception:
+                pass
+
+    @classmethod
+    def get_stats(cls, name) -> SourceStats:
+        with cls._stats_lock:
+            if name not in cls._stats:
+                cls._stats[name] = SourceStats(name)
+            return cls._stats[name]
+
+    def ranked_sources(self) -> List[tuple]:
+        '''健康数据源按得分排序（同分按偏好顺序）；全部熔断时按原顺序全部放行'''
+        now = time.time()
+        candidates = []
+        for order, (name, func) in enumerate(self.sources):
+            stats = self.get_stats(name)
+            if stats.is_available(now):
+                candidates.append((stats.score, order, name, func))
+        if not candidates:
+            return list(self.sources)
+        candidates.sort(key=lambda item: (item[0], item[1]))
+        return [(name, func) for _, _, name, func in candidates]
+
+    def _call_source(self, name, func, ts_code):
+        started = time.time()
+        try:
+            quote = func(ts_code)
+        except Exception:
+            quote = None
+        latency = time.time() - started
+
+        stats = self.get_stats(name)
+        with self._stats_lock:
+            if quote and quote.get('price', 0) > 0:
+                stats.record_success(latency)
+                return quote
+            tripped = stats.record_failure(latency, self.failure_threshold, self.cooldown)
+        if tripped:
+            self.log(f'行情数据源({name})连续失败{stats.consecutive_failures}次，熔断{self.cooldown}秒', 'WARNING')
+        return None
+
+    def get_quote(self, ts_code) -> Optional[dict]:
+        '''按排序依次请求数据源，超过 hedge_delay 未返回或失败时启动下一个数据源'''
+        ranked = iter(self.ranked_sources())
+        deadline = time.time() + self.timeout
+        pending = set()
+
+        def launch_next():
+            source = next(ranked, None)
+            if source:
+                name, func = source
+                pending.add(self._executor.submit(self._call_source, name, func, ts_code))
+            return source is not None
+
+        launch_next()
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=min(self.hedge_delay, remaining), return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                quote = future.result()
+                if quote:
+                    return quote
+            # 当前请求失败或超过对冲延迟仍未返回，向下一个数据源发送请求
+            launch_next()
+        return None
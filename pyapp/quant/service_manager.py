@@ -4,7 +4,7 @@ import threading
 import uvicorn
 import platform
 from pyapp.server import app as task_app
-from pyapp.proxy_server import create_proxy_app
+from pyapp.proxy_server import create_proxy_app, SNAPSHOT_TTL
 
 class ServiceManager:
     """
@@ -15,13 +15,14 @@ class ServiceManager:
     _internal_servers = {}
     
     @classmethod
-    def start_service(cls, client_type='universal_client', client_path='', port=8888, token=''):
+    def start_service(cls, client_type='universal_client', client_path='', port=8888, token='', snapshot_ttl=SNAPSHOT_TTL):
         """
         启动服务
         :param client_type: 客户端类型
         :param client_path: 客户端路径 (仅支持外部客户端路径，如同花顺exe路径)
         :param port: 绑定端口
         :param token: 验证 Token
+        :param snapshot_ttl: 资金/持仓快照缓存时长(秒)
         :return: (code, msg, data)
         """
         try:
@@ -41,7 +42,7 @@ class ServiceManager:
                 else:
                     del cls._internal_servers[port]
            
-            app = create_proxy_app(client_type, client_path, token)
+            app = create_proxy_app(client_type, client_path, token, snapshot_ttl)
             log_prefix = f'Proxy Server ({client_path or "mock"})'
             ip = '0.0.0.0'
             config = uvicorn.Config(app, host=ip, port=port, log_level="info")
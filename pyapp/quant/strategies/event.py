@@ -3,15 +3,28 @@ import time
 import json
 import httpx
 import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from ..base import BaseStrategy
+from ..keyword_matcher import KeywordMatcher
+from ..news_feed import fetch_news_since
+from ..backend_reporter import get_backend_reporter
+from ..ai_cache import CONTENT_PLACEHOLDER, get_verdict_cache, prompt_hash
+
+AI_MAX_WORKERS = 4 # 全部事件任务共享的AI分析并发数
+MAX_PENDING_ANALYSES = 10 # 单个任务待处理的AI分析上限，超出时丢弃最早的快讯
 
 class EventStrategy(BaseStrategy):
+    # AI分析线程池（进程内共享），慢速的大模型调用不阻塞快讯轮询
+    _ai_executor = ThreadPoolExecutor(max_workers=AI_MAX_WORKERS, thread_name_prefix='event-ai')
+
     def __init__(self, data, log_callback=None):
         super().__init__(data, log_callback)
         self._init_config()
         self.last_news_id = 0
         self.running = False
+        self._pending_analyses = deque() # 按快讯ID顺序排列的进行中分析
 
     def _init_config(self):
         config = self.data.get('task', {}).get('config', {})
@@ -35,6 +48,8 @@ class EventStrategy(BaseStrategy):
         self.target_keywords = config.get('targetKeywords', [])
         self.trigger_keywords = config.get('triggerKeywords', [])
         self.excluded_keywords = config.get('excludedKeywords', [])
+        # 三类关键词编译为一个自动机，一次扫描完成过滤；关键词相同的任务共享
+        self.keyword_matcher = KeywordMatcher.compile(self.target_keywords, self.trigger_keywords, self.excluded_keywords)
        
         # Notification
         self.webhook_url = server.get('webhook_url', '')
@@ -44,6 +59,9 @@ class EventStrategy(BaseStrategy):
         # Deep Thinking
         self.enable_deep_thinking = bool(config.get('enableDeepThinking', False))
         self.confidence_threshold = float(config.get('confidenceThreshold', 0.7))
+        self.enable_ai_cache = bool(config.get('enableAiCache', True)) # 复用相同快讯的AI分析结论
+        self.ai_deadline = float(config.get('aiDeadline') or (300 if self.enable_deep_thinking else 180)) # 单条快讯分析截止时间(秒)
+        self.signal_max_age = float(config.get('signalMaxAge', 600)) # 信号最大时效(秒)，超过则不交易，0为不限制
         
         # Trading Config
         self.enable_real_trade = bool(config.get('enableRealTrade', False))
@@ -78,9 +96,23 @@ class EventStrategy(BaseStrategy):
             self.log(f"任务({id})：未配置大模型AI Key", "ERROR")
             return
 
-        self.last_news_id = self.fetch_latest_news_id()
+        # 优先接入共享快讯中心（同一后端的任务共用一次轮询），不可用时独立轮询
+        subscription = self.news_feed.subscribe(self.backend_url, self.token, self.monitor_interval) if self.news_feed else None
+        if not subscription:
+            self.last_news_id = self.fetch_latest_news_id()
         self.log(f"任务({id})：策略启动完成，开始监控快讯和AI分析...")
 
+        try:
+            self._monitor_news(id, subscription)
+        finally:
+            if subscription:
+                subscription.close()
+            self._cancel_analyses()
+
+    def _monitor_news(self, id, subscription):
+        """
+        快讯监控主循环：获取快讯、关键词过滤、提交AI分析并处理结果
+        """
         while self.running:
             try:
                 # 0. 检查有效期
@@ -96,40 +128,120 @@ class EventStrategy(BaseStrategy):
                         self.validity_period = None
 
                 # 1. 获取快讯快报
-                news_list = self.fetch_news(self.last_news_id)
+                news_list = subscription.drain() if subscription else self.fetch_news(self.last_news_id)
+                lag_warning = subscription.lag_report(self.monitor_interval) if subscription else None
+                if lag_warning:
+                    self.log(f"任务({id})：{lag_warning}", "WARNING")
                 
                 for news in news_list:
                     self.last_news_id = max(self.last_news_id, news.get('id', 0))
                     content = news.get('content', '')
                     
-                    # 2. 关键词过滤
+                    # 2. 关键词过滤，命中后提交AI分析（线程池异步执行）
                     if self.contains_keywords(content):
                         self.log(f"任务({id})：推送快讯-{content[:50]}...")
+                        self._submit_analysis(news, content)
+                
+                # 3. 按快讯顺序处理已完成的分析结果
+                self._process_analyses()
                             
-                        # 3. AI分析
-                        analysis_result = self.analyze_news_with_ai(content)
-                        if analysis_result:
-                            self.log(f"AI分析结果：{json.dumps(analysis_result, ensure_ascii=False)}")
-                            
-                            if self.notify_analysis:
-                                self.send_trade_notification(content, analysis_result)
-                            
-                            # 4. 生成并执行交易信号
-                            self.process_signal(analysis_result)
-                            
-                # 智能等待，支持快速停止
+                # 智能等待，支持快速停止；等待期间持续处理完成的分析结果，快讯中心推送新快讯时立即处理
                 end_time = time.time() + self.monitor_interval
                 while self.running and time.time() < end_time:
                     # 每次休眠不超过1秒，以便及时响应停止信号
                     sleep_duration = min(1.0, end_time - time.time())
                     if sleep_duration <= 0:
                         break
-                    time.sleep(sleep_duration)
+                    if subscription:
+                        if subscription.wait(sleep_duration):
+                            break
+                    else:
+                        time.sleep(sleep_duration)
+                    self._process_analyses()
                 
             except Exception as e:
                 self.log(f"任务({id})：策略运行异常：{e}", "ERROR")
                 time.sleep(10)
 
+    def _submit_analysis(self, news, content):
+        """
+        提交快讯AI分析到线程池
+        """
+        if len(self._pending_analyses) >= MAX_PENDING_ANALYSES:
+            dropped = self._pending_analyses.popleft()
+            dropped['future'].cancel()
+            self.log(f"AI分析队列已满，放弃较早的快讯({dropped['id']})", "WARNING")
+
+        deadline = time.time() + self.ai_deadline
+        self._pending_analyses.append({
+            'id': news.get('id', 0),
+            'content': content,
+            'published_at': self._news_timestamp(news) or time.time(),
+            'deadline': deadline,
+            'future': self._ai_executor.submit(self.analyze_news_with_ai, content, deadline),
+        })
+
+    def _process_analyses(self):
+        """
+        按快讯ID顺序处理已完成的AI分析：队首未完成时等待，超过截止时间则放弃
+        """
+        now = time.time()
+        while self._pending_analyses:
+            item = self._pending_analyses[0]
+            future = item['future']
+            if not future.done():
+                if now < item['deadline']:
+                    break
+                future.cancel()
+                self._pending_analyses.popleft()
+                self.log(f"快讯({item['id']})AI分析超过截止时间({self.ai_deadline:.0f}秒)，已放弃", "WARNING")
+                continue
+
+            self._pending_analyses.popleft()
+            try:
+                analysis_result = future.result()
+            except Exception as e:
+                self.log(f"AI分析异常: {e}", "ERROR")
+                continue
+            if not analysis_result:
+                continue
+
+            self.log(f"AI分析结果：{json.dumps(analysis_result, ensure_ascii=False)}")
+            if self.notify_analysis:
+                self.send_trade_notification(item['content'], analysis_result)
+
+            # 4. 生成并执行交易信号（过期信号不交易）
+            age = time.time() - item['published_at']
+            if self.signal_max_age > 0 and age > self.signal_max_age:
+                self.log(f"快讯({item['id']})信号已过时效({age:.0f}秒 > {self.signal_max_age:.0f}秒)，跳过交易", "WARNING")
+                continue
+            self.process_signal(analysis_result)
+
+    def _cancel_analyses(self):
+        """
+        策略停止时取消未开始的分析
+        """
+        while self._pending_analyses:
+            self._pending_analyses.popleft()['future'].cancel()
+
+    @staticmethod
+    def _news_timestamp(news):
+        """
+        快讯发布时间(Unix时间戳)，无法解析时返回None
+        """
+        ctime = news.get('ctime') or news.get('created_at')
+        try:
+            if isinstance(ctime, (int, float)) or (isinstance(ctime, str) and ctime.isdigit()):
+                value = float(ctime)
+                return value / 1000.0 if value > 1e11 else value
+            if isinstance(ctime, str) and ctime:
+                if 'T' in ctime:
+                    return datetime.fromisoformat(ctime.replace('Z', '+00:00')).timestamp()
+                return datetime.strptime(ctime.split('.')[0], "%Y-%m-%d %H:%M:%S").timestamp()
+        except Exception:
+            pass
+        return None
+
     def _fetch_news_list(self, page_size=20, last_id=None):
         """
         通用的快讯获取方法
@@ -174,41 +286,25 @@ class EventStrategy(BaseStrategy):
 
     def fetch_news(self, last_id):
         """
-        获取大于last_id的快讯数据
+        获取大于last_id的全部快讯（按ID升序）
+        从最新一页向前翻页直到覆盖last_id，快讯爆发时不因单页条数限制而遗漏
         """
-        # 增加 pageSize 以防止遗漏，默认获取最新的20条
-        # 后端API通常按时间倒序排列，我们取回后需要筛选 > last_id 的部分
-        raw_list = self._fetch_news_list(page_size=20, last_id=last_id)
-        
-        # 过滤掉已处理的快讯 (id <= last_id)
-        new_items = [item for item in raw_list if item.get('id', 0) > last_id]
-        
-        # 按ID升序排列，确保按时间顺序处理，且方便last_news_id正确更新
-        new_items.sort(key=lambda x: x.get('id', 0))
-        
+        try:
+            new_items, complete = fetch_news_since(self.backend_url, self.token, last_id)
+        except Exception as e:
+            self.log(f"获取快讯异常: {e}", "WARNING")
+            return []
+        if not complete and new_items:
+            self.log(f"快讯翻页未覆盖到last_id={last_id}，期间快讯可能缺失", "WARNING")
         return new_items
 
     def contains_keywords(self, content):
-        # 如果都没有配置，直接返回False（避免无过滤全通过）
-        if not self.target_keywords and not self.trigger_keywords:
-            return False
-
-        # 转为小写进行匹配，忽略大小写差异
-        content_lower = content.lower()
-
-        # 0. 检查排除关键词 (如果有配置，必须都不包含)
-        if self.excluded_keywords and any(k.lower() in content_lower for k in self.excluded_keywords):
-            return False
-
-        # 1. 检查标的关键词 (如果配置了，必须满足其一)
-        if self.target_keywords and not any(k.lower() in content_lower for k in self.target_keywords):
-            return False
-
-        # 2. 检查触发关键词 (如果配置了，必须满足其一)
-        if self.trigger_keywords and not any(k.lower() in content_lower for k in self.trigger_keywords):
-            return False
-
-        return True
+        # 如果都没有配置，返回False（避免无过滤全通过）
+        # 0. 命中任一排除关键词时返回False
+        # 1. 配置了标的关键词时必须满足其一
+        # 2. 配置了触发关键词时必须满足其一
+        # 均忽略大小写，由预编译的自动机一次扫描完成
+        return self.keyword_matcher.contains(content)
 
     def _normalize_ai_content(self, value):
         if value is None:
@@ -293,15 +389,10 @@ class EventStrategy(BaseStrategy):
                 return False
         return False
 
-    def analyze_news_with_ai(self, content):
+    def build_ai_payload(self, content):
         """
-        调用AI接口进行分析
+        构建AI分析请求体（模型、提示词与参数）
         """
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.ai_key}"
-        }
-        
         # 检查是否为支持 json_object 的模型 (DeepSeek, GPT, Qwen, Gemini, Minimax, GLM/Zhipu, Doubao)
         # 常见标识: deepseek, gpt-4, gpt-3.5, qwen, gemini, minimax, abab, glm, doubao
         model_lower = self.ai_model.lower()
@@ -318,8 +409,8 @@ class EventStrategy(BaseStrategy):
 
 快讯内容：{content}
 
-关注标的关键词：{', '.join(self.target_keywords)}
-关注触发关键词：{', '.join(self.trigger_keywords)}
+关注标的关键词：{', '.join(sorted(set(self.target_keywords)))}
+关注触发关键词：{', '.join(sorted(set(self.trigger_keywords)))}
 
 请务必返回合法的JSON格式结果（不要包含Markdown代码块标记），包含以下字段：
 - related_stock: 相关股票代码（如 600519，如果没有明确个股则留空）
@@ -341,6 +432,39 @@ class EventStrategy(BaseStrategy):
         # 如果模型支持 json_object 模式，则开启以增加稳定性
         if supports_json_mode:
             payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def analyze_news_with_ai(self, content, deadline=None):
+        """
+        调用AI接口进行分析
+        开启缓存时，相同模型与提示词下同一条快讯只分析一次（进程内各任务共享，并发请求合并）
+        deadline: 截止时间(time.time())，超过后不再重试
+        """
+        payload = self.build_ai_payload(content)
+        if not self.enable_ai_cache:
+            return self.request_ai(payload, deadline)
+        try:
+            cache = get_verdict_cache()
+        except Exception as e:
+            self.log(f"AI分析缓存不可用: {e}", "WARNING")
+            return self.request_ai(payload, deadline)
+        prompt_key = prompt_hash(self.build_ai_payload(CONTENT_PLACEHOLDER))
+        verdict, cached = cache.get_or_compute(
+            self.ai_model, prompt_key, content, lambda: self.request_ai(payload, deadline)
+        )
+        if cached:
+            self.log(f"命中AI分析缓存({self.ai_model})")
+        return verdict
+
+    def request_ai(self, payload, deadline=None):
+        """
+        发送AI分析请求并解析返回的JSON结果，失败时返回None
+        deadline: 截止时间(time.time())，单次请求超时不超过剩余时间，到期后不再重试
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.ai_key}"
+        }
         
         try:
             self.log(f"正在调用AI({self.ai_model})进行分析...")
@@ -348,8 +472,12 @@ class EventStrategy(BaseStrategy):
             timeout = 300 if self.enable_deep_thinking else 180
             retry_count = 3
             for i in range(retry_count):
+                remaining = deadline - time.time() if deadline else timeout
+                if remaining <= 0:
+                    self.log("AI API调用已超过截止时间", "ERROR")
+                    return None
                 try:
-                    resp = httpx.post(self.ai_url, json=payload, headers=headers, timeout=timeout)
+                    resp = httpx.post(self.ai_url, json=payload, headers=headers, timeout=min(timeout, remaining))
                     if resp.status_code == 200:
                         break
                     else:
@@ -607,179 +735,164 @@ class EventStrategy(BaseStrategy):
         return res
 
     def _update_task_position(self, stock_code):
-        try:
-            positions = []
-            position = self.trader.get_position(stock_code)
-            if position and position.get('total_quantity', 0) > 0:
-                positions = [position]
-            
-            data = {
-                "id": self.data.get('id'),
-                "positions": positions, 
-            }
-            
-            self._update_trade_task(data)
-        except Exception as e:
-            self.log(f"更新持仓数据失败: {e}", "WARNING")
+        """
+        刷新持仓并同步到交易任务（后台执行，不阻塞快讯处理）
+        """
+        self._after_order("更新持仓数据", self._refresh_task_position, stock_code)
+
+    def _refresh_task_position(self, stock_code):
+        positions = []
+        position = self.trader.get_position(stock_code)
+        if position and position.get('total_quantity', 0) > 0:
+            positions = [position]
+        
+        data = {
+            "id": self.data.get('id'),
+            "positions": positions, 
+        }
+        
+        self._update_trade_task(data)
 
     def _update_trade_task(self, data):
         if not self.backend_url or not self.token:
             return
 
-        url = f"{self.backend_url}/quant/tradeTask/updateTradeTask"
-            
-        headers = {
-            "x-token": self.token,
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            httpx.put(url, json=data, headers=headers, timeout=5)
-            # 通知前端刷新交易任务
-            # self.log("TRADE_TASK_UPDATE_TRIGGER") # 避免日志刷屏，可选
-        except Exception:
-            pass
+        # 由上报服务合并同一任务的持仓更新并批量发送
+        get_backend_reporter(self.backend_url).update_trade_task(self.token, data, log=self.log)
 
     def _save_trade_record(self, action, stock_code, price, quantity, reason="event_trade"):
+        """
+        上报成交记录：成交时间在调用时确定，股票名称在后台查询后交由上报服务发送
+        """
         if not self.backend_url or not self.token:
             return
 
-        url = f"{self.backend_url}/quant/tradeRecord/createTradeRecord"
         account = self.data.get('account', {})
-        
-        # 尝试获取股票名称
-        stock_name = stock_code
-        try:
-             # 尝试从 trader 缓存或持仓中获取 name
-             pos = self.trader.get_position(stock_code)
-             if pos and pos.get('stock_name'):
-                 stock_name = pos.get('stock_name')
-        except:
-            pass
-
         data = {
             "member_id": account.get('member_id'),
             "account_id": account.get('id'),
             "task_id": self.data.get('id'),
             "symbol": stock_code,
-            "name": stock_name,
+            "name": stock_code,
             "price": float(price),
             "quantity": float(quantity),
             "amount": float(price) * float(quantity),
             "action": action, 
             "reason": reason,
-            "traded_at": time.strftime('%Y-%m-%dT%H:%M:%S+08:00'),
-        }
-        
-        headers = {
-            "x-token": self.token,
-            "Content-Type": "application/json"
+            "traded_at": self.clock.now().strftime('%Y-%m-%dT%H:%M:%S+08:00'),
         }
         
+        self._after_order("上报成交记录", self._post_trade_record, stock_code, data)
+
+    def _post_trade_record(self, stock_code, data):
+        # 尝试获取股票名称
         try:
-            httpx.post(url, json=data, headers=headers, timeout=5)
-            # 通知前端刷新交易记录
-            # self.log("TRADE_RECORD_UPDATE_TRIGGER")
-        except Exception:
+             # 尝试从 trader 缓存或持仓中获取 name
+             pos = self.trader.get_position(stock_code)
+             if pos and pos.get('stock_name'):
+                 data["name"] = pos.get('stock_name')
+        except:
             pass
 
+        # 后端不可用时由上报服务暂存补发
+        get_backend_reporter(self.backend_url).create_trade_record(self.token, data, log=self.log)
+
     def send_trade_notification(self, content, analysis, title="📢 财经快讯AI分析报告", content_label="快讯内容"):
         """
-        发送飞书通知
+        发送飞书通知：卡片内容（含时间）在调用时生成，发送在后台执行，不阻塞信号处理
         """
         if not self.webhook_url:
             return
 
-        try:
-            # 颜色判断
-            color = "grey"
-            if analysis.get('signal') == 'buy':
-                color = "red"
-            elif analysis.get('signal') == 'sell':
-                color = "green"
-
-            card = {
-                "config": {
-                    "wide_screen_mode": True
+        # 颜色判断
+        color = "grey"
+        if analysis.get('signal') == 'buy':
+            color = "red"
+        elif analysis.get('signal') == 'sell':
+            color = "green"
+
+        card = {
+            "config": {
+                "wide_screen_mode": True
+            },
+            "header": {
+                "title": {
+                    "tag": "plain_text",
+                    "content": title
                 },
-                "header": {
-                    "title": {
-                        "tag": "plain_text",
-                        "content": title
-                    },
-                    "template": color
+                "template": color
+            },
+            "elements": [
+                {
+                    "tag": "div",
+                    "text": {
+                        "content": f"**{content_label}**：\n{content}",
+                        "tag": "lark_md"
+                    }
                 },
-                "elements": [
-                    {
-                        "tag": "div",
-                        "text": {
-                            "content": f"**{content_label}**：\n{content}",
-                            "tag": "lark_md"
-                        }
-                    },
-                    {
-                        "tag": "hr"
-                    },
-                    {
-                        "tag": "div",
-                        "fields": [
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**相关标的**：\n{analysis.get('related_stock', '无')}"
-                                }
-                            },
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**交易信号**：\n{analysis.get('signal', 'none')}"
-                                }
-                            },
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**已Price In**：\n{'是' if self._to_bool(analysis.get('is_priced_in', False)) else '否'}"
-                                }
-                            },
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**置信度**：\n{analysis.get('confidence', 0)}"
-                                }
+                {
+                    "tag": "hr"
+                },
+                {
+                    "tag": "div",
+                    "fields": [
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**相关标的**：\n{analysis.get('related_stock', '无')}"
                             }
-                        ]
-                    },
-                    {
-                        "tag": "div",
-                        "text": {
-                            "tag": "lark_md",
-                            "content": f"**分析理由**：\n{analysis.get('reason', '')}"
-                        }
-                    },
-                    {
-                        "tag": "note",
-                        "elements": [
-                            {
-                                "tag": "plain_text",
-                                "content": f"时间：{time.strftime('%Y-%m-%d %H:%M:%S')}"
+                        },
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**交易信号**：\n{analysis.get('signal', 'none')}"
+                            }
+                        },
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**已Price In**：\n{'是' if self._to_bool(analysis.get('is_priced_in', False)) else '否'}"
+                            }
+                        },
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**置信度**：\n{analysis.get('confidence', 0)}"
                             }
-                        ]
+                        }
+                    ]
+                },
+                {
+                    "tag": "div",
+                    "text": {
+                        "tag": "lark_md",
+                        "content": f"**分析理由**：\n{analysis.get('reason', '')}"
                     }
-                ]
-            }
+                },
+                {
+                    "tag": "note",
+                    "elements": [
+                        {
+                            "tag": "plain_text",
+                            "content": f"时间：{time.strftime('%Y-%m-%d %H:%M:%S')}"
+                        }
+                    ]
+                }
+            ]
+        }
 
-            payload = {
-                "msg_type": "interactive",
-                "card": card
-            }
+        payload = {
+            "msg_type": "interactive",
+            "card": card
+        }
 
-            resp = httpx.post(self.webhook_url, json=payload, timeout=10)
-            if resp.status_code != 200:
-                self.log(f"飞书通知发送失败: {resp.text}", "WARNING")
-                
-        except Exception as e:
-            self.log(f"飞书通知发送异常: {e}", "WARNING")
+        self._after_order("飞书通知", self._post_webhook, payload)
+
+    def _post_webhook(self, payload):
+        resp = httpx.post(self.webhook_url, json=payload, timeout=10)
+        if resp.status_code != 200:
+            raise RuntimeError(f"飞书通知发送失败: {resp.text}")
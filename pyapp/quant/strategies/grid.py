@@ -1,16 +1,15 @@
 # -*- coding: utf-8 -*-
-import time
 import threading
 import json
-import httpx
-import math
 import datetime
 from ..base import BaseStrategy
+from ..grid_state import GridParams, GridState, BUY, SELL, STOP_PROFIT, STOP_LOSS
+from ..backend_reporter import get_backend_reporter
 
 class GridStrategy(BaseStrategy):
     def __init__(self, data, log_callback=None):
         super().__init__(data, log_callback)
-        self.log_layer_base = 0.01 # Default
+        self.grid_state = None # 网格状态机（区间、层级价格表与运行状态），run 中初始化
         
         # 缓存滑点配置
         self.slippage_config = {
@@ -39,14 +38,9 @@ class GridStrategy(BaseStrategy):
             stock_info = {}
         self.stock_info = stock_info
         
-        layer_percent = float(config.get('layerPercent', 1.0)) / 100.0
-        if layer_percent > 0:
-            self.log_layer_base = math.log(1 + layer_percent)
-        else:
-            self.log_layer_base = 0.01
-
         # 高级设置
         self.ignore_trading_time = bool(config.get('ignoreTradingTime', False))
+        self.monitor_interval = int(config.get('monitorInterval', 10))
         self.enable_real_trade = bool(config.get('enableRealTrade', True))
 
         # 缓存滑点配置
@@ -88,32 +82,15 @@ class GridStrategy(BaseStrategy):
             self.trader.init_data_source('easyquotation', 'sina')
 
         # 3. 策略参数提取
-        # 基础策略参数
-        trade_layers = int(config.get('tradeLayers', 0))
-        layer_percent = float(config.get('layerPercent', 1.0)) / 100.0
-        base_quantity = int(config.get('baseQuantity', 100))
-        monitor_interval = int(config.get('monitorInterval', 10))
-        trade_direction = int(config.get('tradeDirection', 0)) # 0:双向 1:只买 2:只卖
-        
-        max_resets = int(config.get('maxResets', 0))
-        reset_ratio = float(config.get('resetRatio', 0))
-        reset_count = 0
-        last_layer_index = 0
-        
-        # 运行时状态记录
-        last_trade_time = 0      # 上次交易时间戳
-        last_trade_price = 0     # 上次交易价格
-        layer_repeat_counts = {}  # 各层级已交易次数 {index: count}
-        
-        # 回落标志/峰值记录
-        waiting_for_fallback = False
-        peak_price = 0.0
-        fallback_monitor_start_layer_index = 0
+        # 网格决策参数（层级、区间、重置、回落/反弹、交易保护、止盈止损）由 GridState 使用
+        params = GridParams(config)
 
-        # 反弹标志/谷值记录
-        waiting_for_rebound = False
-        valley_price = 0.0
-        rebound_monitor_start_layer_index = 0
+        # 基础策略参数
+        trade_layers = params.trade_layers
+        layer_percent = params.layer_percent
+        base_quantity = params.base_quantity
+        monitor_interval = self.monitor_interval
+        trade_direction = params.trade_direction
 
         # 基准价参数
         base_price_type = int(config.get('basePriceType', 0)) # 0:无/默认 1:指定 2:当前 3:开盘 4:昨收
@@ -122,7 +99,7 @@ class GridStrategy(BaseStrategy):
         reset_base_price_daily = bool(config.get('resetBasePriceDaily', False))
         
         # 交易量参数
-        trade_quantity_type = int(config.get('tradeQuantityType', 1)) # 1:固定 2:倍数
+        trade_quantity_type = params.trade_quantity_type
         auto_align = bool(config.get('autoAlign', False))
         auto_open_position = bool(config.get('autoOpenPosition', False))
         open_position_type = int(config.get('openPositionType', 0))
@@ -130,50 +107,11 @@ class GridStrategy(BaseStrategy):
         open_position_amount = float(config.get('openPositionAmount', 10000))
         open_position_ratio = float(config.get('openPositionRatio', 10))
         
-        fallback_ratio = float(config.get('fallbackRatio', 0)) / 100.0
-        rebound_ratio = float(config.get('reboundRatio', 0)) / 100.0
-        
-        # 交易保护参数
-        max_repeat_times = int(config.get('maxRepeatTimes', 0))
-        min_price_gap = float(config.get('minPriceGap', 0.1)) / 100.0
-        min_trade_interval = int(config.get('minTradeInterval', 5))
-        
-        # 滑点参数
-        slippage_ratio = float(config.get('slippageRatio', 0)) / 100.0
-        slippage_mode = int(config.get('slippageMode', 1))  # 1:固定 2:动态
-        
-        # 交易模式：全区间 vs 分治
-        # deploymentMode: FULL_RANGE(默认) - 全区间策略，任意位置均可买卖
-        #                 PARTITIONED - 分治模式，基准线之上只卖不买，基准线之下只买不卖
-        deployment_mode = config.get('deploymentMode', 'FULL_RANGE')
-        include_base_layer = bool(config.get('includeBaseLayer', True))
-        # self.log(f"任务({id})策略模式: {deployment_mode}")
-        
-        # 更新 Grid Type (确保与 run 中获取的 config 一致)
-        self.zeroLayerMode = int(config.get('zeroLayerMode', 1))
-
-        # 价格区间
-        price_range_mode = int(config.get('priceRangeMode', 1)) # 1:比例 2:价格
-        upper_ratio = float(config.get('upperRatio', 0))
-        lower_ratio = float(config.get('lowerRatio', 0))
-        upper_price = float(config.get('upperPrice', 0))
-        lower_price = float(config.get('lowerPrice', 0))
-        
         # 持仓限制
         max_hold_type = int(config.get('maxHoldType', -2)) # -2:未定义(旧逻辑) -1:不限 0:任意 1:量 2:额 3:比例
         max_hold_quantity = int(config.get('maxHoldQuantity', 10000))
         max_hold_amount = float(config.get('maxHoldAmount', 0))
         max_hold_ratio = float(config.get('maxHoldRatio', 0))
-        
-        # 止盈
-        tp_type = int(config.get('takeProfitType', -1)) # -1:不限 0:任意 1:比例 2:价格
-        tp_ratio = float(config.get('takeProfitRatio', 0))
-        tp_price = float(config.get('takeProfitPrice', 0))
-        
-        # 止损
-        sl_type = int(config.get('stopLossType', -1)) # -1:不限 0:任意 1:比例 2:价格
-        sl_ratio = float(config.get('stopLossRatio', 0))
-        sl_price = float(config.get('stopLossPrice', 0))
 
         def resolve_base_price(quote_data, fallback_price):
             current = quote_data.get('price', fallback_price)
@@ -204,7 +142,7 @@ class GridStrategy(BaseStrategy):
         # 等待交易时间
         is_waiting_start = False
         while self.running and not self._is_trading_time():
-            if self.expiration_time and datetime.datetime.now() > self.expiration_time:
+            if self.expiration_time and self.clock.now() > self.expiration_time:
                 self.log(f"任务({id})有效期已至 ({self.expiration_time})，自动停止任务...", "WARNING")
                 from ..manager import TaskManager
                 TaskManager().stop_task(id)
@@ -214,7 +152,7 @@ class GridStrategy(BaseStrategy):
                 self.log(f"任务({id})：非交易日期或时段（周一到周五：9:25-11:30，13:00-15:00），等待开盘...", "WARNING")
                 is_waiting_start = True
 
-            time.sleep(10)
+            self.clock.sleep(10)
 
         if is_waiting_start and self.running:
             self.log(f"任务({id})：交易时间到达，开始初始化...")
@@ -228,7 +166,7 @@ class GridStrategy(BaseStrategy):
         
         if current_price <= 0:
             # 尝试再次获取
-            time.sleep(1)
+            self.clock.sleep(1)
             quote = self.trader.get_stock_quote(ts_code)
             current_price = quote.get('price', 0)
             if current_price <= 0:
@@ -247,21 +185,14 @@ class GridStrategy(BaseStrategy):
         type_str = base_price_type_map.get(base_price_type, str(base_price_type))
         self.log(f"任务({id})基准价格确定为：{base_price:.3f}，类型: {type_str}")
 
-        # 5. 计算交易层级/范围
-        lower_price, upper_price = self._calculate_price_range(base_price, config)
-        
-        self.log(f"任务({id})配置：标的={ts_code}, 价格范围=[{lower_price:.3f}, {upper_price:.3f}], 层级={trade_layers}, 间隔={layer_percent*100:.2f}%, 基数={base_quantity}(股)")
+        # 5. 计算交易层级/范围，初始化网格状态机（区间、层级价格表、初始层级）
+        state = GridState(params, base_price, current_price, log=self.log, task_id=id)
+        self.grid_state = state
         
-        # 优化：预计算对数常数
-        if layer_percent > 0:
-            self.log_layer_base = math.log(1 + layer_percent)
-        else:
-            self.log_layer_base = 0.01 
+        self.log(f"任务({id})配置：标的={ts_code}, 价格范围=[{state.lower_price:.3f}, {state.upper_price:.3f}], 层级={trade_layers}, 间隔={layer_percent*100:.2f}%, 基数={base_quantity}(股)")
             
         # 初始层级状态
-        last_layer_index = self._get_layer_index(current_price, base_price)
-        if trade_layers > 0:
-            last_layer_index = max(-trade_layers, min(trade_layers, last_layer_index))
+        last_layer_index = state.last_layer_index
         self.log(f"任务({id})初始价格：{current_price}, 索引：{last_layer_index}")
         
         # 启动时自动对齐层级（一次性买卖）
@@ -354,15 +285,12 @@ class GridStrategy(BaseStrategy):
                             self._save_trade_record("buy", trade_result['actual_price'], open_vol, "Auto Open")
                             self._update_task_position(symbol_code)
                             # 重新获取持仓以确保状态同步
-                            time.sleep(1)
+                            self.clock.sleep(1)
                         else:
                             self.log(f"任务({id})自动建仓失败！", "ERROR")
                     else:
                         self.log(f"任务({id})自动建仓失败：资金不足(需{need_cash}, 有{available_balance})", "WARNING")
 
-        # 优化：重用会话
-        self.session = httpx.Client()
-
         # 初始更新持仓
         self._update_task_position(symbol_code)
 
@@ -373,7 +301,7 @@ class GridStrategy(BaseStrategy):
         while self.running:
             try:
                 # 0. 有效期检查
-                if self.expiration_time and datetime.datetime.now() > self.expiration_time:
+                if self.expiration_time and self.clock.now() > self.expiration_time:
                     self.log(f"任务({id})有效期已至 ({self.expiration_time})，自动停止任务...", "WARNING")
                     from ..manager import TaskManager
                     TaskManager().stop_task(id)
@@ -388,7 +316,7 @@ class GridStrategy(BaseStrategy):
                     if not is_paused:
                         self.log(f"任务({id})非交易日期或时段（周一到周五：9:25-11:30，13:00-15:00），等待开盘...", "WARNING")
                         is_paused = True
-                    time.sleep(10)
+                    self.clock.sleep(10)
                     continue
                 
                 # 交易时间
@@ -400,441 +328,145 @@ class GridStrategy(BaseStrategy):
                 quote = self.trader.get_stock_quote(ts_code)
                 current_price = quote.get('price', 0)
                 if current_price <= 0:
-                    time.sleep(monitor_interval)
+                    self._wait_tick(monitor_interval)
                     continue
 
                 # 跨交易日重置逻辑
                 if reset_base_price_daily:
-                    current_date = datetime.datetime.now().date()
+                    current_date = self.clock.now().date()
                     if last_trading_date is None:
                         last_trading_date = current_date
                     elif current_date != last_trading_date:
-                        base_price = resolve_base_price(quote, current_price)
-                        last_layer_index = self._get_layer_index(current_price, base_price)
-                        if trade_layers > 0:
-                            last_layer_index = max(-trade_layers, min(trade_layers, last_layer_index))
-
-                        # 重新计算区间
-                        lower_price, upper_price = self._calculate_price_range(base_price, config)
-
-                        last_trade_time = 0
-                        last_trade_price = 0
-                        layer_repeat_counts = {}
-                        waiting_for_fallback = False
-                        peak_price = 0.0
-                        fallback_monitor_start_layer_index = 0
-                        waiting_for_rebound = False
-                        valley_price = 0.0
-                        rebound_monitor_start_layer_index = 0
+                        state.rebase(resolve_base_price(quote, current_price), current_price)
                         type_str = base_price_type_map.get(base_price_type, str(base_price_type))
                         last_trading_date = current_date
-                        self.log(f"任务({id})跨交易日刷新基准价：{base_price:.3f}，类型: {type_str}，范围：[{lower_price:.3f}, {upper_price:.3f}]")
-
-                # 6. 策略重置检查
-                if max_resets > 0 and reset_count < max_resets and reset_ratio > 0:
-                    if base_price <= 0:
-                        base_price = current_price
-                        time.sleep(monitor_interval)
-                        continue
+                        self.log(f"任务({id})跨交易日刷新基准价：{state.base_price:.3f}，类型: {type_str}，范围：[{state.lower_price:.3f}, {state.upper_price:.3f}]")
 
-                    deviation = (current_price - base_price) / base_price
-                    if abs(deviation) >= reset_ratio / 100.0:
-                        direction_str = "上涨" if deviation > 0 else "下跌"
-                        self.log(f"任务({id})触发{direction_str}重置：价格 {current_price} 偏离基准 {base_price} 达 {abs(deviation)*100:.2f}% (阈值 {reset_ratio}%)，进度 ({reset_count+1}/{max_resets})")
-                        
-                        base_price = current_price
-                        last_layer_index = 0 # current_price is new base
-                        
-                        # 重置运行状态
-                        last_trade_time = 0
-                        last_trade_price = 0
-                        layer_repeat_counts = {}
-                        waiting_for_fallback = False
-                        peak_price = 0.0
-                        fallback_monitor_start_layer_index = 0
-                        waiting_for_rebound = False
-                        valley_price = 0.0
-                        rebound_monitor_start_layer_index = 0
-                        
-                        # 重新计算区间
-                        lower_price, upper_price = self._calculate_price_range(base_price, config)
-                        
-                        # 检查新基准价是否在有效范围内
-                        if (upper_price > 0 and base_price > upper_price) or (lower_price > 0 and base_price < lower_price):
-                            self.log(f"警告：重置后的基准价 {base_price} 超出策略范围 [{lower_price}, {upper_price}]，请检查参数设置。", "WARNING")
-
-                        reset_count += 1
-                        self.log(f"任务({id})重置完成，新基准：{base_price:.3f}, 范围：[{lower_price:.3f}, {upper_price:.3f}]")
-                        time.sleep(monitor_interval)
-                        continue
-
-                # 7. 风险控制 (止盈止损)
-                # 止盈检查
-                trigger_tp = False
-                if tp_type == 0: # 任意满足
-                    if (tp_price > 0 and current_price >= tp_price) or \
-                       (tp_ratio > 0 and (current_price - base_price)/base_price >= tp_ratio/100.0):
-                        trigger_tp = True
-                elif tp_type == 1: # 按比例
-                    if tp_ratio > 0 and (current_price - base_price)/base_price >= tp_ratio/100.0:
-                        trigger_tp = True
-                elif tp_type == 2: # 按价格
-                    if tp_price > 0 and current_price >= tp_price:
-                        trigger_tp = True
+                # 6. 策略重置、止盈止损与网格信号判断
+                action = state.on_tick(current_price, self.clock.time())
+                if action is None:
+                    pass
 
-                if trigger_tp:
+                elif action.kind == STOP_PROFIT:
                     self.log(f"任务({id})触发止盈，价格：{current_price}！正在退出...", "WARNING")
                     self._stop_profit_sell(symbol_code, current_price)
                     break
-                
-                # 止损检查
-                trigger_sl = False
-                if sl_type == 0: # 任意满足
-                    if (sl_price > 0 and current_price <= sl_price) or \
-                       (sl_ratio > 0 and (base_price - current_price)/base_price >= sl_ratio/100.0):
-                        trigger_sl = True
-                elif sl_type == 1: # 按比例
-                    if sl_ratio > 0 and (base_price - current_price)/base_price >= sl_ratio/100.0:
-                        trigger_sl = True
-                elif sl_type == 2: # 按价格
-                    if sl_price > 0 and current_price <= sl_price:
-                        trigger_sl = True
 
-                if trigger_sl:
+                elif action.kind == STOP_LOSS:
                     self.log(f"任务({id})触发止损，价格：{current_price}！正在退出...", "WARNING")
                     self._stop_loss_sell(symbol_code, current_price)
                     break
 
-                # 8. 交易逻辑
-                if current_price > upper_price:
-                    # 超过上限，保持观望
-                    pass
-                elif current_price < lower_price:
-                    # 低于下限，保持观望
-                    pass
-                else:
-                    curr_index = self._get_layer_index(current_price, base_price)
-                    if trade_layers > 0:
-                        curr_index = max(-trade_layers, min(trade_layers, curr_index))
+                elif action.kind == SELL:
+                    # 价格上涨 -> 卖出
+                    curr_index, trade_vol = action.index, action.quantity
+                    self.log(f"任务({id})上涨：{current_price} (层级 {action.from_index} -> {curr_index}) -> 卖出 {trade_vol}")
                     
-                    # 交易前置检查函数
-                    def check_trade_safety(action_type, price, index):
-                        nonlocal last_trade_time, last_trade_price, layer_repeat_counts
-                        
-                        # 1. 最小交易间隔检查
-                        if min_trade_interval > 0 and time.time() - last_trade_time < min_trade_interval:
-                            return False, f"未满足最小交易间隔 {min_trade_interval}s"
-                            
-                        # 2. 最小价差检查 (如果是重复交易或震荡)
-                        if last_trade_price > 0:
-                            gap = abs(price - last_trade_price) / last_trade_price
-                            if gap < min_price_gap:
-                                return False, f"未满足最小价差 {min_price_gap*100}% (当前 {gap*100:.2f}%)"
-
-                        # 3. 同层级最大交易次数检查
-                        # max_repeat_times 为 0 时表示不限制
-                        if max_repeat_times > 0:
-                            current_count = layer_repeat_counts.get(index, 0)
-                            if index == last_layer_index and current_count >= max_repeat_times:
-                                return False, f"层级 {index} 交易次数已达上限 {max_repeat_times}"
-                            
-                        return True, ""
-
-                    # 更新交易状态函数
-                    def update_trade_state(price, index):
-                        nonlocal last_trade_time, last_trade_price, layer_repeat_counts, last_layer_index
-                        last_trade_time = time.time()
-                        last_trade_price = price
-                        
-                        # 如果是新层级，重置该层级计数
-                        if index != last_layer_index:
-                            layer_repeat_counts[index] = 1
-                        else:
-                            layer_repeat_counts[index] = layer_repeat_counts.get(index, 0) + 1
-                            
-                        last_layer_index = index
-
-                    # 优化：支持同层级震荡交易（重复买入卖出）
-                    # 只要跨过层级线（index变化）就触发，无需完全穿越
-                    # 或者：允许同层级重复交易且满足价差
-                    is_sell_signal = False
-                    is_buy_signal = False
-                    sell_triggered_by_fallback = False
-
-                    raw_sell_signal = False
-                    raw_buy_signal = False
-                    if curr_index > last_layer_index:
-                        raw_sell_signal = True
-                    elif curr_index < last_layer_index:
-                        raw_buy_signal = True
-                    elif curr_index == last_layer_index and last_trade_price > 0:
-                        if current_price > last_trade_price:
-                            raw_sell_signal = True
-                        elif current_price < last_trade_price:
-                            raw_buy_signal = True
-
-                    buy_allowed = trade_direction in [0, 1] and not (deployment_mode == 'PARTITIONED' and (curr_index > 0 if include_base_layer else curr_index >= 0))
-                    sell_allowed = trade_direction in [0, 2] and not (deployment_mode == 'PARTITIONED' and (curr_index < 0 if include_base_layer else curr_index <= 0))
-
-                    # 1. 回落卖出逻辑
-                    if fallback_ratio > 0 and sell_allowed:
-                        if waiting_for_fallback:
-                            if current_price > peak_price:
-                                peak_price = current_price
-
-                            if current_price <= peak_price * (1 - fallback_ratio):
-                                self.log(f"任务({id})满足回落卖出条件：峰值 {peak_price} -> 当前 {current_price}")
-                                is_sell_signal = True
-                                sell_triggered_by_fallback = True
-                            elif curr_index < fallback_monitor_start_layer_index:
-                                self.log(f"任务({id})价格回落至原层级线({curr_index})，未满足回落比例，取消回落卖出监控。")
-                                waiting_for_fallback = False
-                                peak_price = 0
-                        elif raw_sell_signal:
-                            waiting_for_fallback = True
-                            peak_price = current_price
-                            fallback_monitor_start_layer_index = curr_index
-                            self.log(f"任务({id})触发上涨({curr_index})，进入回落监控... (目标回落 {fallback_ratio*100}%)")
-                    elif sell_allowed:
-                        is_sell_signal = raw_sell_signal
-
-                    # 2. 反弹买入逻辑
-                    buy_triggered_by_rebound = False
-                    if rebound_ratio > 0 and buy_allowed:
-                        if waiting_for_rebound:
-                            if valley_price == 0 or current_price < valley_price:
-                                valley_price = current_price
-                            
-                            if current_price >= valley_price * (1 + rebound_ratio):
-                                self.log(f"任务({id})满足反弹买入条件：谷值 {valley_price} -> 当前 {current_price}")
-                                is_buy_signal = True
-                                buy_triggered_by_rebound = True
-                            elif curr_index > rebound_monitor_start_layer_index:
-                                self.log(f"任务({id})价格反弹至原层级线({curr_index})，未满足反弹比例，取消反弹买入监控。")
-                                waiting_for_rebound = False
-                                valley_price = 0
-                        elif raw_buy_signal:
-                            waiting_for_rebound = True
-                            valley_price = current_price
-                            rebound_monitor_start_layer_index = curr_index
-                            self.log(f"任务({id})触发下跌({curr_index})，进入反弹监控... (目标反弹 {rebound_ratio*100}%)")
-                    elif buy_allowed:
-                        is_buy_signal = raw_buy_signal
-
-                    if is_sell_signal:
-                        # 价格上涨 -> 卖出
-                        
-                        # 分治模式检查：基准线及之下禁止卖出（若包含基准层则Layer<0，否则Layer<=0）
-                        if deployment_mode == 'PARTITIONED' and (curr_index < 0 if include_base_layer else curr_index <= 0):
-                            self.log(f"任务({id})分治模式限制：基准线及之下不执行卖出 (当前 {curr_index})", "DEBUG")
-                            if sell_triggered_by_fallback:
-                                waiting_for_fallback = False
-                                peak_price = 0
-                            if curr_index != last_layer_index:
-                                last_layer_index = curr_index
-                            time.sleep(monitor_interval)
-                            continue
-
-                        if trade_direction not in [0, 2]: # 0:双向 1:只买 2:只卖
-                            # self.log(f"任务({id})触发卖出信号但方向限制，跳过")
-                            if sell_triggered_by_fallback:
-                                waiting_for_fallback = False
-                                peak_price = 0
-                            if curr_index != last_layer_index:
-                                last_layer_index = curr_index
-                            time.sleep(monitor_interval)
-                            continue
-                        
-                        # 安全检查
-                        is_safe, unsafe_reason = check_trade_safety('sell', current_price, curr_index)
-                        if not is_safe:
-                             if sell_triggered_by_fallback:
-                                 self.log(f"任务({id})满足回落卖出条件，但未通过安全检查: {unsafe_reason}", "WARNING")
-                             time.sleep(monitor_interval) # 避免死循环空转
-                             continue
-
-                        # 计算交易量
-                        trade_vol = base_quantity
-                        if trade_quantity_type == 2: # 层级倍数
-                            # 进出平衡逻辑：取绝对值较大的索引作为倍数
-                            # 跌下去买入2倍(curr=-2)，涨回来卖出2倍(last=-2)
-                            idx_val = max(abs(curr_index), abs(last_layer_index))
-                            factor = idx_val if idx_val > 0 else 1
-                            trade_vol = base_quantity * factor
-                        
-                        self.log(f"任务({id})上涨：{current_price} (层级 {last_layer_index} -> {curr_index}) -> 卖出 {trade_vol}")
-                        
-                        # 检查持仓
-                        pos = self.trader.get_position(symbol_code)
-                        available = pos.get('available_quantity', 0)
-                        # 调试信息：打印持仓详情
-                        self.log(f"任务({id})持仓详情: {pos}", "DEBUG")
-                        
-                        if available >= trade_vol:
-                            reason = f"任务: {name}({id})\n原因: 上涨触发"
-                            trade_result = self._safe_sell(symbol_code, current_price, trade_vol, reason=reason)
-                            if trade_result['success']:
-                                self.log(f"任务({id})卖出委托已发送：{trade_result['result']}")
-                                self._save_trade_record("sell", trade_result['actual_price'], trade_vol, f"Grid Sell {curr_index}")
-                                self._update_task_position(symbol_code)
-                                update_trade_state(current_price, curr_index)
-                                if sell_triggered_by_fallback  :
-                                    waiting_for_fallback = False
-                                    peak_price = 0
-                            elif not trade_result['success']:
-                                pass
-                        else:
-                            self.log(f"任务({id})可卖持仓不足。需 {trade_vol}，有 {available}，可能是T+1限制导致无法卖出。", "WARNING")
-                            # 更新状态以防止死循环触发（视为跳过本次交易）
-                            update_trade_state(current_price, curr_index)
-                            if sell_triggered_by_fallback:
-                                waiting_for_fallback = False
-                                peak_price = 0 
+                    # 检查持仓
+                    pos = self.trader.get_position(symbol_code)
+                    available = pos.get('available_quantity', 0)
+                    # 调试信息：打印持仓详情
+                    self.log(f"任务({id})持仓详情: {pos}", "DEBUG")
+                    
+                    if available >= trade_vol:
+                        reason = f"任务: {name}({id})\n原因: 上涨触发"
+                        trade_result = self._safe_sell(symbol_code, current_price, trade_vol, reason=reason)
+                        if trade_result['success']:
+                            self.log(f"任务({id})卖出委托已发送：{trade_result['result']}")
+                            self._save_trade_record("sell", trade_result['actual_price'], trade_vol, f"Grid Sell {curr_index}")
+                            self._update_task_position(symbol_code)
+                            state.on_fill(action, self.clock.time())
+                    else:
+                        self.log(f"任务({id})可卖持仓不足。需 {trade_vol}，有 {available}，可能是T+1限制导致无法卖出。", "WARNING")
+                        # 更新状态以防止死循环触发（视为跳过本次交易）
+                        state.on_fill(action, self.clock.time())
+                         
+                elif action.kind == BUY:
+                    # 价格下跌 -> 买入
+                    curr_index, trade_vol = action.index, action.quantity
+                    self.log(f"任务({id})下跌：{current_price} (层级 {action.from_index} -> {curr_index}) -> 买入 {trade_vol}")
+                    
+                    # 持仓检查 (Max Hold)
+                    pos = self.trader.get_position(symbol_code)
+                    total_pos = pos.get('total_quantity', 0)
+                    
+                    allow_buy = True
+                    
+                    # Max Hold Check
+                    if max_hold_type == -1: # 不限制
+                         pass
+                    elif max_hold_type == 0: # 任意满足
+                         is_limit_reached = False
+                         
+                         # 1. Check Quantity
+                         if max_hold_quantity > 0 and total_pos + trade_vol > max_hold_quantity:
+                             is_limit_reached = True
                              
-                    elif is_buy_signal:
-                        # 价格下跌 -> 买入
-                        
-                        # 分治模式检查：基准线及之上禁止买入（若包含基准层则Layer>0，否则Layer>=0）
-                        if deployment_mode == 'PARTITIONED' and (curr_index > 0 if include_base_layer else curr_index >= 0):
-                            self.log(f"任务({id})分治模式限制：基准线及之上不执行层级买入 (当前 {curr_index})", "DEBUG")
-                            last_layer_index = curr_index
-                            time.sleep(monitor_interval)
-                            continue
-
-                        if trade_direction not in [0, 1]: # 0:双向 1:只买 2:只卖
-                            # self.log(f"任务({id})触发买入信号但方向限制，跳过")
-                            last_layer_index = curr_index
-                            time.sleep(monitor_interval)
-                            continue
-                            
-                        # 安全检查
-                        is_safe, unsafe_reason = check_trade_safety('buy', current_price, curr_index)
-                        if not is_safe:
-                             if buy_triggered_by_rebound:
-                                 self.log(f"任务({id})满足反弹买入条件，但未通过安全检查: {unsafe_reason}", "WARNING")
-                             time.sleep(monitor_interval)
-                             continue
-
-                        # 计算交易量
-                        trade_vol = base_quantity
-                        if trade_quantity_type == 2:
-                            # 进出平衡逻辑
-                            idx_val = max(abs(curr_index), abs(last_layer_index))
-                            factor = idx_val if idx_val > 0 else 1
-                            trade_vol = base_quantity * factor
-
-                        self.log(f"任务({id})下跌：{current_price} (层级 {last_layer_index} -> {curr_index}) -> 买入 {trade_vol}")
-                        
-                        # 持仓检查 (Max Hold)
-                        pos = self.trader.get_position(symbol_code)
-                        total_pos = pos.get('total_quantity', 0)
-                        
-                        allow_buy = True
-                        
-                        # Max Hold Check
-                        if max_hold_type == -1: # 不限制
-                             pass
-                        elif max_hold_type == 0: # 任意满足
-                             is_limit_reached = False
+                         # 2. Check Amount
+                         elif max_hold_amount > 0 and (total_pos + trade_vol) * current_price > max_hold_amount:
+                             is_limit_reached = True
                              
-                             # 1. Check Quantity
-                             if max_hold_quantity > 0 and total_pos + trade_vol > max_hold_quantity:
-                                 is_limit_reached = True
-                                 
-                             # 2. Check Amount
-                             elif max_hold_amount > 0 and (total_pos + trade_vol) * current_price > max_hold_amount:
-                                 is_limit_reached = True
-                                 
-                             # 3. Check Ratio
-                             elif max_hold_ratio > 0:
-                                 balance = self.trader.get_balance()
-                                 total_asset = balance.get('total_asset', 0)
-                                 if total_asset > 0:
-                                     current_hold_value = total_pos * current_price
-                                     new_hold_value = trade_vol * current_price
-                                     total_hold_value = current_hold_value + new_hold_value
-                                     new_ratio = (total_hold_value / total_asset) * 100
-                                     if new_ratio > max_hold_ratio:
-                                         is_limit_reached = True
-
-                             if is_limit_reached:
-                                 allow_buy = False
-                                 self.log(f"任务({id})超过最大持仓限制(任意: 量/额/率)", "WARNING")
-                        elif max_hold_type == 1: # 按量
-                             if max_hold_quantity > 0 and total_pos + trade_vol > max_hold_quantity:
-                                 allow_buy = False
-                                 self.log(f"任务({id})超过最大持仓量 {max_hold_quantity}", "WARNING")
-                        elif max_hold_type == 2: # 按额
-                             if max_hold_amount > 0 and (total_pos + trade_vol) * current_price > max_hold_amount:
-                                 allow_buy = False
-                                 self.log(f"任务({id})超过最大持仓金额 {max_hold_amount}", "WARNING")
-                        elif max_hold_type == 3: # 按比例
-                            if max_hold_ratio > 0:
-                                # 需要获取总资产
-                                balance = self.trader.get_balance()
-                                total_asset = balance.get('total_asset', 0)
-                                if total_asset > 0:
-                                    new_ratio = ((total_pos + trade_vol) * current_price / total_asset) * 100
-                                    if new_ratio > max_hold_ratio:
-                                        allow_buy = False
-                                        self.log(f"任务({id})超过最大持仓比例 {max_hold_ratio}% (当前预测 {new_ratio:.2f}%)", "WARNING")
-                        
-                        if allow_buy:
-                            reason = f"任务: {name}({id})\n原因: 下跌触发"
+                         # 3. Check Ratio
+                         elif max_hold_ratio > 0:
+                             balance = self.trader.get_balance()
+                             total_asset = balance.get('total_asset', 0)
+                             if total_asset > 0:
+                                 current_hold_value = total_pos * current_price
+                                 new_hold_value = trade_vol * current_price
+                                 total_hold_value = current_hold_value + new_hold_value
+                                 new_ratio = (total_hold_value / total_asset) * 100
+                                 if new_ratio > max_hold_ratio:
+                                     is_limit_reached = True
+
+                         if is_limit_reached:
+                             allow_buy = False
+                             self.log(f"任务({id})超过最大持仓限制(任意: 量/额/率)", "WARNING")
+                    elif max_hold_type == 1: # 按量
+                         if max_hold_quantity > 0 and total_pos + trade_vol > max_hold_quantity:
+                             allow_buy = False
+                             self.log(f"任务({id})超过最大持仓量 {max_hold_quantity}", "WARNING")
+                    elif max_hold_type == 2: # 按额
+                         if max_hold_amount > 0 and (total_pos + trade_vol) * current_price > max_hold_amount:
+                             allow_buy = False
+                             self.log(f"任务({id})超过最大持仓金额 {max_hold_amount}", "WARNING")
+                    elif max_hold_type == 3: # 按比例
+                        if max_hold_ratio > 0:
+                            # 需要获取总资产
                             balance = self.trader.get_balance()
-                            available_balance = balance.get('available_balance', 0)
-                            need_cash = trade_vol * current_price
-
-                            if self.enable_real_trade and available_balance < need_cash:
-                                self.log(f"任务({id})资金不足，跳过买入。需 {need_cash:.2f}，有 {available_balance:.2f}", "WARNING")
-                                # 更新状态以防止死循环触发（视为跳过本次交易）
-                                update_trade_state(current_price, curr_index)
-                                if buy_triggered_by_rebound:
-                                    waiting_for_rebound = False
-                                    valley_price = 0
-                            else:
-                                trade_result = self._safe_buy(symbol_code, current_price, trade_vol, reason=reason)
-                                if trade_result['success']:
-                                    self.log(f"任务({id})买入委托已发送：{trade_result['result']}")
-                                    self._save_trade_record("buy", trade_result['actual_price'], trade_vol, f"Grid Buy {curr_index}")
-                                    self._update_task_position(symbol_code)
-                                    update_trade_state(current_price, curr_index)
-                                    if buy_triggered_by_rebound:
-                                        waiting_for_rebound = False
-                                        valley_price = 0
+                            total_asset = balance.get('total_asset', 0)
+                            if total_asset > 0:
+                                new_ratio = ((total_pos + trade_vol) * current_price / total_asset) * 100
+                                if new_ratio > max_hold_ratio:
+                                    allow_buy = False
+                                    self.log(f"任务({id})超过最大持仓比例 {max_hold_ratio}% (当前预测 {new_ratio:.2f}%)", "WARNING")
+                    
+                    if allow_buy:
+                        reason = f"任务: {name}({id})\n原因: 下跌触发"
+                        balance = self.trader.get_balance()
+                        available_balance = balance.get('available_balance', 0)
+                        need_cash = trade_vol * current_price
+
+                        if self.enable_real_trade and available_balance < need_cash:
+                            self.log(f"任务({id})资金不足，跳过买入。需 {need_cash:.2f}，有 {available_balance:.2f}", "WARNING")
+                            # 更新状态以防止死循环触发（视为跳过本次交易）
+                            state.on_fill(action, self.clock.time())
                         else:
-                            if buy_triggered_by_rebound:
-                                waiting_for_rebound = False
-                                valley_price = 0
-                            last_layer_index = curr_index
+                            trade_result = self._safe_buy(symbol_code, current_price, trade_vol, reason=reason)
+                            if trade_result['success']:
+                                self.log(f"任务({id})买入委托已发送：{trade_result['result']}")
+                                self._save_trade_record("buy", trade_result['actual_price'], trade_vol, f"Grid Buy {curr_index}")
+                                self._update_task_position(symbol_code)
+                                state.on_fill(action, self.clock.time())
+                    else:
+                        state.on_reject(action)
             
             except Exception as e:
                 self.log(f"任务({id})循环错误：{e}", "ERROR")
                 import traceback
                 traceback.print_exc()
             
-            time.sleep(monitor_interval)
-
-    def _get_layer_index(self, price, base_price):
-        """计算层级索引"""
-        if price <= 0 or base_price <= 0 or self.log_layer_base == 0: return 0
-        
-        raw_float = math.log(price / base_price) / self.log_layer_base
-
-        if self.zeroLayerMode == 1: # 双倍宽(Base±P)
-            raw_int = int(math.floor(raw_float))
-            if raw_int == -1:
-                return 0
-            elif raw_int < -1:
-                return raw_int + 1
-            else:
-                return raw_int
-
-        elif self.zeroLayerMode == 2: # 中心对称(Base±P/2)
-            return int(math.floor(raw_float + 0.5))
-            
-        else: # self.zeroLayerMode == 3: # 标准单边(Base~Base+P)
-            return int(math.floor(raw_float))
+            # 等待下一次价格变化（已订阅行情中心时），最长等待 monitor_interval
+            self._wait_tick(monitor_interval)
 
     def _calculate_dynamic_slippage(self, symbol_code, base_slippage):
         """
@@ -895,55 +527,6 @@ class GridStrategy(BaseStrategy):
         return base_slippage
 
 
-    def _calculate_price_range(self, base_price, config):
-        """
-        计算价格区间（包含上下限）
-        返回: (lower_price, upper_price)
-        """
-        price_range_mode = int(config.get('priceRangeMode', 1))
-        
-        upper_price = 0.0
-        lower_price = 0.0
-        
-        # 1. 计算原始区间
-        if price_range_mode == 1: # 比例模式
-            upper_ratio = float(config.get('upperRatio', 0))
-            lower_ratio = float(config.get('lowerRatio', 0))
-                
-            if upper_ratio != 0:
-                upper_price = base_price * (1 + upper_ratio / 100.0)
-            if lower_ratio != 0:
-                lower_price = base_price * (1 + lower_ratio / 100.0)
-                
-        else: # 价格模式
-            upper_price = float(config.get('upperPrice', 0))
-            lower_price = float(config.get('lowerPrice', 0))
-            
-        # 2. 兜底逻辑
-        trade_layers = int(config.get('tradeLayers', 0))
-        layer_percent = float(config.get('layerPercent', 1.0)) / 100.0
-        
-        # 如果计算出的上限无效（<=0），使用默认策略计算
-        if upper_price <= 0:
-            if trade_layers > 0 and layer_percent > 0:
-                upper_price = base_price * math.pow(1 + layer_percent, trade_layers)
-            else:
-                upper_price = base_price * 1.2
-                
-        # 如果计算出的下限无效（<=0），使用默认策略计算
-        if lower_price <= 0:
-            if trade_layers > 0 and layer_percent > 0:
-                lower_price = base_price * math.pow(1 + layer_percent, -trade_layers)
-            else:
-                lower_price = base_price * 0.8
-                
-        # 3. 最终校验与修正
-        if lower_price > upper_price:
-            self.log(f"警告：计算出的下限({lower_price:.3f})高于上限({upper_price:.3f})，自动交换。", "WARNING")
-            lower_price, upper_price = upper_price, lower_price
-            
-        return lower_price, upper_price
-
     def _stop_profit_sell(self, symbol_code, price):
         pos = self.trader.get_position(symbol_code)
         avail = pos.get('available_quantity', 0)
@@ -1051,17 +634,20 @@ class GridStrategy(BaseStrategy):
         return {"success": bool(result), "actual_price": actual_price, "result": result}
 
     def _update_task_position(self, symbol_code):
-        try:
-            position = self.trader.get_position(symbol_code)
-            
-            data = {
-                "id": self.data.get('id'),
-                "positions": [position], 
-            }
-            
-            self._update_trade_task(data)
-        except Exception as e:
-            self.log(f"更新持仓数据失败: {e}", "WARNING")
+        """
+        刷新持仓并同步到交易任务（后台执行，不阻塞行情处理）
+        """
+        self._after_order("更新持仓数据", self._refresh_task_position, symbol_code)
+
+    def _refresh_task_position(self, symbol_code):
+        position = self.trader.get_position(symbol_code)
+        
+        data = {
+            "id": self.data.get('id'),
+            "positions": [position], 
+        }
+        
+        self._update_trade_task(data)
 
     def _update_trade_task(self, data):
         backend_url = self.data.get('backend_url')
@@ -1070,38 +656,22 @@ class GridStrategy(BaseStrategy):
         if not backend_url or not token:
             return
 
-        if backend_url.endswith('/'):
-            backend_url = backend_url[:-1]
-            
-        url = f"{backend_url}/quant/tradeTask/updateTradeTask"
-        
-        headers = {
-            "x-token": token,
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            if hasattr(self, 'session'):
-                self.session.put(url, json=data, headers=headers, timeout=5)
-            else:
-                httpx.put(url, json=data, headers=headers, timeout=5)
-            
-            # 通知前端刷新交易任务
-            self.log("TRADE_TASK_UPDATE_TRIGGER")
-        except Exception as e:
-            pass
+        # 由上报服务合并同一任务的持仓更新并批量发送
+        get_backend_reporter(backend_url).update_trade_task(
+            token, data, on_sent=lambda: self.log("TRADE_TASK_UPDATE_TRIGGER"), # 通知前端刷新交易任务
+            log=self.log
+        )
 
     def _save_trade_record(self, action, price, quantity, reason="grid_trade"):
+        """
+        上报成交记录：成交时间在调用时确定，由上报服务发送，后端不可用时暂存补发
+        """
         backend_url = self.data.get('backend_url')
         token = self.data.get('token')
         
         if not backend_url or not token:
             return
 
-        if backend_url.endswith('/'):
-            backend_url = backend_url[:-1]
-            
-        url = f"{backend_url}/quant/tradeRecord/createTradeRecord"
         account = self.data.get('account', {})
 
         data = {
@@ -1115,29 +685,18 @@ class GridStrategy(BaseStrategy):
             "amount": float(price) * float(quantity),
             "action": action, 
             "reason": reason,
-            "traded_at": time.strftime('%Y-%m-%dT%H:%M:%S+08:00'),
-        }
-        
-        headers = {
-            "x-token": token,
-            "Content-Type": "application/json"
+            "traded_at": self.clock.now().strftime('%Y-%m-%dT%H:%M:%S+08:00'),
         }
         
-        try:
-            if hasattr(self, 'session'):
-                self.session.post(url, json=data, headers=headers, timeout=5)
-            else:
-                httpx.post(url, json=data, headers=headers, timeout=5)
-            
-            # 通知前端刷新交易记录
-            self.log("TRADE_RECORD_UPDATE_TRIGGER")
-        except Exception as e:
-            pass
+        get_backend_reporter(backend_url).create_trade_record(
+            token, data, on_sent=lambda: self.log("TRADE_RECORD_UPDATE_TRIGGER"), # 通知前端刷新交易记录
+            log=self.log
+        )
 
     def _is_trading_time(self):
         if getattr(self, 'ignore_trading_time', False):
             return True
-        now = datetime.datetime.now()
+        now = self.clock.now()
 
         if now.weekday() > 4:
             return False
@@ -4,6 +4,8 @@ import json
 import httpx
 from datetime import datetime
 from ..base import BaseStrategy
+from ..keyword_matcher import KeywordMatcher
+from ..news_feed import fetch_news_since
 
 class NewsStrategy(BaseStrategy):
     def __init__(self, data, log_callback=None):
@@ -28,6 +30,8 @@ class NewsStrategy(BaseStrategy):
         self.target_keywords = config.get('targetKeywords', [])
         self.trigger_keywords = config.get('triggerKeywords', [])
         self.excluded_keywords = config.get('excludedKeywords', [])
+        # 三类关键词编译为一个自动机，一次扫描完成过滤；关键词相同的任务共享
+        self.keyword_matcher = KeywordMatcher.compile(self.target_keywords, self.trigger_keywords, self.excluded_keywords)
        
         # News Source Config
         self.monitor_interval = max(1, min(3600, int(config.get('monitorInterval', 60))))  # 限制在1-3600范围内
@@ -49,34 +53,49 @@ class NewsStrategy(BaseStrategy):
         name = self.data.get('name', 'Unknown')
         self.log(f"任务({id})：初始化已完成。")
         
-        self.last_news_id = self.fetch_latest_news_id()
+        # 优先接入共享快讯中心（同一后端的任务共用一次轮询），不可用时独立轮询
+        subscription = self.news_feed.subscribe(self.backend_url, self.token, self.monitor_interval) if self.news_feed else None
+        if not subscription:
+            self.last_news_id = self.fetch_latest_news_id()
         self.log(f"任务({id})：策略启动完成，开始监控快讯...")
 
-        while self.running:
-            try:
-                # 1. 获取快讯快报
-                news_list = self.fetch_news(self.last_news_id)
-                
-                for news in news_list:
-                    self.last_news_id = max(self.last_news_id, news.get('id', 0))
-                    content = news.get('content', '')
+        try:
+            while self.running:
+                try:
+                    # 1. 获取快讯快报
+                    news_list = subscription.drain() if subscription else self.fetch_news(self.last_news_id)
+                    lag_warning = subscription.lag_report(self.monitor_interval) if subscription else None
+                    if lag_warning:
+                        self.log(f"任务({id})：{lag_warning}", "WARNING")
                     
-                    # 2. 关键词过滤
-                    if self.contains_keywords(content):
-                        news_time = self._format_news_time(news)
-                        full_content = f"{news_time} - {content}"
+                    for news in news_list:
+                        self.last_news_id = max(self.last_news_id, news.get('id', 0))
+                        content = news.get('content', '')
                         
-                        if self.enableLog:
-                            self.log(f"快讯：{content[:50]}...")
-                            
-                        # 3. 推送消息
-                        self.send_notifications(full_content)
+                        # 2. 关键词过滤
+                        if self.contains_keywords(content):
+                            news_time = self._format_news_time(news)
+                            full_content = f"{news_time} - {content}"
                             
-                time.sleep(self.monitor_interval)
-                
-            except Exception as e:
-                self.log(f"策略运行异常：{e}", "ERROR")
-                time.sleep(10)
+                            if self.enableLog:
+                                self.log(f"快讯：{content[:50]}...")
+                                
+                            # 3. 推送消息
+                            self.send_notifications(full_content)
+                    
+                    if subscription:
+                        # 快讯中心推送新快讯时立即处理，每秒检查一次停止信号
+                        while self.running and not subscription.wait(1.0):
+                            pass
+                    else:
+                        time.sleep(self.monitor_interval)
+                    
+                except Exception as e:
+                    self.log(f"策略运行异常：{e}", "ERROR")
+                    time.sleep(10)
+        finally:
+            if subscription:
+                subscription.close()
 
     def _format_news_time(self, news):
         """格式化快讯时间"""
@@ -148,27 +167,16 @@ class NewsStrategy(BaseStrategy):
 
     def fetch_news(self, last_id):
         """
-        获取大于last_id的快讯数据，带重试机制
+        获取大于last_id的全部快讯（按ID升序），带重试机制
+        以batch_size为页大小向前翻页直到覆盖last_id，快讯爆发时不遗漏
         """
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                params = {'pageSize': self.batch_size, 'last_id': last_id}
-                headers = {
-                    'x-token': self.token,
-                    'Content-Type': 'application/json'
-                }
-                url = f'{self.backend_url}/quant/news/getNewsList'
-                resp = httpx.get(url, params=params, headers=headers, timeout=10)
-
-                if resp.status_code == 200:
-                    data = resp.json()
-                    # 简化数据解析逻辑
-                    news_list = data.get('data', {}).get('list', [])
-                    return news_list
-                else:
-                    self.log(f"获取快讯失败({attempt+1}/{max_retries}): {resp.status_code}", "WARNING")
-                    
+                news_list, complete = fetch_news_since(self.backend_url, self.token, last_id, page_size=self.batch_size)
+                if not complete and news_list:
+                    self.log(f"快讯翻页未覆盖到last_id={last_id}，期间快讯可能缺失", "WARNING")
+                return news_list
             except Exception as e:
                 self.log(f"获取快讯异常({attempt+1}/{max_retries}): {e}", "WARNING")
             
@@ -179,26 +187,12 @@ class NewsStrategy(BaseStrategy):
         return []
 
     def contains_keywords(self, content):
-        # 如果都没有配置，直接返回False（避免无过滤全通过）
-        if not self.target_keywords and not self.trigger_keywords:
-            return False
-
-        # 转为小写进行匹配，忽略大小写差异
-        content_lower = content.lower()
-
-        # 0. 检查排除关键词 (如果有配置，必须都不包含)
-        if self.excluded_keywords and any(k.lower() in content_lower for k in self.excluded_keywords):
-            return False
-
-        # 1. 检查标的关键词 (如果配置了，必须满足其一)
-        if self.target_keywords and not any(k.lower() in content_lower for k in self.target_keywords):
-            return False
-
-        # 2. 检查触发关键词 (如果配置了，必须满足其一)
-        if self.trigger_keywords and not any(k.lower() in content_lower for k in self.trigger_keywords):
-            return False
-
-        return True
+        # 如果都没有配置，返回False（避免无过滤全通过）
+        # 0. 命中任一排除关键词时返回False
+        # 1. 配置了标的关键词时必须满足其一
+        # 2. 配置了触发关键词时必须满足其一
+        # 均忽略大小写，由预编译的自动机一次扫描完成
+        return self.keyword_matcher.contains(content)
 
     def send_notifications(self, content):
         """
@@ -6,12 +6,13 @@
 2. 死叉卖出：短期均线下穿长期均线时卖出
 3. 止损止盈：支持设置止损和止盈比例
 """
-import time
 import json
 import datetime
-import httpx
 from typing import Optional, Dict, List, Tuple
 from ..base import BaseStrategy
+from ..kline_cache import kline_cache
+from ..indicators import SMA, MACD
+from ..backend_reporter import get_backend_reporter
 
 
 class TrendStrategy(BaseStrategy):
@@ -21,6 +22,7 @@ class TrendStrategy(BaseStrategy):
         super().__init__(data, log_callback)
         self._init_config()
         self._init_position_state()
+        self._init_indicators()
         
     def _init_config(self):
         """初始化策略配置参数"""
@@ -176,6 +178,35 @@ class TrendStrategy(BaseStrategy):
         self.stock_code = None
         self.sina_symbol = None
         
+    def _init_indicators(self):
+        """初始化流式指标，K线同步后按新K线追加/最新K线原地更新"""
+        self.sma_short = SMA(self.ma_short_period)
+        self.sma_long = SMA(self.ma_long_period)
+        self.macd = MACD(self.macd_fast_period, self.macd_slow_period, self.macd_signal_period)
+        self._indicator_bar_day = None
+
+    def _sync_indicators(self, bars: List[dict]):
+        """
+        将K线同步到流式指标
+        - 最新K线未变：原地更新其收盘价
+        - 出现新K线：先用上一根的最终收盘价修正，再追加新K线
+        - 其他情况（首次运行或历史变化）：批量预热
+        """
+        closes = [bar['close'] for bar in bars]
+        last_day = bars[-1]['day']
+        indicators = (self.sma_short, self.sma_long, self.macd)
+        if self._indicator_bar_day == last_day:
+            for indicator in indicators:
+                indicator.update(closes[-1], new_bar=False)
+        elif len(bars) >= 2 and self._indicator_bar_day == bars[-2]['day']:
+            for indicator in indicators:
+                indicator.update(closes[-2], new_bar=False)
+                indicator.update(closes[-1], new_bar=True)
+        else:
+            for indicator in indicators:
+                indicator.warm_up(closes)
+        self._indicator_bar_day = last_day
+
     def _parse_stock_info(self) -> Tuple[Optional[str], Optional[str]]:
         """
         解析股票信息
@@ -194,98 +225,6 @@ class TrendStrategy(BaseStrategy):
             
         return ts_code, sina_symbol
     
-    def fetch_kline(self, symbol: str, scale: int = 240, datalen: int = 100) -> List[float]:
-        """
-        从新浪财经API获取K线数据
-        
-        参数:
-            symbol: 股票代码，如 sh600519
-            scale: K线周期 (5, 15, 30, 60, 240=日线, 1200=周线, 7200=月线)
-            datalen: 数据点数量
-            
-        返回:
-            收盘价列表
-        """
-        try:
-            url = (
-                f"http://money.finance.sina.com.cn/quotes_service/api/"
-                f"json_v2.php/CN_MarketData.getKLineData"
-                f"?symbol={symbol}&scale={scale}&ma=no&datalen={datalen}"
-            )
-            
-            resp = httpx.get(url, timeout=10)
-            resp.raise_for_status()
-            
-            data = resp.json()
-            if not data:
-                self.log(f"K线数据为空", "WARNING")
-                return []
-                
-            closes = [float(item['close']) for item in data]
-            return closes
-            
-        except httpx.RequestError as e:
-            self.log(f"获取K线数据失败: {e}", "ERROR")
-            return []
-        except (KeyError, ValueError, TypeError) as e:
-            self.log(f"解析K线数据失败: {e}", "ERROR")
-            return []
-    
-    def calculate_ma(self, data: List[float], period: int) -> Optional[float]:
-        """
-        计算简单移动平均线
-        
-        参数:
-            data: 价格数据列表
-            period: 窗口大小
-            
-        返回:
-            均线值，数据不足时返回None
-        """
-        if len(data) < period:
-            return None
-        return sum(data[-period:]) / period
-    
-    def calculate_ema_series(self, data: List[float], period: int) -> List[float]:
-        """
-        计算指数移动平均线序列
-        """
-        if len(data) < period:
-            return []
-        k = 2 / (period + 1)
-        ema = sum(data[:period]) / period
-        series = [ema]
-        for price in data[period:]:
-            ema = price * k + ema * (1 - k)
-            series.append(ema)
-        return series
-    
-    def calculate_macd(
-        self, 
-        data: List[float], 
-        fast_period: int, 
-        slow_period: int, 
-        signal_period: int
-    ) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]:
-        short_series = self.calculate_ema_series(data, fast_period)
-        long_series = self.calculate_ema_series(data, slow_period)
-        if not short_series or not long_series:
-            return None, None, None, None
-        
-        min_len = min(len(short_series), len(long_series))
-        short_series = short_series[-min_len:]
-        long_series = long_series[-min_len:]
-        diff_series = [s - l for s, l in zip(short_series, long_series)]
-        dea_series = self.calculate_ema_series(diff_series, signal_period)
-        if not dea_series:
-            return None, None, None, None
-        
-        diff = diff_series[-1]
-        prev_diff = diff_series[-2] if len(diff_series) >= 2 else None
-        dea = dea_series[-1]
-        prev_dea = dea_series[-2] if len(dea_series) >= 2 else None
-        return diff, dea, prev_diff, prev_dea
-    
     def _get_position(self) -> Optional[Dict]:
         """
         获取持仓信息
@@ -315,17 +254,19 @@ class TrendStrategy(BaseStrategy):
             current_price: 当前价格
         """
         # API 延迟保护：如果刚买入（30秒内），且 API 未返回持仓，暂时信任本地状态
-        if self.holding and self.entry_time and (time.time() - self.entry_time < 30):
-            if not position or float(position.get('volume', 0)) <= 0:
+        # 持仓数量兼容 QuantTrader 标准化字段(total_quantity)与旧字段(volume)
+        volume = float(position.get('total_quantity', position.get('volume', 0)) or 0) if position else 0
+        if self.holding and self.entry_time and (self.clock.time() - self.entry_time < 30):
+            if volume <= 0:
                 self.log("API未同步持仓，保持本地持仓状态", "INFO")
                 return
 
-        if position and float(position.get('volume', 0)) > 0:
+        if volume > 0:
             self.holding = True
             # 首次持仓时记录入场价格
             if self.entry_price == 0:
-                self.entry_price = float(position.get('price', current_price))
-                self.entry_time = time.time()
+                self.entry_price = float(position.get('cost_price', position.get('price', 0)) or current_price)
+                self.entry_time = self.clock.time()
                 self.log(f"检测到持仓，入场价: {self.entry_price:.2f}")
         else:
             self.holding = False
@@ -421,12 +362,14 @@ class TrendStrategy(BaseStrategy):
         
         if self.connect_trader and self.enable_real_trade:
             try:
-                self.trader.buy(self.stock_code, price=price, amount=quantity)
+                if not self.trader.buy(self.stock_code.split('.')[0], price, quantity, reason="金叉"):
+                    self.log("买入委托未成功", "ERROR")
+                    return
                 # 只有交易成功后才更新状态
                 self.holding = True
                 self.entry_price = price
-                self.entry_time = time.time()
-                self.last_trade_time = time.time()
+                self.entry_time = self.clock.time()
+                self.last_trade_time = self.clock.time()
                 self.log(f"买入成功", "INFO")
                 self._save_trade_record("buy", price, quantity, "金叉")
             except Exception as e:
@@ -439,8 +382,8 @@ class TrendStrategy(BaseStrategy):
             self.log(f"[{mode}] 执行虚拟买入", "INFO")
             self.holding = True
             self.entry_price = price
-            self.entry_time = time.time()
-            self.last_trade_time = time.time()
+            self.entry_time = self.clock.time()
+            self.last_trade_time = self.clock.time()
             self._save_trade_record("buy", price, quantity, "金叉")
     
     def _execute_sell(self, price: float, quantity: int, reason: str):
@@ -453,12 +396,14 @@ class TrendStrategy(BaseStrategy):
         
         if self.connect_trader and self.enable_real_trade:
             try:
-                self.trader.sell(self.stock_code, price=price, amount=quantity)
+                if not self.trader.sell(self.stock_code.split('.')[0], price, quantity, reason=reason):
+                    self.log("卖出委托未成功", "ERROR")
+                    return
                 # 只有交易成功后才更新状态
                 self.holding = False
                 self.entry_price = 0.0
                 self.entry_time = None
-                self.last_trade_time = time.time()
+                self.last_trade_time = self.clock.time()
                 self.log(f"卖出成功", "INFO")
                 self._save_trade_record("sell", price, quantity, reason)
             except Exception as e:
@@ -472,7 +417,7 @@ class TrendStrategy(BaseStrategy):
             self.holding = False
             self.entry_price = 0.0
             self.entry_time = None
-            self.last_trade_time = time.time()
+            self.last_trade_time = self.clock.time()
             self._save_trade_record("sell", price, quantity, reason)
 
     def _save_trade_record(self, action, price, quantity, reason="trend_trade"):
@@ -482,10 +427,6 @@ class TrendStrategy(BaseStrategy):
         if not backend_url or not token:
             return
 
-        if backend_url.endswith('/'):
-            backend_url = backend_url[:-1]
-            
-        url = f"{backend_url}/quant/tradeRecord/createTradeRecord"
         account = self.data.get('account', {})
 
         data = {
@@ -499,26 +440,20 @@ class TrendStrategy(BaseStrategy):
             "amount": float(price) * float(quantity),
             "action": action, 
             "reason": reason,
-            "traded_at": time.strftime('%Y-%m-%dT%H:%M:%S+08:00'),
+            "traded_at": self.clock.now().strftime('%Y-%m-%dT%H:%M:%S+08:00'),
         }
         
-        headers = {
-            "x-token": token,
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            httpx.post(url, json=data, headers=headers, timeout=5)
-            self.log("TRADE_RECORD_UPDATE_TRIGGER")
-        except Exception:
-            pass
+        # 由上报服务发送，后端不可用时暂存补发
+        get_backend_reporter(backend_url).create_trade_record(
+            token, data, on_sent=lambda: self.log("TRADE_RECORD_UPDATE_TRIGGER"), log=self.log
+        )
     
     def _is_trading_time(self) -> bool:
         """判断当前是否为交易时间"""
         if self.ignore_trading_time:
             return True
             
-        now = datetime.datetime.now()
+        now = self.clock.now()
         
         # 周末不交易
         if now.weekday() > 4:
@@ -532,6 +467,151 @@ class TrendStrategy(BaseStrategy):
         
         return (morning_start <= current < morning_end) or (afternoon_start <= current < afternoon_end)
 
+    def _required_bars(self) -> int:
+        """计算信号所需的最少K线数量"""
+        req_ma = self.ma_long_period + 1
+        req_macd = max(self.macd_fast_period, self.macd_slow_period) + self.macd_signal_period + 5
+        
+        if self.signal_type == "MACD":
+            return req_macd
+        elif self.signal_type == "BOTH":
+            return max(req_ma, req_macd)
+        return req_ma
+
+    def _evaluate_signals(self, current_price: float) -> Optional[Tuple[bool, bool]]:
+        """
+        根据已同步的流式指标计算买卖信号
+        
+        返回:
+            (买入信号, 卖出信号)，指标不足时返回None
+        """
+        golden_cross = False
+        death_cross = False
+        
+        # 计算 MA
+        if self.signal_type in ["MA", "BOTH"]:
+            short_ma, prev_short_ma = self.sma_short.value, self.sma_short.prev_value
+            long_ma, prev_long_ma = self.sma_long.value, self.sma_long.prev_value
+            
+            if None in (short_ma, long_ma, prev_short_ma, prev_long_ma):
+                self.log("均线计算失败", "WARNING")
+                return None
+                
+            self.log(
+                f"价格: {current_price:.2f} | "
+                f"MA{self.ma_short_period}: {short_ma:.2f} | "
+                f"MA{self.ma_long_period}: {long_ma:.2f}"
+            )
+            ma_golden, ma_death = self._check_cross_signal(short_ma, long_ma, prev_short_ma, prev_long_ma)
+            
+            if self.signal_type == "MA":
+                golden_cross = ma_golden
+                death_cross = ma_death
+
+        # 计算 MACD
+        if self.signal_type in ["MACD", "BOTH"]:
+            diff, dea = self.macd.diff, self.macd.dea
+            prev_diff, prev_dea = self.macd.prev_diff, self.macd.prev_dea
+            if None in (diff, dea, prev_diff, prev_dea):
+                self.log("MACD计算失败", "WARNING")
+                return None
+                
+            self.log(f"MACD: D={diff:.3f}/A={dea:.3f}")
+            macd_golden, macd_death = self._check_cross_signal(diff, dea, prev_diff, prev_dea)
+            
+            if self.signal_type == "MACD":
+                golden_cross = macd_golden
+                death_cross = macd_death
+        
+        # BOTH 模式的信号逻辑
+        if self.signal_type == "BOTH":
+            # 买入：MA金叉 且 MACD多头，或 MACD金叉 且 MA多头（双重共振）
+            ma_bullish = short_ma > long_ma
+            macd_bullish = diff > dea
+            
+            if (ma_golden and macd_bullish) or (macd_golden and ma_bullish):
+                golden_cross = True
+                self.log("触发双重共振买入信号", "INFO")
+            
+            # 卖出逻辑：根据卖出模式选择
+            if self.sell_mode == "strict":
+                # 严格模式：要求双重确认（MA死叉且MACD空头，或 MACD死叉且MA空头）
+                ma_bearish = short_ma < long_ma
+                macd_bearish = diff < dea
+                if (ma_death and macd_bearish) or (macd_death and ma_bearish):
+                    death_cross = True
+                    self.log("触发双重确认卖出信号(严格模式)", "INFO")
+            else:
+                # 宽松模式：任一死叉即卖出
+                if ma_death or macd_death:
+                    death_cross = True
+                    reason = "MA死叉" if ma_death else "MACD死叉"
+                    self.log(f"触发{reason}卖出信号(宽松模式)", "INFO")
+        
+        return golden_cross, death_cross
+
+    def _step(self, bars: List[dict]) -> bool:
+        """
+        按最新K线执行一轮决策：同步指标、计算信号、同步持仓、执行交易
+        实盘主循环与回测（trend_backtest）共用，回测按K线逐根调用
+        
+        返回:
+            指标不足无法计算信号时返回False
+        """
+        current_price = bars[-1]['close']
+        
+        # 2. 计算技术指标（流式增量更新，保留上一根K线的指标值用于交叉判断）
+        self._sync_indicators(bars)
+        signals = self._evaluate_signals(current_price)
+        if signals is None:
+            return False
+        golden_cross, death_cross = signals
+        
+        # 3. 同步持仓状态
+        position = self._get_position()
+        self._update_position_state(position, current_price)
+        
+        # 4. 执行交易逻辑
+        if not self.holding and golden_cross:
+            # 检查冷却时间
+            elapsed = self.clock.time() - self.last_trade_time
+            if elapsed < self.cooldown_seconds:
+                self.log(f"冷却时间未到，剩余{int(self.cooldown_seconds - elapsed)}秒", "INFO")
+            elif self.trade_direction == 2:
+                self.log("交易方向限制(只卖)，跳过买入信号", "INFO")
+            else:
+                quantity = self._calculate_trade_quantity('buy', current_price, position)
+                if quantity < 100:
+                    self.log(f"买入数量不足({quantity})，跳过本次信号", "WARNING")
+                else:
+                    self._execute_buy(current_price, quantity)
+            
+        elif self.holding:
+            # 检查卖出条件
+            should_sell = False
+            sell_reason = ""
+            
+            # 止损止盈优先检查（风控优先）
+            stop_triggered, stop_reason = self._check_stop_conditions(current_price)
+            if stop_triggered:
+                should_sell = True
+                sell_reason = stop_reason
+            # 死叉信号
+            elif death_cross:
+                # 卖出平仓通常不受方向限制，除非是做空策略的平仓。
+                # 对于现货，只买(1)也需要卖出平仓；只卖(2)本身就是只做卖出。
+                should_sell = True
+                sell_reason = "死叉"
+            
+            if should_sell:
+                # 卖出平仓不受冷却时间限制，防止无法止损
+                quantity = self._calculate_trade_quantity('sell', current_price, position)
+                if quantity <= 0:
+                    self.log("卖出数量为0，跳过本次信号", "WARNING")
+                else:
+                    self._execute_sell(current_price, quantity, sell_reason)
+        return True
+
     def run(self):
         """策略主循环"""
         task_id = self.data.get('id', 0)
@@ -573,7 +653,7 @@ class TrendStrategy(BaseStrategy):
         while self.running:
             try:
                 # 0. 有效期检查
-                if self.expiration_time and datetime.datetime.now() > self.expiration_time:
+                if self.expiration_time and self.clock.now() > self.expiration_time:
                     self.log(f"任务({task_id})有效期已至 ({self.expiration_time})，自动停止任务...", "WARNING")
                     from ..manager import TaskManager
                     TaskManager().stop_task(task_id)
@@ -584,7 +664,7 @@ class TrendStrategy(BaseStrategy):
                     if not is_paused:
                         self.log(f"任务({task_id})非交易日期或时段，等待开盘...", "WARNING")
                         is_paused = True
-                    time.sleep(10)
+                    self.clock.sleep(10)
                     continue
                 
                 if is_paused:
@@ -592,138 +672,25 @@ class TrendStrategy(BaseStrategy):
                     is_paused = False
                 
                 # 1. 获取K线数据
-                req_ma = self.ma_long_period + 1
-                req_macd = max(self.macd_fast_period, self.macd_slow_period) + self.macd_signal_period + 5
-                
-                if self.signal_type == "MACD":
-                    required_len = req_macd
-                elif self.signal_type == "BOTH":
-                    required_len = max(req_ma, req_macd)
-                else:
-                    required_len = req_ma
-                    
+                # K线按 (标的, 周期) 增量缓存并在任务间共享，首次加载历史后只同步尾部
+                required_len = self._required_bars()
                 datalen = required_len + 10
-                closes = self.fetch_kline(self.sina_symbol, scale=self.timeframe, datalen=datalen)
+                live_quote = self.quote_subscription.latest if self.quote_subscription else None
+                bars = kline_cache.get_bars(
+                    self.sina_symbol, self.timeframe, datalen,
+                    live_price=live_quote.get('price') if live_quote else None,
+                    log=self.log
+                )
                 
-                if not closes or len(closes) < required_len:
-                    self.log(f"K线数据不足，需要{required_len}条，实际{len(closes)}条", "WARNING")
-                    time.sleep(self.monitor_interval)
+                if not bars or len(bars) < required_len:
+                    self.log(f"K线数据不足，需要{required_len}条，实际{len(bars)}条", "WARNING")
+                    self.clock.sleep(self.monitor_interval)
                     continue
                 
-                current_price = closes[-1]
-                
-                # 2. 计算技术指标
-                golden_cross = False
-                death_cross = False
-                
-                # 计算 MA
-                if self.signal_type in ["MA", "BOTH"]:
-                    short_ma = self.calculate_ma(closes, self.ma_short_period)
-                    long_ma = self.calculate_ma(closes, self.ma_long_period)
-                    prev_short_ma = self.calculate_ma(closes[:-1], self.ma_short_period)
-                    prev_long_ma = self.calculate_ma(closes[:-1], self.ma_long_period)
-                    
-                    if None in (short_ma, long_ma, prev_short_ma, prev_long_ma):
-                        self.log("均线计算失败", "WARNING")
-                        time.sleep(self.monitor_interval)
-                        continue
-                        
-                    self.log(
-                        f"价格: {current_price:.2f} | "
-                        f"MA{self.ma_short_period}: {short_ma:.2f} | "
-                        f"MA{self.ma_long_period}: {long_ma:.2f}"
-                    )
-                    ma_golden, ma_death = self._check_cross_signal(short_ma, long_ma, prev_short_ma, prev_long_ma)
-                    
-                    if self.signal_type == "MA":
-                        golden_cross = ma_golden
-                        death_cross = ma_death
-
-                # 计算 MACD
-                if self.signal_type in ["MACD", "BOTH"]:
-                    diff, dea, prev_diff, prev_dea = self.calculate_macd(
-                        closes, self.macd_fast_period, self.macd_slow_period, self.macd_signal_period
-                    )
-                    if None in (diff, dea, prev_diff, prev_dea):
-                        self.log("MACD计算失败", "WARNING")
-                        time.sleep(self.monitor_interval)
-                        continue
-                        
-                    self.log(f"MACD: D={diff:.3f}/A={dea:.3f}")
-                    macd_golden, macd_death = self._check_cross_signal(diff, dea, prev_diff, prev_dea)
-                    
-                    if self.signal_type == "MACD":
-                        golden_cross = macd_golden
-                        death_cross = macd_death
-                
-                # BOTH 模式的信号逻辑
-                if self.signal_type == "BOTH":
-                    # 买入：MA金叉 且 MACD多头，或 MACD金叉 且 MA多头（双重共振）
-                    ma_bullish = short_ma > long_ma
-                    macd_bullish = diff > dea
-                    
-                    if (ma_golden and macd_bullish) or (macd_golden and ma_bullish):
-                        golden_cross = True
-                        self.log("触发双重共振买入信号", "INFO")
-                    
-                    # 卖出逻辑：根据卖出模式选择
-                    if self.sell_mode == "strict":
-                        # 严格模式：要求双重确认（MA死叉且MACD空头，或 MACD死叉且MA空头）
-                        ma_bearish = short_ma < long_ma
-                        macd_bearish = diff < dea
-                        if (ma_death and macd_bearish) or (macd_death and ma_bearish):
-                            death_cross = True
-                            self.log("触发双重确认卖出信号(严格模式)", "INFO")
-                    else:
-                        # 宽松模式：任一死叉即卖出
-                        if ma_death or macd_death:
-                            death_cross = True
-                            reason = "MA死叉" if ma_death else "MACD死叉"
-                            self.log(f"触发{reason}卖出信号(宽松模式)", "INFO")
-                
-                # 3. 同步持仓状态
-                position = self._get_position()
-                self._update_position_state(position, current_price)
-                
-                # 4. 执行交易逻辑
-                if not self.holding and golden_cross:
-                    # 检查冷却时间
-                    if time.time() - self.last_trade_time < self.cooldown_seconds:
-                        remaining = int(self.cooldown_seconds - (time.time() - self.last_trade_time))
-                        self.log(f"冷却时间未到，剩余{remaining}秒", "INFO")
-                    elif self.trade_direction == 2:
-                        self.log("交易方向限制(只卖)，跳过买入信号", "INFO")
-                    else:
-                        quantity = self._calculate_trade_quantity('buy', current_price, position)
-                        if quantity < 100:
-                            self.log(f"买入数量不足({quantity})，跳过本次信号", "WARNING")
-                        else:
-                            self._execute_buy(current_price, quantity)
-                    
-                elif self.holding:
-                    # 检查卖出条件
-                    should_sell = False
-                    sell_reason = ""
-                    
-                    # 止损止盈优先检查（风控优先）
-                    stop_triggered, stop_reason = self._check_stop_conditions(current_price)
-                    if stop_triggered:
-                        should_sell = True
-                        sell_reason = stop_reason
-                    # 死叉信号
-                    elif death_cross:
-                        # 卖出平仓通常不受方向限制，除非是做空策略的平仓。
-                        # 对于现货，只买(1)也需要卖出平仓；只卖(2)本身就是只做卖出。
-                        should_sell = True
-                        sell_reason = "死叉"
-                    
-                    if should_sell:
-                        # 卖出平仓不受冷却时间限制，防止无法止损
-                        quantity = self._calculate_trade_quantity('sell', current_price, position)
-                        if quantity <= 0:
-                            self.log("卖出数量为0，跳过本次信号", "WARNING")
-                        else:
-                            self._execute_sell(current_price, quantity, sell_reason)
+                # 2~4. 计算信号、同步持仓并执行交易
+                if not self._step(bars):
+                    self.clock.sleep(self.monitor_interval)
+                    continue
                 
                 # 重置错误计数
                 error_count = 0
@@ -740,4 +707,30 @@ class TrendStrategy(BaseStrategy):
                 traceback.print_exc()
             
             # 等待下一轮
-            time.sleep(self.monitor_interval)
+            self._wait_next_round()
+
+    def _wait_next_round(self):
+        '''
+        等待下一轮K线计算
+        已订阅行情中心时，价格变化会提前唤醒：持仓状态下立即按最新价检查止损止盈，
+        K线指标仍按 monitor_interval 节奏重新计算
+        '''
+        deadline = self.clock.time() + self.monitor_interval
+        while self.running:
+            remaining = deadline - self.clock.time()
+            if remaining <= 0:
+                return
+            tick = self._wait_tick(remaining)
+            if not tick or not self.holding:
+                continue
+            try:
+                current_price = tick['price']
+                stop_triggered, stop_reason = self._check_stop_conditions(current_price)
+                if stop_triggered:
+                    quantity = self._calculate_trade_quantity('sell', current_price)
+                    if quantity <= 0:
+                        self.log("卖出数量为0，跳过本次信号", "WARNING")
+                    else:
+                        self._execute_sell(current_price, quantity, stop_reason)
+            except Exception as e:
+                self.log(f"实时止损止盈检查异常: {e}", "ERROR")
@@ -2,21 +2,50 @@
 import time
 import os
 import re
-import urllib.request
 import threading
 import json
 import httpx
+from functools import partial
 from typing import Optional
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from easytrader import remoteclient
+from .quote_hub import to_sina_symbol, parse_sina_quotes, SINA_QUOTE_URL, SINA_REFERER
+from .http_client import get_market_client
+from .quote_router import QuoteRouter
+from .backend_reporter import get_backend_reporter
+from .positions import PositionSnapshot
+
+
+def normalize_price(price):
+    '''委托价格按分四舍五入（ROUND_HALF_UP）'''
+    try:
+        return float(Decimal(str(price)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, TypeError, ValueError):
+        try:
+            return float(f"{float(price):.2f}")
+        except Exception:
+            return 0.0
+
 
 class QuantTrader:
     _monitor_lock = threading.Lock()
     _monitors = {} # {account_id: {'stop_event': Event, 'thread': Thread, 'count': int}}
+    _akshare_lock = threading.Lock()
+    _akshare_spot = {'index': {}, 'updated_at': 0.0} # AkShare 全市场快照 {'index': {代码: quote}}
+    AKSHARE_SPOT_TTL = 5 # 全市场快照缓存时长(秒)
+    _positions_lock = threading.Lock()
+    _position_snapshots = {} # {账户键: PositionSnapshot}，同一账户的多个任务共享
+    _position_fetch_locks = {} # {账户键: Lock}，同一账户同时只发起一次持仓查询
+    _position_generations = {} # {账户键: int}，下单后递增，丢弃下单前发起的查询结果
+    POSITION_SNAPSHOT_TTL = 1.0 # 持仓快照复用时长(秒)
 
     def __init__(self, log_callback=None):
         self.log_callback = log_callback
         self.user = None
+        self.quote_hub = None # 进程级行情中心，由 TaskManager 注入
+        self.quote_router = None # 多数据源行情路由，init_data_source 时创建
+        self.order_pipeline = None # 下单后处理流水线，由策略启动时注入；为空时同步发送通知
+        self.pipeline_key = None # 流水线中的任务标识（任务ID）
 
     def log(self, message, level='INFO'):
         print(f'[{level}] {message}')
@@ -133,13 +162,7 @@ class QuantTrader:
             raise Exception(msg)
 
     def _normalize_price(self, price):
-        try:
-            return float(Decimal(str(price)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
-        except (InvalidOperation, TypeError, ValueError):
-            try:
-                return float(f"{float(price):.2f}")
-            except Exception:
-                return 0.0
+        return normalize_price(price)
 
     def init_data_source(self, data_platform='tushare', data_source='sina', data_token=None):
         '''初始化数据源'''
@@ -177,106 +200,155 @@ class QuantTrader:
             self.log(f'相关库未安装: {e}', 'ERROR')
         except Exception as e:
             self.log(f'初始化失败: {e}', 'ERROR')
-      
+
+        self.quote_router = QuoteRouter(self._build_quote_sources(), log_callback=self.log_callback)
+
+    def _build_quote_sources(self):
+        '''按偏好顺序构建行情数据源：已配置的平台在前，其余作为故障转移备选'''
+        sources = []
+        if self.tushare:
+            sources.append(('tushare', self._get_tushare_detail))
+        if self.akshare:
+            sources.append(('akshare', self._get_akshare_detail))
+        if self.easyquotation:
+            sources.append((f'easyquotation-{self.data_source}', partial(self._get_easyquotation_detail, self.easyquotation)))
+
+        try:
+            import easyquotation
+            for source in ('sina', 'tencent'):
+                if self.easyquotation and source == self.data_source:
+                    continue
+                sources.append((f'easyquotation-{source}', partial(self._get_easyquotation_detail, easyquotation.use(source))))
+        except Exception:
+            pass
+
+        sources.append(('sina', self._get_sina_detail_manual))
+        return sources
+
     def get_stock_quote(self, ts_code):
         '''获取股票行情：现价、开盘价、昨收价'''
-        stock_code = ''.join(filter(str.isdigit, ts_code)) or ts_code
-
-        # 1. 尝试 Tushare
-        if self.data_platform == 'tushare' and self.tushare:
-            try:
-                df = self.tushare.realtime_quote(ts_code=ts_code, src=self.data_source) # 不须token，tscode须后缀
-                # df = ts.get_realtime_quotes(ts_code=ts_code) # 不须token，tscode须无后缀
-                # df = pro.fund_basic(ts_code=ts_code) # ETF须token，tscode须后缀
-                if df is not None and not df.empty:
-                    return {
-                        'price': float(df.iloc[0]['PRICE']),
-                        'open': float(df.iloc[0]['OPEN']),
-                        'pre_close': float(df.iloc[0]['PRE_CLOSE'])
-                    }
-            except Exception as e:
-                self.log(f'获取行情数据错误(tushare）：{e}', 'ERROR')
+        # 0. 优先读取行情中心的共享快照（已订阅标的无需单独请求上游）
+        if self.quote_hub:
+            snapshot = self.quote_hub.get(ts_code)
+            if snapshot:
+                return snapshot
+
+        # 1. 多数据源路由：最快的健康数据源优先，慢请求对冲到次优数据源
+        if self.quote_router:
+            quote = self.quote_router.get_quote(ts_code)
+            if quote:
+                return quote
+            return {'price': 0.0, 'open': 0.0, 'pre_close': 0.0}
+
+        # 2. 未初始化数据源时，直接获取新浪数据
+        return self._get_sina_detail_manual(ts_code)
+
+    def _get_tushare_detail(self, ts_code):
+        '''获取 Tushare 股票详细信息'''
+        df = self.tushare.realtime_quote(ts_code=ts_code, src=self.data_source) # 不须token，tscode须后缀
+        # df = ts.get_realtime_quotes(ts_code=ts_code) # 不须token，tscode须无后缀
+        # df = pro.fund_basic(ts_code=ts_code) # ETF须token，tscode须后缀
+        if df is not None and not df.empty:
+            return {
+                'price': float(df.iloc[0]['PRICE']),
+                'open': float(df.iloc[0]['OPEN']),
+                'pre_close': float(df.iloc[0]['PRE_CLOSE'])
+            }
+        return None
 
-        # 2. 尝试 AkShare
-        if self.data_platform == 'akshare' and self.akshare:
-            return self._get_akshare_detail(stock_code)
-        
-        # 3. 尝试 Easyquotation
-        if self.data_platform == 'easyquotation' and self.easyquotation:
-            try:
-                data = self.easyquotation.real(stock_code)
-                item = None
-                if stock_code in data:
-                    item = data[stock_code]
-                else:
-                    code_clean = ''.join(filter(str.isdigit, stock_code))
-                    data = self.easyquotation.real(code_clean)
-                    if code_clean in data:
-                        item = data[code_clean]
-                
-                if item:
-                    return {
-                        'price': float(item.get('now', 0)),
-                        'open': float(item.get('open', 0)),
-                        'pre_close': float(item.get('close', 0))
-                    }
-            except Exception as e:
-                self.log(f'获取行情数据错误(Easyquotation)：{e}', 'ERROR')
-        
-        # 4. 备用方案：手动获取新浪数据
-        return self._get_sina_detail_manual(stock_code)
+    def _get_easyquotation_detail(self, quotation, ts_code):
+        '''获取 Easyquotation 股票详细信息'''
+        code_clean = ''.join(filter(str.isdigit, ts_code)) or ts_code
+        item = quotation.real(code_clean).get(code_clean)
+        if item:
+            return {
+                'price': float(item.get('now', 0)),
+                'open': float(item.get('open', 0)),
+                'pre_close': float(item.get('close', 0)),
+                'high': float(item.get('high', 0)),
+                'low': float(item.get('low', 0))
+            }
+        return None
 
     def _get_akshare_detail(self, stock_code):
         '''获取 AkShare 股票详细信息'''
         try:
-            import akshare as ak
             code_clean = ''.join(filter(str.isdigit, stock_code))
-            
-            # 使用 stock_zh_a_spot_em 获取实时行情
-            # 注意：此接口返回全市场数据，效率较低，如有更优接口请替换
-            df = ak.stock_zh_a_spot_em()
-            row = df[df['代码'] == code_clean]
-            
-            if not row.empty:
-                return {
-                    'price': float(row.iloc[0]['最新价']),
-                    'open': float(row.iloc[0]['今开']),
-                    'pre_close': float(row.iloc[0]['昨收'])
-                }
+
+            # 全市场快照按代码建立索引并短期缓存，所有任务共享，避免每个 tick 下载 5000+ 行
+            quote = self._get_akshare_spot_index().get(code_clean)
+            if quote:
+                return dict(quote)
+
+            # A股快照不包含 ETF 等品种，改用单标的盘口接口
+            return self._get_akshare_single(code_clean)
         except Exception as e:
             self.log(f'获取行情数据错误(AkShare)：{e}', 'ERROR')
 
+    @classmethod
+    def _get_akshare_spot_index(cls):
+        '''获取全市场快照索引，过期时重新下载（持锁下载，并发任务只触发一次请求）'''
+        with cls._akshare_lock:
+            if time.time() - cls._akshare_spot['updated_at'] < cls.AKSHARE_SPOT_TTL:
+                return cls._akshare_spot['index']
+
+            import akshare as ak
+            df = ak.stock_zh_a_spot_em()
+            index = {}
+            for code, price, open_price, pre_close, high, low in zip(
+                df['代码'], df['最新价'], df['今开'], df['昨收'], df['最高'], df['最低']
+            ):
+                index[code] = {
+                    'price': cls._to_float(price),
+                    'open': cls._to_float(open_price),
+                    'pre_close': cls._to_float(pre_close),
+                    'high': cls._to_float(high),
+                    'low': cls._to_float(low)
+                }
+            cls._akshare_spot = {'index': index, 'updated_at': time.time()}
+            return index
+
+    def _get_akshare_single(self, code_clean):
+        '''通过单标的盘口接口获取行情'''
+        import akshare as ak
+        df = ak.stock_bid_ask_em(symbol=code_clean)
+        items = dict(zip(df['item'], df['value']))
+        price = self._to_float(items.get('最新'))
+        if price <= 0:
+            return None
+        return {
+            'price': price,
+            'open': self._to_float(items.get('今开')),
+            'pre_close': self._to_float(items.get('昨收')),
+            'high': self._to_float(items.get('最高')),
+            'low': self._to_float(items.get('最低'))
+        }
+
+    @staticmethod
+    def _to_float(value):
+        '''转换为 float，空值/NaN 返回 0.0'''
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return 0.0
+        return value if value == value else 0.0
+
     def _get_sina_detail_manual(self, stock_code):
         '''获取新浪股票详细信息'''
         try:
-            code_clean = ''.join(filter(str.isdigit, stock_code))
-            if not stock_code.startswith(('sh', 'sz', 'bj')):
-                if code_clean.startswith('6'):
-                    code_full = f'sh{code_clean}'
-                elif code_clean.startswith('0') or code_clean.startswith('3'):
-                    code_full = f'sz{code_clean}'
-                elif code_clean.startswith('8') or code_clean.startswith('4'):
-                    code_full = f'bj{code_clean}'
-                else:
-                    code_full = stock_code
-            else:
-                code_full = stock_code
-
-            url = f'http://hq.sinajs.cn/list={code_full}'
-            req = urllib.request.Request(url)
-            req.add_header('Referer', 'http://finance.sina.com.cn/')
-            
-            with urllib.request.urlopen(req, timeout=3) as response:
-                data = response.read().decode('gbk') 
-                if 'var hq_str_' in data:
-                    content = data.split('"')[1]
-                    parts = content.split(',')
-                    if len(parts) > 3:
-                        return {
-                            'price': float(parts[3]),
-                            'open': float(parts[1]),
-                            'pre_close': float(parts[2])
-                        }
+            code_full = to_sina_symbol(stock_code)
+            url = f'{SINA_QUOTE_URL}{code_full}'
+            resp = get_market_client().get(url, headers={'Referer': SINA_REFERER}, timeout=3)
+            resp.raise_for_status()
+            quote = parse_sina_quotes(resp.content.decode('gbk')).get(code_full)
+            if quote:
+                return {
+                    'price': quote['price'],
+                    'open': quote['open'],
+                    'pre_close': quote['pre_close'],
+                    'high': quote['high'],
+                    'low': quote['low']
+                }
         except Exception as e:
             self.log(f'获取行情数据错误(sina)：{e}', 'WARNING')
         return {'price': 0.0, 'open': 0.0, 'pre_close': 0.0}
@@ -289,15 +361,17 @@ class QuantTrader:
         try:
             price = self._normalize_price(price)
             res = self.user.buy(stock_code, price=price, amount=volume)
+            self.invalidate_positions()
             if res:
                 content = f'股票: {stock_code}\n价格: {price}\n数量: {volume}'
                 if reason:
                     content = f'{reason}\n{content}'
-                self.send_notification(color='green', title='买入委托通知', content=content)
+                self._notify(color='green', title='买入委托通知', content=content)
             return res
         except Exception as e:
             self.log(f'{stock_code}买入发生错误：{e}', 'ERROR')
-            self.send_notification(color='red', title='买入失败', content=f'股票: {stock_code}\n错误: {e}')
+            self.invalidate_positions()
+            self._notify(color='red', title='买入失败', content=f'股票: {stock_code}\n错误: {e}')
             return None
 
     def sell(self, stock_code, price, volume, reason=None):
@@ -308,92 +382,73 @@ class QuantTrader:
         try:
             price = self._normalize_price(price)
             res = self.user.sell(stock_code, price=price, amount=volume)
+            self.invalidate_positions()
             if res:
                 content = f'股票: {stock_code}\n价格: {price}\n数量: {volume}'
                 if reason:
                     content = f'{reason}\n{content}'
-                self.send_notification(color='orange', title='卖出委托通知', content=content)
+                self._notify(color='orange', title='卖出委托通知', content=content)
             return res
         except Exception as e:
             self.log(f'{stock_code}卖出发生错误：{e}', 'ERROR')
-            self.send_notification(color='red', title='卖出失败', content=f'股票: {stock_code}\n错误: {e}')
+            self.invalidate_positions()
+            self._notify(color='red', title='卖出失败', content=f'股票: {stock_code}\n错误: {e}')
             return None
 
-    def _normalize_position(self, position):
-        p = position
-        stock_code = p.get('证券代码') or p.get('stock_code') or ''
-        stock_name = p.get('证券名称') or p.get('stock_name') or ''
-        total_quantity = p.get('持仓数量') or p.get('股票余额') or p.get('实际数量') or p.get('stock_amount') or 0
-        available_quantity = p.get('可用数量') or p.get('可用余额') or p.get('enable_amount') or 0
-        frozen_quantity = p.get('冻结数量') or p.get('冻结余额') or p.get('frozen_quantity') or 0
-        cost_price = p.get('参考成本价') or p.get('成本价') or p.get('参考成本') or p.get('cost_price') or 0.0
-        current_price = p.get('当前价') or p.get('市价') or p.get('current_price') or 0.0
-        market_value = p.get('最新市值') or p.get('市值') or p.get('market_value') or 0.0
-        total_pl_amount = p.get('浮动盈亏') or p.get('盈亏') or p.get('总盈亏') or p.get('total_pl_amount') or 0.0 
-        total_pl_ratio = p.get('盈亏比例(%)') or p.get('盈亏比(%)') or p.get('total_pl_ratio') or 0.0
-        daily_pl_amount = p.get('当日盈亏') or p.get('daily_pl_amount') or 0.0
-        daily_pl_ratio = p.get('当日盈亏比(%)') or p.get('daily_pl_ratio') or 0.0
-        position_ratio = p.get('仓位占比(%)') or p.get('仓位占比(%)') or p.get('position_ratio') or 0.0
-        daily_buy_quantity = p.get('当日买入') or p.get('daily_buy_quantity') or 0
-        daily_sell_quantity = p.get('当日卖出') or p.get('daily_sell_quantity') or 0
+    def _position_key(self):
+        account = getattr(self, 'account', None) or {}
+        return account.get('id') or id(self)
 
-        return {
-            'stock_code': stock_code,
-            'stock_name': stock_name,
-            'total_quantity': int(total_quantity),
-            'available_quantity': int(available_quantity),
-            'frozen_quantity': int(frozen_quantity),
-            'cost_price': float(cost_price),
-            'current_price': float(current_price),
-            'market_value': float(market_value),
-            'total_pl_amount': float(total_pl_amount),
-            'total_pl_ratio': float(total_pl_ratio),
-            'daily_pl_amount': float(daily_pl_amount),
-            'daily_pl_ratio': float(daily_pl_ratio),
-            'position_ratio': float(position_ratio),
-            'daily_buy_quantity': int(daily_buy_quantity),
-            'daily_sell_quantity': int(daily_sell_quantity),
-        }
-
-    def get_position(self, stock_code):
-        '''获取持仓信息'''
-        position = { }
+    def invalidate_positions(self):
+        '''下单/撤单后使账户持仓快照失效'''
+        key = self._position_key()
+        with self._positions_lock:
+            self._position_snapshots.pop(key, None)
+            self._position_generations[key] = self._position_generations.get(key, 0) + 1
 
+    def get_position_snapshot(self, max_age=None) -> PositionSnapshot:
+        '''
+        获取账户持仓快照：max_age(默认 POSITION_SNAPSHOT_TTL)秒内复用同一账户已有的快照，
+        否则查询一次并建立代码索引；查询失败时抛出异常
+        '''
         if not self.user:
-            return position
-
-        try:
+            return PositionSnapshot([])
+        key = self._position_key()
+        max_age = self.POSITION_SNAPSHOT_TTL if max_age is None else max_age
+        with self._positions_lock:
+            fetch_lock = self._position_fetch_locks.setdefault(key, threading.Lock())
+        with fetch_lock:
+            with self._positions_lock:
+                snapshot = self._position_snapshots.get(key)
+                generation = self._position_generations.get(key, 0)
+            # 等待期间其他任务可能刚完成查询
+            if snapshot and snapshot.age <= max_age:
+                return snapshot
+            fetched_at = time.time()
             positions = self.user.position
             if isinstance(positions, dict):
                 positions = positions.get('data', [])
-            
-            for p in positions:
-                current_position = self._normalize_position(p)
-                if stock_code == current_position.get('stock_code'):
-                    return current_position
+            snapshot = PositionSnapshot(positions, fetched_at)
+            with self._positions_lock:
+                if self._position_generations.get(key, 0) == generation:
+                    self._position_snapshots[key] = snapshot
+            return snapshot
 
-            return position
+    def get_position(self, stock_code):
+        '''获取持仓信息'''
+        try:
+            return self.get_position_snapshot().get(stock_code)
         except Exception as e:
             print(f'获取持仓错误：{e}')
-            return position
+            return { }
 
     def get_positions(self):
         '''获取所有持仓信息'''
-        positions_list = []
-        if not self.user:
-            return positions_list
-
         try:
-            raw_positions = self.user.position
-            if isinstance(raw_positions, dict):
-                raw_positions = raw_positions.get('data', [])
-                
-            for p in raw_positions:
-                positions_list.append(self._normalize_position(p))
-            return positions_list
+            return self.get_position_snapshot().all()
         except Exception as e:
             print(f'获取所有持仓错误：{e}')
-            return positions_list
+            return []
 
     def get_balance(self):
         '''获取资金余额'''
@@ -485,34 +540,25 @@ class QuantTrader:
             summary = {**balance, 'updated_at': time.strftime('%Y-%m-%d %H:%M:%S')}
             
             if self.backend_url and self.token:
-                base_url = self.backend_url
-
-                if base_url.endswith('/'):
-                    base_url = base_url[:-1]
-            
-                url = f'{base_url}/quant/account/updateAccount'
                 data = {
                     'id': account_id,
                     'summary': summary
                 }
-                headers = {
-                    'x-token': self.token,
-                    'Content-Type': 'application/json'
-                }
-                response = httpx.put(url, json=data, headers=headers, timeout=5)
-                if response.status_code != 200:
-                    print(f"[{time.strftime('%H:%M:%S')}] 资产上报失败: {response.status_code} {response.text}")
-                else:
-                    # 成功上报后，通知前端刷新
-                    if self.log_callback:
-                        try:
-                            self.log_callback('INFO', 'QuantTrader', 'ASSET_UPDATE_TRIGGER')
-                        except:
-                            pass
+                # 由上报服务合并同一账户的资产更新，成功上报后通知前端刷新
+                get_backend_reporter(self.backend_url).update_account(
+                    self.token, data, on_sent=self._asset_updated, log=self.log
+                )
 
         except Exception as e:
             print(f'账户资产获取异常: {e}')
 
+    def _asset_updated(self):
+        if self.log_callback:
+            try:
+                self.log_callback('INFO', 'QuantTrader', 'ASSET_UPDATE_TRIGGER')
+            except:
+                pass
+
     @classmethod
     def refresh_account(cls, data):
         '''手动触发账户资产刷新'''
@@ -547,55 +593,71 @@ class QuantTrader:
         
         return False, '未找到该账户的运行监控且无法建立临时连接'
 
+    def _notify(self, color='blue', title=None, content=None):
+        '''委托通知：有流水线时后台发送（失败重试），否则同步发送'''
+        if not getattr(self, 'webhook_url', None):
+            return
+        if self.order_pipeline:
+            self.order_pipeline.submit(
+                self.pipeline_key, self._post_notification, color, title, content,
+                time.strftime('%Y-%m-%d %H:%M:%S'), name='委托通知', log=self.log
+            )
+        else:
+            self.send_notification(color=color, title=title, content=content)
+
     def send_notification(self, color='blue', title=None, content=None):
         '''发送通知到飞书/钉钉/微信'''
         if not getattr(self, 'webhook_url', None):
             return
 
         try:
-            if self.webhook_type == 'feishu':
-                headers = {'Content-Type': 'application/json'}
-                
-                # 构造富文本卡片消息
-                card_content = {
-                    'config': {
-                        'wide_screen_mode': True
-                    },
-                    'header': {
-                        'template': color,
-                        'title': {
-                            'content': title,
-                            'tag': 'plain_text'
+            self._post_notification(color, title, content)
+        except Exception as e:
+            self.log(f'发送通知失败：{e}', 'ERROR')
+
+    def _post_notification(self, color, title, content, sent_at=None):
+        '''发送通知，失败时抛出异常；sent_at 为通知产生的时间，默认当前时间'''
+        if self.webhook_type == 'feishu':
+            headers = {'Content-Type': 'application/json'}
+            
+            # 构造富文本卡片消息
+            card_content = {
+                'config': {
+                    'wide_screen_mode': True
+                },
+                'header': {
+                    'template': color,
+                    'title': {
+                        'content': title,
+                        'tag': 'plain_text'
+                    }
+                },
+                'elements': [
+                    {
+                        'tag': 'div',
+                        'text': {
+                            'content': content,
+                            'tag': 'lark_md'
                         }
                     },
-                    'elements': [
-                        {
-                            'tag': 'div',
-                            'text': {
-                                'content': content,
-                                'tag': 'lark_md'
+                    {
+                        'tag': 'hr'
+                    },
+                    {
+                        'tag': 'note',
+                        'elements': [
+                            {
+                                'content': f"时间: {sent_at or time.strftime('%Y-%m-%d %H:%M:%S')}",
+                                'tag': 'plain_text'
                             }
-                        },
-                        {
-                            'tag': 'hr'
-                        },
-                        {
-                            'tag': 'note',
-                            'elements': [
-                                {
-                                    'content': f"时间: {time.strftime('%Y-%m-%d %H:%M:%S')}",
-                                    'tag': 'plain_text'
-                                }
-                            ]
-                        }
-                    ]
-                }
+                        ]
+                    }
+                ]
+            }
 
-                data = {
-                    'msg_type': 'interactive',
-                    'card': card_content
-                }
-                httpx.post(self.webhook_url, json=data, headers=headers, timeout=5)
-            
-        except Exception as e:
-            self.log(f'发送通知失败：{e}', 'ERROR')
+            data = {
+                'msg_type': 'interactive',
+                'card': card_content
+            }
+            resp = httpx.post(self.webhook_url, json=data, headers=headers, timeout=5)
+            resp.raise_for_status()
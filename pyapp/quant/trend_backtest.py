@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+趋势策略回测
+按 (标的, K线周期) 加载K线历史，逐根K线驱动 TrendStrategy._step（与实盘相同的指标同步、
+MA/MACD/BOTH 信号判断、_check_stop_conditions 止损止盈与冷却时间逻辑），
+成交经 backtest.SimTrader 模拟（佣金、印花税、T+1），输出交易明细与按日权益曲线。
+- compare_signals: 同一段K线上对比 MA / MACD / BOTH(严格/宽松) 信号
+- run_batch: 多标的 × 多信号方式分发到多进程并行回测
+简化假设：仅在K线收盘价上决策与成交，不回放K线内的实时止损止盈检查。
+"""
+import os
+import sys
+import json
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+import pandas as pd
+from .backtest import EPOCH, DATE_ONLY_TIME, TickData, VirtualClock, SimTrader, summarize
+from .kline_cache import kline_cache
+from .quote_hub import to_sina_symbol
+
+DEFAULT_DATALEN = 1000 # 默认加载的历史K线数量
+SIGNAL_VARIANTS = {
+    'MA': {'signalType': 'MA'},
+    'MACD': {'signalType': 'MACD'},
+    'BOTH-strict': {'signalType': 'BOTH', 'sellMode': 'strict'},
+    'BOTH-loose': {'signalType': 'BOTH', 'sellMode': 'loose'},
+}
+RESULT_COLUMNS = ('pnl', 'return_ratio', 'max_drawdown', 'turnover', 'trade_count', 'fees')
+
+
+def stock_info(symbol) -> dict:
+    '''标的代码(600519 / 600519.SH / sh600519)转换为策略的 stock 信息'''
+    sina_symbol = to_sina_symbol(symbol)
+    code, market = sina_symbol[2:], sina_symbol[:2].upper()
+    return {'symbol': code, 'ts_code': f'{code}.{market}', 'name': ''}
+
+
+def load_kline_history(symbol, timeframe=240, datalen=DEFAULT_DATALEN, source=None) -> List[dict]:
+    '''
+    加载K线历史
+    source: CSV/Parquet 文件路径或 DataFrame（列 day/open/high/low/close），
+    为空时从K线缓存加载（缓存未命中时请求新浪K线接口）
+    返回: [{'day', 'open', 'high', 'low', 'close', 'volume'}]，按时间升序
+    '''
+    if source is None:
+        return kline_cache.get_bars(to_sina_symbol(symbol), int(timeframe), int(datalen))
+
+    if isinstance(source, pd.DataFrame):
+        df = source.copy()
+    elif str(source).lower().endswith(('.parquet', '.pq')):
+        df = pd.read_parquet(source)
+    else:
+        df = pd.read_csv(source)
+    df.columns = [str(c).lower() for c in df.columns]
+    day_col = next((c for c in ('day', 'date', 'datetime', 'time') if c in df.columns), None)
+    if day_col is None or 'close' not in df.columns:
+        raise ValueError('K线数据缺少时间(day/date)或收盘价(close)列')
+    df = df.sort_values(day_col, kind='stable')
+    close = df['close'].astype(float)
+    return [
+        {
+            'day': str(day),
+            'open': float(o),
+            'high': float(h),
+            'low': float(l),
+            'close': float(c),
+            'volume': float(v),
+        }
+        for day, o, h, l, c, v in zip(
+            df[day_col], df.get('open', close), df.get('high', close), df.get('low', close),
+            close, df.get('volume', pd.Series(0.0, index=df.index))
+        )
+    ]
+
+
+def bars_to_ticks(bars: List[dict]) -> TickData:
+    '''K线序列转换为回放行情：每根K线一笔，价格取收盘价，昨收取上一根收盘价'''
+    times = []
+    for bar in bars:
+        moment = pd.Timestamp(bar['day']).to_pydatetime()
+        if len(str(bar['day'])) <= 10:
+            moment = datetime.datetime.combine(moment.date(), DATE_ONLY_TIME)
+        times.append((moment - EPOCH).total_seconds())
+    closes = [bar['close'] for bar in bars]
+    pre_closes = [bars[0]['open'] if bars else 0.0] + closes[:-1]
+    return TickData(
+        times, closes, [bar['open'] for bar in bars], [bar['high'] for bar in bars],
+        [bar['low'] for bar in bars], pre_closes
+    )
+
+
+class TrendBacktest:
+    '''
+    趋势策略回测
+    config: 策略配置（与任务 config 一致），回测中强制 enableRealTrade 以经过模拟交易接口成交
+    bars: K线序列，周期以 config['timeframe'] 为准
+    stock: 标的信息 {'symbol', 'ts_code', 'name'}
+    verbose: 为 False 时仅输出 WARNING/ERROR 日志
+    '''
+
+    def __init__(self, config: dict, bars: List[dict], stock: Optional[dict] = None,
+                 initial_cash=100000.0, initial_position=0, commission_rate=0.00025,
+                 min_commission=5.0, stamp_duty=0.0005, verbose=False, log_callback=None):
+        self.config = dict(config or {})
+        self.bars = bars
+        self.ticks = bars_to_ticks(bars)
+        self.stock = stock or stock_info('000001')
+        self.initial_cash = initial_cash
+        self.initial_position = initial_position
+        self.fee_options = {
+            'commission_rate': commission_rate,
+            'min_commission': min_commission,
+            'stamp_duty': stamp_duty,
+        }
+        self.verbose = verbose
+        self.log_callback = log_callback
+        self.logs: List[tuple] = []
+
+    def _log(self, message, level='INFO'):
+        if not self.verbose and level not in ('WARNING', 'ERROR'):
+            return
+        self.logs.append((level, str(message)))
+        if self.log_callback:
+            try:
+                self.log_callback(level, 'TrendBacktest', str(message))
+            except Exception:
+                pass
+
+    def build_strategy(self):
+        '''创建策略实例并注入虚拟时钟与模拟交易接口'''
+        from .strategies.trend import TrendStrategy
+        config = {**self.config, 'enableRealTrade': True}
+        data = {
+            'id': 0,
+            'name': 'TrendBacktest',
+            'task': {'config': config, 'stock': dict(self.stock)},
+        }
+        strategy = TrendStrategy(data, None)
+        clock = VirtualClock(self.ticks)
+        trader = SimTrader(clock, self.initial_cash, self.initial_position, **self.fee_options)
+        trader.stock_code = self.stock.get('symbol', '')
+        trader.log = self._log
+        strategy.clock = clock
+        strategy.trader = trader
+        strategy.log = self._log
+        strategy.stock_code, strategy.sina_symbol = strategy._parse_stock_info()
+        return strategy
+
+    def run(self) -> Dict:
+        if not self.bars:
+            raise ValueError('回测K线数据为空')
+        strategy = self.build_strategy()
+        # 与实盘主循环一致：每轮取最近 required_len + 10 根K线
+        required_len = strategy._required_bars()
+        datalen = required_len + 10
+        for i in range(required_len - 1, len(self.bars)):
+            strategy.clock.seek(i)
+            strategy._step(self.bars[max(0, i + 1 - datalen):i + 1])
+        result = summarize(strategy.trader, self.ticks, self.initial_position)
+        result['bar_count'] = len(self.bars)
+        return result
+
+
+def run_trend_backtest(config: dict, bars: List[dict], stock: Optional[dict] = None, **options) -> Dict:
+    '''回测便捷入口，参数同 TrendBacktest'''
+    return TrendBacktest(config, bars, stock, **options).run()
+
+
+def compare_signals(config: dict, bars: List[dict], stock: Optional[dict] = None,
+                    variants: Optional[Dict[str, dict]] = None, **options) -> Dict[str, Dict]:
+    '''同一段K线上按多种信号方式回测，返回 {信号方式: 回测结果}'''
+    variants = variants or SIGNAL_VARIANTS
+    return {
+        name: run_trend_backtest({**config, **overrides}, bars, stock, **options)
+        for name, overrides in variants.items()
+    }
+
+
+def _run_symbol(task):
+    symbol, config, timeframe, datalen, variants, options = task
+    try:
+        bars = load_kline_history(symbol, timeframe, datalen)
+        if not bars:
+            raise ValueError('K线数据为空')
+        config = {**config, 'timeframe': timeframe}
+        results = compare_signals(config, bars, stock_info(symbol), variants, **options)
+        return symbol, results, None
+    except Exception as e:
+        return symbol, {}, str(e)
+
+
+def run_batch(symbols: List[str], config: Optional[dict] = None, timeframe=240, datalen=DEFAULT_DATALEN,
+              variants: Optional[Dict[str, dict]] = None, workers: Optional[int] = None,
+              options: Optional[dict] = None, sort_by='pnl', descending=True) -> List[dict]:
+    '''
+    多标的并行回测
+    每个标的在独立进程中加载K线并按 variants 逐一回测
+    返回按 sort_by 排序的结果列表：[{'symbol', 'variant', 'pnl', 'return_ratio', ...}]
+    '''
+    variants = variants or SIGNAL_VARIANTS
+    tasks = [(symbol, dict(config or {}), int(timeframe), int(datalen), variants, dict(options or {}))
+             for symbol in symbols]
+    if not tasks:
+        return []
+
+    rows = []
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for symbol, results, error in executor.map(_run_symbol, tasks):
+            if error:
+                rows.append({'symbol': symbol, 'variant': '', 'error': error})
+                continue
+            for name, result in results.items():
+                rows.append({'symbol': symbol, 'variant': name, **result})
+
+    valid = [row for row in rows if 'error' not in row]
+    valid.sort(key=lambda row: row.get(sort_by, 0), reverse=descending)
+    return valid + [row for row in rows if 'error' in row]
+
+
+def format_table(rows: List[dict], top: Optional[int] = 20) -> str:
+    '''结果表格文本'''
+    rows = rows[:top] if top else rows
+    if not rows:
+        return ''
+    header = ['#', 'symbol', 'variant'] + list(RESULT_COLUMNS)
+    lines = []
+    for rank, row in enumerate(rows, 1):
+        if 'error' in row:
+            lines.append([str(rank), row['symbol'], '', f"错误: {row['error']}"])
+            continue
+        lines.append([
+            str(rank), row['symbol'], row['variant'],
+            f"{row['pnl']:.2f}", f"{row['return_ratio']*100:.2f}%", f"{row['max_drawdown']*100:.2f}%",
+            f"{row['turnover']:.2f}", str(row['trade_count']), f"{row['fees']:.2f}",
+        ])
+    widths = [max(len(str(item[i])) for item in [header] + lines if i < len(item)) for i in range(len(header))]
+    return '\n'.join(
+        '  '.join(str(cell).rjust(widths[i]) for i, cell in enumerate(line))
+        for line in [header] + lines
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='趋势策略回测（MA/MACD/BOTH 信号对比）')
+    parser.add_argument('symbols', nargs='+', help='标的代码，如 600519 / sz000001')
+    parser.add_argument('--config', help='策略配置 JSON 文件')
+    parser.add_argument('--timeframe', type=int, default=240, help='K线周期(5/15/30/60/240/1200/7200)')
+    parser.add_argument('--datalen', type=int, default=DEFAULT_DATALEN, help='加载的K线数量')
+    parser.add_argument('--signals', default=','.join(SIGNAL_VARIANTS), help='信号方式，逗号分隔')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数，默认为 CPU 核数')
+    parser.add_argument('--sort', default='pnl', help='排序字段')
+    parser.add_argument('--top', type=int, default=20, help='输出前 N 名')
+    parser.add_argument('--cash', type=float, default=100000.0, help='初始资金')
+    args = parser.parse_args()
+
+    base = {}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+    selected = {name: SIGNAL_VARIANTS[name] for name in args.signals.split(',') if name in SIGNAL_VARIANTS}
+    ascending = args.sort in ('max_drawdown', 'fees')
+    table = run_batch(
+        args.symbols, base, args.timeframe, args.datalen, selected, workers=args.workers,
+        options={'initial_cash': args.cash}, sort_by=args.sort, descending=not ascending
+    )
+    print(format_table(table, args.top))
+    sys.exit(0)